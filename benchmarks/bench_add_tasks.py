@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Compare submitting a burst of tasks one by one with `add_task` against a single `add_tasks` call.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_add_tasks --tasks 10000 --names 20
+"""
+import argparse
+import asyncio
+import time
+
+from common import logger
+from config import update_config
+
+
+def sync_handler(index: int) -> None:
+    pass
+
+
+async def async_handler(index: int) -> None:
+    pass
+
+
+def build_burst(count: int, names: int, use_async: bool) -> list:
+    """
+    Build a burst of tasks spread over several task names.
+
+    :param count: Number of tasks.
+    :param names: Number of distinct task names.
+    :param use_async: Whether to submit coroutine handlers.
+    :return: Tasks as tuples of (timeout_processing, task_name, func, args, kwargs).
+    """
+    handler = async_handler if use_async else sync_handler
+    return [(False, f"bench_{index % names}", handler, (index,), {}) for index in range(count)]
+
+
+def run_once(count: int, names: int, use_async: bool, batched: bool) -> float:
+    """
+    Submit one burst and return the time spent submitting it, in seconds.
+    """
+    from task_scheduling import add_task, add_tasks, shutdown
+
+    burst = build_burst(count, names, use_async)
+    start = time.perf_counter()
+    if batched:
+        futures = add_tasks(burst)
+    else:
+        futures = [add_task(timeout_processing, task_name, func, *args, **kwargs)
+                   for timeout_processing, task_name, func, args, kwargs in burst]
+    elapsed = time.perf_counter() - start
+
+    added = sum(future is not None for future in futures)
+    if added != count:
+        print(f"warning: only {added}/{count} tasks were admitted")
+    shutdown(True)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10000, help="Number of tasks per burst")
+    parser.add_argument("--names", type=int, default=20, help="Number of distinct task names")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of bursts per mode")
+    parser.add_argument("--verbose", action="store_true", help="Keep scheduler logging enabled")
+    parser.add_argument("--memory-release", action="store_true",
+                        help="Keep the memory release sweep that runs after every task")
+    options = parser.parse_args()
+
+    if not options.verbose:
+        # Logging every admitted task would dominate the measurement
+        logger.remove()
+
+    if not options.memory_release:
+        # The sweep walks every object in the interpreter after each task and, running concurrently with
+        # the submitting thread, hides the cost of the submission itself
+        from task_scheduling.scheduler.io_async_task import IoAsyncTask
+        from task_scheduling.scheduler.io_liner_task import IoLinerTask
+        IoAsyncTask._execute_task = IoAsyncTask._execute_task.__wrapped__
+        IoLinerTask._execute_task = IoLinerTask._execute_task.__wrapped__
+
+    # Let the whole burst fit in the queues
+    update_config("maximum_queue_line", options.tasks + 1)
+    update_config("maximum_queue_async", options.tasks + 1)
+    update_config("maximum_queue_gid", 0)
+    update_config("maximum_queue_uid", 0)
+
+    for use_async in (False, True):
+        kind = "asyncio" if use_async else "linear"
+        for batched in (False, True):
+            timings = [run_once(options.tasks, options.names, use_async, batched) for _ in range(options.repeat)]
+            best = min(timings)
+            mode = "add_tasks" if batched else "add_task "
+            print(f"{kind:8} {mode} {options.tasks} tasks: best {best * 1000:8.1f} ms, "
+                  f"{best / options.tasks * 1e6:6.2f} us/task")
+
+    # Give the event loop threads a moment to exit cleanly
+    asyncio.run(asyncio.sleep(0.1))
+
+
+if __name__ == "__main__":
+    main()
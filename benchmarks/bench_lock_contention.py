@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Load test of the scheduler locks: several plugins receive tasks at the same time from several dispatching threads,
+then the wait and hold times of the instrumented locks of each backend are printed.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lock_contention --plugins 20 --tasks 200 --threads 4
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from common import logger
+from config import update_config
+
+
+async def async_handler(index: int) -> int:
+    await asyncio.sleep(0.001)
+    return index
+
+
+def sync_handler(index: int) -> int:
+    time.sleep(0.001)
+    return index
+
+
+def dispatch(thread_index: int, threads: int, plugins: int, tasks: int, futures: list) -> None:
+    """
+    Submit this thread's share of the tasks of every plugin, alternating between plugins like incoming messages.
+    """
+    from task_scheduling import add_task
+
+    for index in range(thread_index, plugins * tasks, threads):
+        plugin = index % plugins
+        if plugin % 2:
+            futures.append(add_task(False, f"bench_async_{plugin}", async_handler, index))
+        else:
+            futures.append(add_task(False, f"bench_line_{plugin}", sync_handler, index))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plugins", type=int, default=20, help="Number of plugins, half of them asynchronous")
+    parser.add_argument("--tasks", type=int, default=200, help="Number of tasks per plugin")
+    parser.add_argument("--threads", type=int, default=4, help="Number of dispatching threads")
+    parser.add_argument("--verbose", action="store_true", help="Keep scheduler logging enabled")
+    options = parser.parse_args()
+
+    if not options.verbose:
+        logger.remove()
+
+    # The memory release sweep after every task would dominate the measurement
+    from task_scheduling.scheduler.io_async_task import IoAsyncTask
+    from task_scheduling.scheduler.io_liner_task import IoLinerTask
+    IoAsyncTask._execute_task = IoAsyncTask._execute_task.__wrapped__
+    IoLinerTask._execute_task = IoLinerTask._execute_task.__wrapped__
+
+    from task_scheduling import io_async_task, io_liner_task, shutdown, task_policy
+
+    total = options.plugins * options.tasks
+    update_config("maximum_queue_line", total + 1)
+    update_config("maximum_queue_async", total + 1)
+    update_config("maximum_queue_gid", 0)
+    update_config("maximum_queue_uid", 0)
+    for plugin in range(options.plugins):
+        prefix = "bench_async" if plugin % 2 else "bench_line"
+        task_policy.register(f"{prefix}_{plugin}", max_concurrent=4, max_queued=options.tasks + 1)
+
+    futures: list = []
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=dispatch, args=(index, options.threads, options.plugins, options.tasks, futures))
+        for index in range(options.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    completed = sum(1 for future in futures if future is not None and future.result(120) is not None)
+    elapsed = time.perf_counter() - start
+
+    print(f"{completed}/{total} tasks in {elapsed:.2f} s, {completed / elapsed:.0f} tasks/s")
+    for name, scheduler in (("linear", io_liner_task), ("asyncio", io_async_task)):
+        for lock_name, lock in scheduler.get_queue_info()["locks"].items():
+            print(f"{name:8} {lock_name:10} {lock['acquisitions']:8} acquisitions, {lock['contended']:6} contended, "
+                  f"wait {lock['wait_total_ms']:8.1f} ms (max {lock['wait_max_ms']:6.2f}), "
+                  f"hold {lock['hold_total_ms']:8.1f} ms (max {lock['hold_max_ms']:6.2f})")
+
+    shutdown(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput and latency of the linear and asyncio backends: drives `add_task` with synthetic handlers of a given
+duration over a grid of arrival rates, task name counts and per-name concurrency, and reports for each run the
+submit overhead, the queue wait percentiles, the throughput, the peak thread count and the peak RSS.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scheduler --rates 100,1000,0 --names 1,20 --concurrency 1,4 --output run.json
+
+A rate of 0 submits the tasks as a single burst. Compare a run with a saved one, the exit status is 1 if a metric
+got worse by more than the tolerance:
+
+    python -m benchmarks.bench_scheduler --rates 100,1000,0 --names 1,20 --concurrency 1,4 --compare run.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+import psutil
+
+from common import logger
+from config import update_config
+
+# Metrics compared with --compare, and whether a higher value is better
+COMPARED_METRICS = {
+    "throughput": True,
+    "submit_us_mean": False,
+    "wait_ms_p50": False,
+    "wait_ms_p99": False
+}
+
+
+def sync_handler(submitted: float, duration: float) -> float:
+    wait = time.perf_counter() - submitted
+    time.sleep(duration)
+    return wait
+
+
+async def async_handler(submitted: float, duration: float) -> float:
+    wait = time.perf_counter() - submitted
+    await asyncio.sleep(duration)
+    return wait
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    :param values: Sorted values.
+    :param percent: Percentile between 0 and 100.
+    :return: Value at the percentile, 0 if there are none.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class ResourceSampler(threading.Thread):
+    """
+    Samples the thread count and the RSS of the process until stopped, keeping the peaks.
+    """
+
+    def __init__(self, interval: float = 0.01) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.process = psutil.Process()
+        self.stop_event = threading.Event()
+        self.peak_threads = threading.active_count()
+        self.peak_rss = self.process.memory_info().rss
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+
+def run_once(use_async: bool, tasks: int, rate: float, names: int, concurrency: int, duration: float) -> Dict:
+    """
+    Submit the tasks of one run at the given arrival rate and wait for all of them.
+
+    :param use_async: Whether to submit coroutine handlers.
+    :param tasks: Number of tasks.
+    :param rate: Arrival rate in tasks per second, 0 to submit them as a single burst.
+    :param names: Number of distinct task names.
+    :param concurrency: `max_concurrent` of each task name.
+    :param duration: Seconds each handler runs.
+    :return: Dictionary of the metrics of the run.
+    """
+    from task_scheduling import add_task, shutdown, task_policy
+
+    handler = async_handler if use_async else sync_handler
+    for index in range(names):
+        task_policy.register(f"bench_{index}", max_concurrent=concurrency, max_queued=tasks + 1)
+
+    rss_before = psutil.Process().memory_info().rss
+    sampler = ResourceSampler()
+    sampler.start()
+
+    submit_times = []
+    finish_times = []
+    futures = []
+    start = time.perf_counter()
+    for index in range(tasks):
+        if rate:
+            # Pace the arrivals, late submissions are not delayed further
+            delay = start + index / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        submitted = time.perf_counter()
+        future = add_task(False, f"bench_{index % names}", handler, submitted, duration)
+        submit_times.append(time.perf_counter() - submitted)
+        if future is not None:
+            future.add_done_callback(lambda _: finish_times.append(time.perf_counter()))
+            futures.append(future)
+
+    waits = []
+    failed = 0
+    for future in futures:
+        try:
+            waits.append(future.result(300))
+        except Exception:
+            failed += 1
+    elapsed = max(finish_times, default=start) - start
+    sampler.stop()
+    shutdown(True)
+
+    waits.sort()
+    submit_times.sort()
+    return {
+        "completed": len(waits),
+        "rejected": tasks - len(futures),
+        "failed": failed,
+        "throughput": len(waits) / elapsed if elapsed else 0.0,
+        "submit_us_mean": sum(submit_times) / len(submit_times) * 1e6,
+        "submit_us_p99": percentile(submit_times, 99) * 1e6,
+        "wait_ms_p50": percentile(waits, 50) * 1000,
+        "wait_ms_p99": percentile(waits, 99) * 1000,
+        "peak_threads": sampler.peak_threads,
+        "peak_rss_mb": sampler.peak_rss / 2 ** 20,
+        "rss_growth_mb": (sampler.peak_rss - rss_before) / 2 ** 20
+    }
+
+
+def run_key(run: Dict) -> str:
+    return json.dumps({key: run[key] for key in ("backend", "rate", "names", "concurrency", "config")},
+                      sort_keys=True)
+
+
+def compare(runs: List[Dict], baseline_path: str, tolerance: float) -> bool:
+    """
+    Print the change of the compared metrics against a saved run.
+
+    :param runs: Runs of this invocation.
+    :param baseline_path: JSON file written with --output.
+    :param tolerance: Relative change tolerated before a metric counts as a regression.
+    :return: Whether a metric regressed.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {run_key(run): run for run in json.load(f)["runs"]}
+
+    regressed = False
+    for run in runs:
+        old = baseline.get(run_key(run))
+        if old is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = old["metrics"][metric], run["metrics"][metric]
+            change = (after - before) / before if before else 0.0
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            regressed = regressed or worse
+            changes.append(f"{metric} {change:+.0%}{' REGRESSION' if worse else ''}")
+        print(f"{describe(run)}: {', '.join(changes)}")
+    return regressed
+
+
+def describe(run: Dict) -> str:
+    settings = "".join(f", {key}={value}" for key, value in run["config"].items())
+    rate = f"{run['rate']:g}" if run["rate"] else "burst"
+    return (f"{run['backend']:8} rate {rate:>5}, names {run['names']:3}, "
+            f"concurrency {run['concurrency']:2}{settings}")
+
+
+def parse_list(text: str, kind: type) -> List[Any]:
+    return [kind(value) for value in text.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="linear,asyncio", help="Backends to measure")
+    parser.add_argument("--tasks", type=int, default=1000, help="Number of tasks per run")
+    parser.add_argument("--duration", type=float, default=0.005, help="Seconds each handler runs")
+    parser.add_argument("--rates", default="200,0", help="Arrival rates in tasks per second, 0 for a burst")
+    parser.add_argument("--names", default="1,20", help="Numbers of distinct task names")
+    parser.add_argument("--concurrency", default="1,4", help="max_concurrent values of the task names")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=V1,V2",
+                        help="Values of a configuration key, e.g. line_task_max=4,10; every combination is run")
+    parser.add_argument("--output", help="Write the runs as JSON to this file")
+    parser.add_argument("--json", action="store_true", help="Print the runs as JSON instead of a table")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative change of a compared metric that counts as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Keep scheduler logging enabled")
+    parser.add_argument("--memory-release", action="store_true",
+                        help="Keep the memory release sweep that runs after every task")
+    options = parser.parse_args()
+
+    if not options.verbose:
+        # Logging every admitted task would dominate the measurement
+        logger.remove()
+
+    if not options.memory_release:
+        # The sweep walks every object in the interpreter after each task
+        from task_scheduling.scheduler.io_async_task import IoAsyncTask
+        from task_scheduling.scheduler.io_liner_task import IoLinerTask
+        IoAsyncTask._execute_task = IoAsyncTask._execute_task.__wrapped__
+        IoLinerTask._execute_task = IoLinerTask._execute_task.__wrapped__
+
+    # Let every run fit in the queues
+    update_config("maximum_queue_line", options.tasks + 1)
+    update_config("maximum_queue_async", options.tasks + 1)
+    update_config("maximum_queue_gid", 0)
+    update_config("maximum_queue_uid", 0)
+
+    settings = {}
+    for option in options.set:
+        key, _, values = option.partition("=")
+        settings[key] = [json.loads(value) for value in values.split(",")]
+
+    runs = []
+    grid = itertools.product(options.backends.split(","), parse_list(options.rates, float),
+                             parse_list(options.names, int), parse_list(options.concurrency, int),
+                             itertools.product(*settings.values()))
+    for backend, rate, names, concurrency, values in grid:
+        config_values = dict(zip(settings, values))
+        for key, value in config_values.items():
+            update_config(key, value)
+        run = {"backend": backend, "rate": rate, "names": names, "concurrency": concurrency,
+               "config": config_values}
+        run["metrics"] = run_once(backend == "asyncio", options.tasks, rate, names, concurrency, options.duration)
+        runs.append(run)
+        if not options.json:
+            metrics = run["metrics"]
+            print(f"{describe(run)}: {metrics['throughput']:7.0f} tasks/s, "
+                  f"submit {metrics['submit_us_mean']:6.1f} us (p99 {metrics['submit_us_p99']:7.1f}), "
+                  f"wait p50 {metrics['wait_ms_p50']:8.2f} ms p99 {metrics['wait_ms_p99']:8.2f} ms, "
+                  f"threads {metrics['peak_threads']:3}, rss {metrics['peak_rss_mb']:6.1f} MB, "
+                  f"rejected {metrics['rejected']}")
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "tasks": options.tasks,
+            "duration": options.duration
+        },
+        "runs": runs
+    }
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if options.json:
+        print(json.dumps(report, indent=2))
+
+    # Give the event loop threads a moment to exit cleanly
+    asyncio.run(asyncio.sleep(0.1))
+
+    if options.compare and compare(runs, options.compare, options.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Discrete-event simulator of the linear and asyncio backends: replays a trace of task arrivals and service times on a
+virtual clock through the same queueing policies as `IoLinerTask` and `IoAsyncTask` (fair queues, group and user
+quotas, queue limits, per-name concurrency, the adaptive concurrency limit and the idle teardown of schedulers),
+then reports latency percentiles, rejections and utilization for each candidate configuration.
+No plugin runs, a day of traffic is simulated in seconds.
+
+Record a trace by setting `task_trace_file` in config.yaml, then compare configurations:
+
+    python -m benchmarks.simulate_scheduler --trace task_trace.jsonl --set line_task_max=4,8,16 --set max_idle_time=10,60
+
+Without --trace, a synthetic trace of bursty traffic is generated.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import queue
+import random
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from common import logger
+from config import config
+from task_scheduling.scheduler.concurrency_limit import AdaptiveLimit
+from task_scheduling.scheduler.fair_queue import FairQueue, TenantTracker
+from task_scheduling.scheduler.io_async_task import IoAsyncTask
+from task_scheduling.scheduler.io_liner_task import IoLinerTask
+from task_scheduling.scheduler.warm_standby import WarmStandby
+
+# Backends of the trace that are simulated, by log name
+LINE = IoLinerTask.log_name
+ASYNC = IoAsyncTask.log_name
+
+
+class TraceTask:
+    """
+    One task of a trace.
+    """
+    __slots__ = ['backend', 'name', 'tenant', 'arrival', 'service']
+
+    def __init__(self, backend: str, name: str, tenant: Optional[Tuple[str, int]], arrival: float,
+                 service: float) -> None:
+        self.backend = backend  # LINE or ASYNC
+        self.name = name  # Task name
+        self.tenant = tenant  # ("gid", id), ("uid", id) or None
+        self.arrival = arrival  # Seconds since the first arrival of the trace
+        self.service = service  # Seconds the task runs once started
+
+
+def load_trace(path: str) -> List[TraceTask]:
+    """
+    Load a trace written by `task_trace_file`. Tasks that never started get the median service time of their name,
+    coalesced tasks and tasks of other backends are skipped.
+
+    :param path: Trace file.
+    :return: Tasks in arrival order.
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("backend") in (LINE, ASYNC) and entry.get("status") != "coalesced":
+                entries.append(entry)
+    if not entries:
+        return []
+
+    services = defaultdict(list)
+    for entry in entries:
+        if entry["service"] is not None:
+            services[entry["name"]].append(entry["service"])
+    medians = {name: sorted(values)[len(values) // 2] for name, values in services.items()}
+
+    start = min(entry["arrival"] for entry in entries)
+    tasks = [
+        TraceTask(entry["backend"], entry["name"], tuple(entry["tenant"]) if entry["tenant"] else None,
+                  entry["arrival"] - start,
+                  entry["service"] if entry["service"] is not None else medians[entry["name"]])
+        for entry in entries if entry["service"] is not None or entry["name"] in medians
+    ]
+    return sorted(tasks, key=lambda task: task.arrival)
+
+
+def synthetic_trace(count: int, seed: int) -> List[TraceTask]:
+    """
+    Generate bursty traffic: a few busy groups, slow and fast plugins, half of them asynchronous.
+
+    :param count: Number of tasks.
+    :param seed: Random seed.
+    :return: Tasks in arrival order.
+    """
+    generator = random.Random(seed)
+    plugins = [(f"plugin_{index}", LINE if index % 2 else ASYNC, generator.choice((0.05, 0.3, 2.0)))
+               for index in range(12)]
+    tasks = []
+    now = 0.0
+    for _ in range(count):
+        # Bursts of messages separated by quiet periods
+        now += generator.expovariate(20) if generator.random() < 0.9 else generator.expovariate(0.05)
+        name, backend, mean = generator.choice(plugins)
+        tenant = ("gid", generator.choice((1, 1, 1, 2, 2, 3, 4, 5)))
+        tasks.append(TraceTask(backend, name, tenant, now, generator.lognormvariate(0, 0.5) * mean))
+    return tasks
+
+
+@contextmanager
+def overrides(values: Dict[str, Any]) -> Iterator[None]:
+    """
+    Apply candidate configuration values for the duration of a simulation.
+
+    :param values: Configuration key -> value.
+    """
+    saved = {key: config.get(key) for key in values}
+    config.update(values)
+    try:
+        yield
+    finally:
+        config.update(saved)
+
+
+class SimScheduler:
+    """
+    Simulated scheduler: the linear scheduler, or the event loop of one task name.
+    """
+    __slots__ = ['key', 'queue', 'running', 'started', 'ready_at', 'generation']
+
+    def __init__(self, key: str) -> None:
+        self.key = key  # Scheduler key of the warm standby
+        self.queue = FairQueue()
+        self.running: Counter = Counter()  # Task name -> running tasks
+        self.started = False
+        self.ready_at = 0.0  # Time the scheduler has started up
+        self.generation = 0  # Incremented when work arrives, invalidates pending idle teardowns
+
+
+class Simulator:
+    """
+    Replays a trace through the simulated backends on a virtual clock.
+    """
+
+    def __init__(self, trace: List[TraceTask], max_concurrent: Dict[str, int], startup_cost: float) -> None:
+        """
+        :param trace: Tasks in arrival order.
+        :param max_concurrent: Task name -> `max_concurrent` option of its plugin.
+        :param startup_cost: Seconds a stopped scheduler takes to start.
+        """
+        self.trace = trace
+        self.max_concurrent = max_concurrent
+        self.startup_cost = startup_cost
+        self.now = 0.0
+        self.events: List[Tuple[float, int, str, Any]] = []  # Heap of (time, sequence, kind, payload)
+        self.sequence = itertools.count()
+        self.line = SimScheduler("line")
+        self.loops: Dict[str, SimScheduler] = {}  # Task name -> event loop
+        self.tenants = {LINE: TenantTracker(), ASYNC: TenantTracker()}
+        self.standby = {LINE: WarmStandby(self.clock), ASYNC: WarmStandby(self.clock)}
+        self.concurrency = AdaptiveLimit("line_task_min", "line_task_max", self.clock)
+        self.latencies = {LINE: [], ASYNC: []}  # Arrival to end of each completed task
+        self.waits = {LINE: [], ASYNC: []}  # Arrival to start
+        self.rejections = {LINE: Counter(), ASYNC: Counter()}  # Reason -> rejected tasks
+        self.busy = {LINE: 0.0, ASYNC: 0.0}  # Total service time
+        self.peak_loops = 0  # Most event loops running at once
+
+    def clock(self) -> float:
+        return self.now
+
+    def _schedule(self, at: float, kind: str, payload: Any) -> None:
+        heapq.heappush(self.events, (at, next(self.sequence), kind, payload))
+
+    def run(self) -> Dict:
+        """
+        Run the simulation with the current configuration.
+
+        :return: Dictionary of the results of each backend.
+        """
+        for index, task in enumerate(self.trace):
+            self._schedule(task.arrival, "arrival", index)
+
+        while self.events:
+            self.now, _, kind, payload = heapq.heappop(self.events)
+            if kind == "arrival":
+                self._arrive(payload)
+            elif kind == "finish":
+                self._finish(*payload)
+            elif kind == "ready":
+                self._dispatch(payload)
+            elif kind == "idle":
+                self._idle(*payload)
+        return self._results()
+
+    def _scheduler_of(self, task: TraceTask) -> SimScheduler:
+        if task.backend == LINE:
+            return self.line
+        if task.name not in self.loops:
+            self.loops[task.name] = SimScheduler(task.name)
+        return self.loops[task.name]
+
+    def _arrive(self, index: int) -> None:
+        task = self.trace[index]
+        scheduler = self._scheduler_of(task)
+        task_id = str(index)
+
+        # Admission, as in `SchedulerBase._admit_task`
+        if task.backend == LINE and scheduler.queue.qsize() >= config["maximum_queue_line"]:
+            self.rejections[LINE]["queue full"] += 1
+            return
+        if task.backend == ASYNC and scheduler.queue.qsize() >= config["maximum_queue_async"]:
+            self.rejections[ASYNC]["name queue full"] += 1
+            return
+        gid = task.tenant[1] if task.tenant and task.tenant[0] == "gid" else None
+        uid = task.tenant[1] if task.tenant and task.tenant[0] == "uid" else None
+        if self.tenants[task.backend].try_acquire(task_id, gid, uid) is not None:
+            self.rejections[task.backend]["tenant quota"] += 1
+            return
+
+        scheduler.queue.put(index, task.tenant)
+        standby = self.standby[task.backend]
+        standby.used(scheduler.key)
+        scheduler.generation += 1
+        if not scheduler.started:
+            scheduler.started = True
+            scheduler.ready_at = self.now + self.startup_cost
+            standby.started(scheduler.key)
+            self._schedule(scheduler.ready_at, "ready", scheduler)
+        else:
+            self._dispatch(scheduler)
+
+    def _limit(self, name: str, backend: str) -> int:
+        if backend == LINE:
+            return self.max_concurrent.get(name, 1)
+        return self.max_concurrent.get(name) or config["maximum_event_loop_tasks"]
+
+    def _dispatch(self, scheduler: SimScheduler) -> None:
+        """
+        Start the queued tasks the scheduler may run now, as in `IoLinerTask._next_task` and `IoAsyncTask._scheduler`.
+        """
+        if not scheduler.started or self.now < scheduler.ready_at:
+            return
+        while True:
+            if scheduler is self.line and sum(scheduler.running.values()) >= self.concurrency.current():
+                return
+            backend = LINE if scheduler is self.line else ASYNC
+            try:
+                index = scheduler.queue.get(eligible=lambda item: scheduler.running[self.trace[item].name]
+                                            < self._limit(self.trace[item].name, backend))
+            except queue.Empty:
+                return  # No eligible task
+            task = self.trace[index]
+            scheduler.running[task.name] += 1
+            self.tenants[backend].mark_running(str(index))
+            self.waits[backend].append(self.now - task.arrival)
+            self.busy[backend] += task.service
+            self._schedule(self.now + task.service, "finish", (index, self.now))
+            if backend == ASYNC:
+                self.peak_loops = max(self.peak_loops, sum(1 for loop in self.loops.values() if loop.running))
+
+    def _finish(self, index: int, started_at: float) -> None:
+        task = self.trace[index]
+        scheduler = self._scheduler_of(task)
+        if scheduler is self.line:
+            saturated = sum(scheduler.running.values()) >= self.concurrency.current()
+            self.concurrency.observe(task.name, task.service, started_at - task.arrival, saturated)
+        scheduler.running[task.name] -= 1
+        if not scheduler.running[task.name]:
+            del scheduler.running[task.name]
+        self.tenants[task.backend].release(str(index))
+        self.latencies[task.backend].append(self.now - task.arrival)
+
+        self._dispatch(scheduler)
+        if scheduler.queue.empty() and not scheduler.running:
+            standby = self.standby[task.backend]
+            if not standby.keep_warm(scheduler.key):
+                self._schedule(self.now + standby.idle_timeout(scheduler.key), "idle",
+                               (scheduler, scheduler.generation))
+
+    def _idle(self, scheduler: SimScheduler, generation: int) -> None:
+        if scheduler.generation != generation or not scheduler.started or scheduler.running \
+                or not scheduler.queue.empty():
+            return
+        scheduler.started = False
+        self.standby[LINE if scheduler is self.line else ASYNC].stopped(scheduler.key)
+
+    def _results(self) -> Dict:
+        span = max(self.now - (self.trace[0].arrival if self.trace else 0.0), 1e-9)
+        results = {}
+        for backend, label in ((LINE, "line"), (ASYNC, "asyncio")):
+            latencies = sorted(self.latencies[backend])
+            waits = sorted(self.waits[backend])
+            result = {
+                "completed": len(latencies),
+                "rejected": dict(self.rejections[backend]),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "wait_p95": percentile(waits, 95),
+                "starts": self.standby[backend].stats()["starts"]
+            }
+            if backend == LINE:
+                # Share of the thread pool busy over the trace
+                result["utilization"] = self.busy[LINE] / (span * max(int(config["line_task_max"]), 1))
+            else:
+                result["peak_loops"] = self.peak_loops
+            results[label] = result
+        return results
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    :param values: Sorted values.
+    :param percent: Percentile between 0 and 100.
+    :return: Value at the percentile, 0 if there are none.
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def parse_value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="Trace file written with task_trace_file")
+    parser.add_argument("--synthetic", type=int, default=5000, help="Number of tasks of the synthetic trace")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the synthetic trace")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=V1,V2",
+                        help="Candidate values of a configuration key, every combination is simulated")
+    parser.add_argument("--max-concurrent", action="append", default=[], metavar="NAME=N",
+                        help="max_concurrent option of a plugin, tasks of a name otherwise run one at a time")
+    parser.add_argument("--startup-cost", type=float, default=0.01, help="Seconds a stopped scheduler takes to start")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    options = parser.parse_args()
+    logger.remove()
+
+    trace = load_trace(options.trace) if options.trace else synthetic_trace(options.synthetic, options.seed)
+    if not trace:
+        parser.error("the trace has no task of the linear or asyncio backend")
+
+    candidates: Dict[str, List[Any]] = {}
+    for option in options.set:
+        key, _, values = option.partition("=")
+        if key not in config:
+            parser.error(f"unknown configuration key: {key}")
+        candidates[key] = [parse_value(value) for value in values.split(",")]
+    max_concurrent = {name: int(value) for name, _, value in
+                      (option.partition("=") for option in options.max_concurrent)}
+
+    runs = []
+    for combination in itertools.product(*candidates.values()):
+        values = dict(zip(candidates, combination))
+        with overrides(values):
+            results = Simulator(trace, max_concurrent, options.startup_cost).run()
+        runs.append({"config": values, "results": results})
+
+    if options.json:
+        print(json.dumps(runs, indent=2))
+        return
+
+    print(f"{len(trace)} tasks over {trace[-1].arrival:.0f} s")
+    for run in runs:
+        print(", ".join(f"{key}={value}" for key, value in run["config"].items()) or "current configuration")
+        for label, result in run["results"].items():
+            rejected = sum(result["rejected"].values())
+            extra = f"utilization {result['utilization']:6.1%}" if "utilization" in result \
+                else f"peak loops {result['peak_loops']}"
+            print(f"  {label:8} completed {result['completed']:6}, rejected {rejected:5}, "
+                  f"latency p50 {result['p50']:7.2f}s p95 {result['p95']:7.2f}s p99 {result['p99']:7.2f}s, "
+                  f"wait p95 {result['wait_p95']:7.2f}s, starts {result['starts']:4}, {extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ import websockets.exceptions
 from common import logger
 from config import config
 from message_action import message_processor
-from plugin_processing import timer_manager
+from plugin_processing import replay_task_journal, timer_manager
 from task_scheduling import shutdown
 
 
@@ -55,6 +55,13 @@ class WebSocketManager:
             daemon=True
         ).start()
 
+        # 重新加入重启前未完成的命令
+        threading.Thread(
+            target=replay_task_journal,
+            args=(websocket_ref(),),
+            daemon=True
+        ).start()
+
         try:
             while self.alive:
                 # 接收并处理消息
@@ -145,12 +145,14 @@ class MessageProcessor:
         websocket_ref, uid, nickname, gid, message_dict = item
         websocket = websocket_ref()
         if websocket:
-            for filter_name, filter_rule in filter_manager.filter_info.items():
-                if ban_filter(uid, gid, filter_name) and filter_rule[0] == message_dict['message']["type"]:
-                    logger.debug("过滤器触发")
-                    filter_manager.handle_message(websocket, uid, gid, message_dict,
-                                                  message_dict['message'], filter_name)
-                del filter_name, filter_rule
+            # 收集所有匹配的过滤器，一次性提交
+            filter_names = [filter_name for filter_name, filter_rule in filter_manager.filter_info.items()
+                            if ban_filter(uid, gid, filter_name) and filter_rule[0] == message_dict['message']["type"]]
+            if filter_names:
+                logger.debug(f"过滤器触发: {len(filter_names)} 个")
+                filter_manager.handle_messages(websocket, uid, gid, message_dict,
+                                               message_dict['message'], filter_names)
+            del filter_names
         del websocket_ref, uid, nickname, gid, message_dict, websocket  # 显式删除变量
 
     def handle_signal(self, signum: int, frame: Any) -> None:
@@ -56,6 +56,22 @@ def send_message(websocket, uid: int, gid: Optional[int] = None, **kwargs: Any)
     _send_json_message(websocket, msg)
 
 
+def send_stream_output(websocket, uid: int, gid: Optional[int], output: Any) -> None:
+    """
+    发送流式插件（处理函数为生成器）产生的一段输出。
+
+    Args:
+        websocket: WebSocket 连接对象。
+        uid: 用户 ID。
+        gid: 群组 ID（可选）。
+        output: 产生的输出，字典作为消息参数（如 message），其他内容转为文本消息，None 不发送。
+    """
+    if isinstance(output, dict):
+        send_message(websocket, uid, gid, **output)
+    elif output is not None:
+        send_message(websocket, uid, gid, message=str(output))
+
+
 def send_action(websocket, uid: int, gid: Optional[int] = None, action: str = None, **kwargs: Any) -> None:
     """
     向客户端发送指定操作的消息。
@@ -7,6 +7,7 @@ import weakref
 from typing import Set
 
 from common import logger
+from task_scheduling.scheduler.handler_analysis import handler_profiles
 
 
 class SimpleModuleLoader:
@@ -43,6 +44,9 @@ class SimpleModuleLoader:
         # 解析模块代码，查找导入语句
         self._parse_imports(module_code)
 
+        # 静态分析模块中的函数（按文件哈希缓存），用于选择执行后端并提示会阻塞事件循环的异步函数
+        handler_profiles.analyze(self.module_name, module_code)
+
         # 创建模块对象
         module = types.ModuleType(self.module_name)
         module.__file__ = self.module_path
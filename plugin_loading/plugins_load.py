@@ -7,6 +7,7 @@ from common import logger
 from memory_management import memory_release_decorator
 from module_processing import recorder, trigger_timer
 from plugin_loading.load_base import SimpleModuleLoader
+from task_scheduling import task_policy
 
 # 全局插件卸载管理器
 uninstall_manager = None
@@ -25,32 +26,39 @@ class PluginUninstall:
     def register_filter(self, filter_name: str,
                         timeout_processing: Optional[bool] = None,
                         handler: Optional[callable] = None,
-                        filter_rule: Optional[dict] = None) -> None:
+                        filter_rule: Optional[dict] = None,
+                        **policy: Any) -> None:
         # 从卸载管理器中删除过滤器信息
         del uninstall_manager.filter_info[filter_name]
+        task_policy.unregister(filter_name)
 
     # 注册插件并执行相应的卸载操作
     def register_plugin(self, name: str,
                         commands: Optional[list] = None,
                         asynchronous: Optional[bool] = None,
                         timeout_processing: Optional[bool] = None,
-                        handler: Optional[callable] = None) -> None:
+                        handler: Optional[callable] = None,
+                        **policy: Any) -> None:
         # 从卸载管理器中删除插件信息
         del uninstall_manager.plugin_info[name]
+        task_policy.unregister(name)
 
     # 注册文件并执行相应的卸载操作
     def register_file(self, name: str,
                       asynchronous: Optional[bool] = None,
                       timeout_processing: Optional[bool] = None,
-                      handler: Optional[callable] = None) -> None:
+                      handler: Optional[callable] = None,
+                      **policy: Any) -> None:
         # 从卸载管理器中删除文件信息
         del uninstall_manager.file_info[name]
+        task_policy.unregister(name)
 
     # 注册定时器并执行相应的卸载操作
     def register_timer(self, timer_name: str,
                        target_time: Optional[int] = None,
-                       handler: Optional[callable] = None) -> None:
-        pass
+                       handler: Optional[callable] = None,
+                       **policy: Any) -> None:
+        task_policy.unregister(timer_name)
 
 
 def get_directories(path: str) -> list:
@@ -3,4 +3,5 @@ from .file_manager import *
 from .adapter_manager import *
 from .filter_manager import *
 from .timer_manager import *
-from .system_manager import *
\ No newline at end of file
+from .system_manager import *
+from .journal_replay import *
@@ -1,10 +1,12 @@
 import asyncio
+from functools import partial
 from typing import Callable, Dict, Tuple, Any
 
 from common import logger
 from config import config
+from message_action import send_stream_output
 from plugin_loading import load
-from task_scheduling import add_task
+from task_scheduling import add_task, task_policy
 
 
 class FileManager:
@@ -19,17 +21,19 @@ class FileManager:
         """
         self.file_info: Dict[str, Tuple[bool, Callable]] = {}
 
-    def register_file(self, name: str, timeout_processing: bool, handler: Callable) -> None:
+    def register_file(self, name: str, timeout_processing: bool, handler: Callable, **policy: Any) -> None:
         """
         注册文件处理插件。
 
         :param name: 文件名称。
         :param timeout_processing: 是否启用超时处理。
-        :param handler: 文件处理函数。
-        :raises ValueError: 如果 `handler` 不是可调用对象。
+        :param handler: 文件处理函数，可以是生成器或异步生成器，每产生一段输出立即作为消息发送。
+        :param policy: 任务调度策略选项，见 `TaskPolicy.__init__`。
+        :raises ValueError: 如果 `handler` 不是可调用对象或调度策略无效。
         """
         if not callable(handler):
             raise ValueError("Handler must be a callable function.")
+        task_policy.register(name, **policy)
         self.file_info[name] = (timeout_processing, handler)
         logger.debug(f"FILE 文件检测:| {name} |导入成功 FILE")
 
@@ -56,7 +60,12 @@ class FileManager:
             uid,
             nickname,
             gid,
-            message_dict["message"]["data"]["file_id"]
+            message_dict["message"]["data"]["file_id"],
+            gid=gid,
+            uid=uid,
+            deadline=config.get("task_deadlines", {}).get("file"),
+            on_output=partial(send_stream_output, websocket, uid, gid),
+            journal="file"
         )
 
         # 显式删除不再使用的变量
@@ -1,10 +1,12 @@
 import asyncio
-from typing import Callable, Dict, Tuple, Any
+from functools import partial
+from typing import Callable, Dict, List, Tuple, Any
 
 from common import logger
 from config import config
+from message_action import send_stream_output
 from plugin_loading import load
-from task_scheduling import add_task
+from task_scheduling import add_task, add_tasks, task_policy
 
 
 class FilterManager:
@@ -19,24 +21,30 @@ class FilterManager:
         """
         self.filter_info: Dict[str, Tuple[str, bool, Callable]] = {}
 
-    def register_plugin(self, filter_name: str, filter_rule: str, timeout_processing: bool,
-                        handler: Callable) -> None:
+    def register_filter(self, filter_name: str, filter_rule: str, timeout_processing: bool,
+                        handler: Callable, **policy: Any) -> None:
         """
         注册一个新的过滤器。
 
         :param filter_name: 过滤器名称。
         :param filter_rule: 过滤器筛选类型（正则表达式字符串）。
         :param timeout_processing: 是否启用超时处理。
-        :param handler: 处理函数。
+        :param handler: 处理函数，可以是生成器或异步生成器，每产生一段输出立即作为消息发送（字符串为消息文本，字典为消息参数）。
+        :param policy: 任务调度策略选项，见 `TaskPolicy.__init__`，过滤器默认不计入群和用户的任务上限。
         :raises ValueError: 如果 `handler` 不是可调用对象或 `filter_rule` 不是字符串。
         """
         if not callable(handler):
             raise ValueError("Handler must be a callable function.")
         if not isinstance(filter_rule, str):
             raise ValueError("Filter rule must be a string representing a regex pattern.")
+        policy.setdefault("tenant_quota", False)
+        task_policy.register(filter_name, **policy)
         self.filter_info[filter_name] = (filter_rule, timeout_processing, handler)
         logger.debug(f"FILTERS 过滤器:| {filter_name} |导入成功 FILTERS")
 
+    # 兼容旧的注册方法名
+    register_plugin = register_filter
+
     def handle_message(self, websocket: Any, uid: int, gid: int, message_dict: dict, message: str,
                        filter_name: str) -> None:
         """
@@ -58,7 +66,11 @@ class FilterManager:
             uid,
             gid,
             message,
-            message_dict
+            message_dict,
+            gid=gid,
+            uid=uid,
+            deadline=config.get("task_deadlines", {}).get("filter"),
+            on_output=partial(send_stream_output, websocket, uid, gid)
         )
 
         # 显式删除不再使用的变量
@@ -66,6 +78,28 @@ class FilterManager:
         del timeout_processing
         del handler
 
+    def handle_messages(self, websocket: Any, uid: int, gid: int, message_dict: dict, message: str,
+                        filter_names: List[str]) -> None:
+        """
+        将一条消息同时交给多个过滤器处理，一次性批量提交任务。
+
+        :param websocket: WebSocket 连接对象。
+        :param uid: 用户 ID。
+        :param gid: 群组 ID。
+        :param message_dict: 消息字典。
+        :param message: 接收到的消息。
+        :param filter_names: 匹配的过滤器名称列表。
+        """
+        tasks = []
+        for filter_name in filter_names:
+            _, timeout_processing, handler = self.filter_info[filter_name]
+            tasks.append((timeout_processing, filter_name, handler, (websocket, uid, gid, message, message_dict), {}))
+        add_tasks(tasks, gid=gid, uid=uid, deadline=config.get("task_deadlines", {}).get("filter"),
+                  on_output=partial(send_stream_output, websocket, uid, gid))
+
+        # 显式删除不再使用的变量
+        del tasks
+
 
 # 加载过滤器管理器
 filter_dir = config["filters_dir"]
@@ -0,0 +1,66 @@
+from functools import partial
+from typing import Any, Callable, Optional, Tuple
+
+from common import logger
+from config import config
+from message_action import send_stream_output
+from task_scheduling import add_task
+from task_scheduling.task_journal import task_journal
+from .file_manager import file_manager
+from .plugin_manager import plugin_manager
+
+
+def _find_handler(kind: str, name: str) -> Optional[Tuple[bool, Callable]]:
+    """
+    根据任务日志中记录的管理器类型和插件名称查找当前的处理函数。
+
+    :param kind: 管理器类型，plugin 或 file。
+    :param name: 插件名称。
+    :return: (是否启用超时处理, 处理函数)，插件已不存在时返回 None。
+    """
+    if kind == "plugin" and name in plugin_manager.plugin_info:
+        timeout_processing, _, handler = plugin_manager.plugin_info[name]
+        return timeout_processing, handler
+    if kind == "file" and name in file_manager.file_info:
+        return file_manager.file_info[name]
+    return None
+
+
+def replay_task_journal(websocket: Any) -> None:
+    """
+    连接建立后，将上次运行时已接收但未完成的命令重新加入任务队列（需开启 task_journal）。
+    每次运行只重放一次，重放后旧记录标记为已完成。
+
+    :param websocket: 新的 WebSocket 连接对象，代替记录中省略的旧连接。
+    """
+    entries = task_journal.take_leftovers()
+    if not entries:
+        return
+
+    replayed = 0
+    for entry in entries:
+        found = _find_handler(entry["kind"], entry["name"])
+        if found is None:
+            logger.warning(f"任务日志中的插件 | {entry['name']} | 已不存在，跳过重放")
+        else:
+            timeout_processing, handler = found
+            gid, uid = entry["gid"], entry["uid"]
+            future = add_task(
+                timeout_processing,
+                entry["name"],
+                handler,
+                websocket,
+                *entry["args"],
+                gid=gid,
+                uid=uid,
+                deadline=config.get("task_deadlines", {}).get(entry["kind"]),
+                on_output=partial(send_stream_output, websocket, uid, gid),
+                journal=entry["kind"]
+            )
+            if future is not None:
+                replayed += 1
+
+        # 旧记录已由新任务代替或无法重放
+        task_journal.complete(entry["id"])
+
+    logger.info(f"任务日志: 重放了 {replayed}/{len(entries)} 个上次未完成的任务")
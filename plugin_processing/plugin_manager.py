@@ -1,12 +1,13 @@
 import asyncio
+from functools import partial
 from typing import Callable, Dict, List, Tuple, Any
 
 from common import logger
 from config import config
-from message_action import send_message
+from message_action import send_message, send_stream_output
 from permission_check import tracker
 from plugin_loading import load
-from task_scheduling import add_task
+from task_scheduling import add_task, task_policy, tenant_rejection
 
 
 class PluginManager:
@@ -23,18 +24,20 @@ class PluginManager:
         self.load_module: Dict = {}
 
     def register_plugin(self, name: str, timeout_processing: bool,
-                        commands: List[str], handler: Callable) -> None:
+                        commands: List[str], handler: Callable, **policy: Any) -> None:
         """
         注册一个新的插件。
 
         :param name: 插件名称。
         :param timeout_processing: 是否启用超时处理。
         :param commands: 插件支持的命令列表。
-        :param handler: 处理函数。
-        :raises ValueError: 如果 `handler` 不是可调用对象。
+        :param handler: 处理函数，可以是生成器或异步生成器，每产生一段输出立即作为消息发送（字符串为消息文本，字典为消息参数）。
+        :param policy: 任务调度策略选项，见 `TaskPolicy.__init__`。
+        :raises ValueError: 如果 `handler` 不是可调用对象或调度策略无效。
         """
         if not callable(handler):
             raise ValueError("Handler must be a callable function.")
+        task_policy.register(name, **policy)
         self.plugin_info[name] = (timeout_processing, commands, handler)
         logger.debug(f"FUNC 功能插件:| {name} |导入成功 FUNC")
 
@@ -51,7 +54,7 @@ class PluginManager:
         """
         if tracker.can_use_detection(uid, gid):
             timeout_processing, _, handler = self.plugin_info[plugin_name]
-            add_task(
+            future = add_task(
                 timeout_processing,
                 plugin_name,
                 handler,
@@ -59,8 +62,15 @@ class PluginManager:
                 uid,
                 nickname,
                 gid,
-                message
+                message,
+                gid=gid,
+                uid=uid,
+                deadline=config.get("task_deadlines", {}).get("plugin"),
+                on_output=partial(send_stream_output, websocket, uid, gid),
+                journal="plugin"
             )
+            if future is None and tenant_rejection(plugin_name, handler, gid, uid) is not None:
+                send_message(websocket, uid, gid, message="你提交的任务太多了，等前面的任务完成后再试吧")
         else:
             send_message(websocket, None, gid, message="今天你的使用次数到达上限了，休息一会吧")
 
@@ -1,9 +1,11 @@
+from functools import partial
 from typing import Callable, Dict, List, Tuple, Any
 
 from common import logger
 from config import config
+from message_action import send_stream_output
 from plugin_loading import load
-from task_scheduling import add_task
+from task_scheduling import add_task, task_policy
 
 
 class SystemManager:
@@ -19,18 +21,21 @@ class SystemManager:
         self.system_info: Dict[str, Tuple[bool, List[str], Callable]] = {}
 
     def register_system(self, name: str, timeout_processing: bool,
-                        commands: List[str], handler: Callable) -> None:
+                        commands: List[str], handler: Callable, **policy: Any) -> None:
         """
         注册一个新的系统插件。
 
         :param name: 系统插件名称。
         :param timeout_processing: 是否启用超时处理。
         :param commands: 插件支持的命令列表。
-        :param handler: 处理函数。
-        :raises ValueError: 如果 `handler` 不是可调用对象。
+        :param handler: 处理函数，可以是生成器或异步生成器，每产生一段输出立即作为消息发送（字符串为消息文本，字典为消息参数）。
+        :param policy: 任务调度策略选项，见 `TaskPolicy.__init__`，系统插件默认不熔断。
+        :raises ValueError: 如果 `handler` 不是可调用对象或调度策略无效。
         """
         if not callable(handler):
             raise ValueError("Handler must be a callable function.")
+        policy.setdefault("circuit_breaker", False)
+        task_policy.register(name, **policy)
         self.system_info[name] = (timeout_processing, commands, handler)
         logger.debug(f"SYSTEM 系统插件:| {name} |导入成功 SYSTEM")
 
@@ -55,7 +60,9 @@ class SystemManager:
             uid,
             nickname,
             gid,
-            message
+            message,
+            deadline=config.get("task_deadlines", {}).get("system"),
+            on_output=partial(send_stream_output, websocket, uid, gid)
         )
 
         # 显式删除不再使用的变量
@@ -5,7 +5,7 @@ from typing import Callable, List, Tuple, Any
 from common import logger
 from config import config
 from plugin_loading import load
-from task_scheduling import add_task
+from task_scheduling import add_task, task_policy
 
 
 class TimerManager:
@@ -44,17 +44,20 @@ class TimerManager:
 
 
 
-    def register_timer(self, timer_name: str, handler: Callable, target_time: str) -> None:
+    def register_timer(self, timer_name: str, handler: Callable, target_time: str, **policy: Any) -> None:
         """
         注册一个新的定时任务。
 
         :param timer_name: 定时器名称。
         :param handler: 定时任务处理函数。
         :param target_time: 目标时间。
-        :raises ValueError: 如果 `handler` 不是可调用对象。
+        :param policy: 任务调度策略选项，见 `TaskPolicy.__init__`，定时任务默认不熔断。
+        :raises ValueError: 如果 `handler` 不是可调用对象或调度策略无效。
         """
         if not callable(handler):
             raise ValueError("Handler must be a callable function.")
+        policy.setdefault("circuit_breaker", False)
+        task_policy.register(timer_name, **policy)
         self.time_tasks.append((timer_name, handler, target_time))
         logger.debug(f"TIME 定时器:| {timer_name} |加载成功 TIME")
 
@@ -111,5 +111,7 @@ def register(system_manager) -> None:
         name=SYSTEM_NAME,
         commands=["/系统情况"],
         timeout_processing=True,
-        handler=memory_footprint
+        handler=memory_footprint,
+        # 采样 CPU 需要 1 秒，同一群内同时发起的查询共用一次执行，结果发送到该群
+        single_flight=lambda websocket, uid, nickname, gid, message_dict: gid
     )
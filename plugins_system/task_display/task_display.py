@@ -1,7 +1,7 @@
 from typing import Dict, Any
 
 from message_action import send_message
-from task_scheduling import get_all_queue_info
+from task_scheduling import backends, get_all_queue_info, get_circuit_breaker_info, get_fair_share_info
 
 SYSTEM_NAME = "任务显示"  # 自定义插件名称
 
@@ -29,8 +29,8 @@ def task_display(websocket: Any, uid: str, nickname: str, gid: str, message_dict
     :param message_dict: 消息字典，包含发送的消息。
     """
 
-    info = get_all_queue_info("line", True)
-    info += get_all_queue_info("asyncio", True)
+    info = "".join(get_all_queue_info(name, True) for name, _ in backends.items()) + get_circuit_breaker_info() \
+        + get_fair_share_info()
     send_notification(websocket, uid, gid, message=info)
 
 
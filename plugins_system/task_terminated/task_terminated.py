@@ -2,7 +2,7 @@ import re
 from typing import Dict, Any, Optional
 
 from message_action import send_message
-from task_scheduling import io_liner_task, io_async_task
+from task_scheduling import backends
 
 SYSTEM_NAME = "任务终止"  # 自定义插件名称
 
@@ -35,8 +35,8 @@ def task_terminated(websocket: Any, uid: str, nickname: str, gid: str, message_d
 
     message = message_dict["raw_message"].strip()
     plugin_id = parse_plugin_info(message)
-    io_liner_task.force_stop_task(plugin_id)
-    io_async_task.force_stop_task(plugin_id)
+    for _, scheduler in backends.items():
+        scheduler.force_stop_task(plugin_id)
     send_message(websocket, None, gid, message="任务结束成功")
 
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
-from .queue_info_display import get_all_queue_info
+from .queue_info_display import get_all_queue_info, get_circuit_breaker_info, get_fair_share_info
 from .scheduler import *
-from .task_assignment import add_task, shutdown
+from .task_assignment import add_task, add_tasks, shutdown, tenant_rejection
+from .task_graph import TaskGraph
 
 __version__ = "1.1.8"
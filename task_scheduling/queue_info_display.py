@@ -3,8 +3,9 @@ import time
 from typing import Dict, List
 
 from config import config
-from .scheduler import io_async_task
-from .scheduler import io_liner_task
+from .scheduler import backends
+from .scheduler.circuit_breaker import circuit_breakers
+from .scheduler.fair_share import fair_share
 
 
 def format_task_info(task_id: str, details: Dict, show_id: bool) -> str:
@@ -47,6 +48,8 @@ def format_task_info(task_id: str, details: Dict, show_id: bool) -> str:
         "timeout": " (Task timed out)",
         "failed": " (Task failed)",
         "cancelled": " (Task cancelled)",
+        "killed": " (Task killed at its deadline)",
+        "coalesced": " (Shared the result of an identical task)",
     }.get(status, "")
 
     # Format task information
@@ -61,7 +64,7 @@ def get_queue_info_string(task_queue, queue_type: str, show_id: bool) -> str:
     Get the string of queue information.
 
     :param task_queue: Task queue object.
-    :param queue_type: Queue type (e.g., "line" or "asyncio").
+    :param queue_type: Queue type (e.g., "line", "asyncio" or "process").
     :param show_id: Boolean flag to determine whether to show the task ID.
     :return: String of queue information.
     """
@@ -70,7 +73,9 @@ def get_queue_info_string(task_queue, queue_type: str, show_id: bool) -> str:
         info: List[str] = [
             f"\n{queue_type} queue size: {queue_info['queue_size']}, ",
             f"Running tasks count: {queue_info['running_tasks_count']}, ",
-            f"Failed tasks count: {queue_info['failed_tasks_count']}\n",
+            f"Killed tasks count: {queue_info['killed_tasks_count']}, ",
+            f"Failed tasks count: {queue_info['failed_tasks_count']}, ",
+            f"Coalesced tasks count: {queue_info['coalesced_tasks_count']}\n",
         ]
 
         # Output task details
@@ -78,6 +83,140 @@ def get_queue_info_string(task_queue, queue_type: str, show_id: bool) -> str:
             # if details["status"] != "pending":
             info.append(format_task_info(task_id, details, show_id))
 
+        if queue_info.get("task_names"):
+            info.append(f"\n{queue_type} busiest task names:\n")
+            for counts in queue_info["task_names"]:
+                info.append(
+                    f"{counts['task_name']}: pending {counts.get('pending', 0)}, "
+                    f"running {counts.get('running', 0)}\n"
+                )
+
+        if queue_info.get("tenant_usage"):
+            info.append(f"\n{queue_type} busiest groups and users:\n")
+            for tenant in queue_info["tenant_usage"]:
+                info.append(
+                    f"{tenant['type']} {tenant['id']}: queued {tenant['queued']}, running {tenant['running']}\n"
+                )
+
+        if queue_info.get("result_store"):
+            store = queue_info["result_store"]
+            info.append(
+                f"{queue_type} stored results: {store['stored_results']} "
+                f"({store['memory_usage'] / 1024:.1f} KB), pending futures: {store['pending_futures']}, "
+                f"evicted results: {store['evicted_results']}\n"
+            )
+
+        if queue_info.get("concurrency"):
+            concurrency = queue_info["concurrency"]
+            info.append(
+                f"{queue_type} concurrency limit: {concurrency['limit']} "
+                f"(between {concurrency['minimum']} and {concurrency['maximum']}"
+                f"{'' if concurrency['enabled'] else ', adaptive limit disabled'})\n"
+            )
+            for decision in concurrency["decisions"][-3:]:
+                info.append(
+                    f"{decision['time']}: {decision['previous']} -> {decision['limit']}, {decision['reason']}, "
+                    f"{decision['throughput']} tasks/s\n"
+                )
+
+        if queue_info.get("latency"):
+            info.append(f"\n{queue_type} slowest task names:\n")
+            for latency in queue_info["latency"]:
+                info.append(
+                    f"{latency['task_name']}: p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, "
+                    f"samples {latency['samples']}\n"
+                )
+
+        if queue_info.get("first_output"):
+            info.append(f"\n{queue_type} time to first output of streaming task names:\n")
+            for latency in queue_info["first_output"]:
+                info.append(
+                    f"{latency['task_name']}: p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, "
+                    f"samples {latency['samples']}\n"
+                )
+
+        usage = queue_info.get("resource_usage") or {}
+        if usage.get("cpu"):
+            info.append(f"\n{queue_type} task names using the most CPU time:\n")
+            for item in usage["cpu"]:
+                info.append(
+                    f"{item['task_name']}: {item['cpu_total']:.2f}s in {item['tasks']} tasks "
+                    f"(mean {item['cpu_mean'] * 1000:.1f} ms)\n"
+                )
+        if usage.get("wall"):
+            info.append(f"\n{queue_type} task names using the most wall time:\n")
+            for item in usage["wall"]:
+                info.append(
+                    f"{item['task_name']}: {item['wall_total']:.2f}s in {item['tasks']} tasks "
+                    f"(mean {item['wall_mean']:.3f}s)\n"
+                )
+        if usage.get("wait"):
+            info.append(f"\n{queue_type} task names waiting the longest in the queue:\n")
+            for item in usage["wait"]:
+                info.append(
+                    f"{item['task_name']}: {item['wait_total']:.2f}s in {item['tasks']} tasks "
+                    f"(mean {item['wait_mean']:.3f}s)\n"
+                )
+        if usage.get("memory"):
+            info.append(f"\n{queue_type} task names allocating the most memory (sampled):\n")
+            for item in usage["memory"]:
+                info.append(
+                    f"{item['task_name']}: mean {item['allocated_mean'] / 1024:.1f} KB, "
+                    f"max {item['allocated_max'] / 1024:.1f} KB, {item['sampled']} sampled tasks\n"
+                )
+
+        misses = queue_info.get("deadline_misses")
+        if misses:
+            info.append(
+                f"{queue_type} tasks predicted to miss their deadline: rejected {misses.get('rejected', 0)}, "
+                f"degraded {misses.get('degraded', 0)}\n"
+            )
+
+        standby = queue_info.get("standby")
+        if standby and standby["starts"]:
+            timeouts = ", ".join(
+                f"{item['scheduler']} {item['idle_timeout']:.0f}s" for item in standby["schedulers"]
+            )
+            info.append(
+                f"{queue_type} scheduler startups: {standby['starts']}, teardowns: {standby['stops']}, "
+                f"idle timeouts: {timeouts}\n"
+            )
+
+        promotion = queue_info.get("inline_promotion")
+        if promotion and (promotion["promoted"] or promotion["demotions"]):
+            info.append(
+                f"{queue_type} promoted plugins: {', '.join(promotion['promoted']) or 'none'} "
+                f"({promotion['promotions']} promotions, {promotion['demotions']} demotions)\n"
+            )
+
+        loop_lag = queue_info.get("loop_lag")
+        if loop_lag and loop_lag["stalls"]:
+            names = ", ".join(
+                f"{item['task_name']} {item['stalls']}x (max {item['max_lag']:.2f}s"
+                f"{', in a thread' if item['offloaded'] else ''})" for item in loop_lag["names"]
+            )
+            info.append(f"{queue_type} event loop stalls: {loop_lag['stalls']}, {names}\n")
+
+        offload = queue_info.get("offload")
+        if offload and offload["leaked"]:
+            runs = ", ".join(f"{item['task_name']} ({item['task_id']})" for item in offload["leaked"])
+            info.append(f"{queue_type} leaked offload threads: {len(offload['leaked'])}/{offload['threads']}, {runs}\n")
+
+        for lock_name, lock in queue_info.get("locks", {}).items():
+            if lock["contended"]:
+                info.append(
+                    f"{queue_type} {lock_name} lock: {lock['contended']}/{lock['acquisitions']} contended, "
+                    f"wait {lock['wait_total_ms']:.1f} ms (max {lock['wait_max_ms']:.1f}), "
+                    f"hold {lock['hold_total_ms']:.1f} ms (max {lock['hold_max_ms']:.1f})\n"
+                )
+
+        batches = queue_info.get("micro_batches")
+        if batches and (batches["batches"] or batches["waiting_tasks"]):
+            info.append(
+                f"{queue_type} batches: {batches['batches']}, batched tasks: {batches['batched_tasks']}, "
+                f"waiting for a batch: {batches['waiting_tasks']}\n"
+            )
+
         if queue_info.get("error_logs"):
             info.append(f"\n{queue_type} error logs:\n")
             for error in queue_info["error_logs"]:
@@ -96,17 +235,45 @@ def get_all_queue_info(queue_type: str, show_id: bool) -> str:
     """
     Get the string of all queue information.
 
-    :param queue_type: Queue type (e.g., "line" or "asyncio").
+    :param queue_type: Name of an execution backend (e.g., "line", "asyncio", "process" or "inline").
     :param show_id: Boolean flag to determine whether to show the task ID.
     :return: String of all queue information.
     """
-    queue_mapping = {
-        "line": io_liner_task,
-        "asyncio": io_async_task,
-    }
-
-    task_queue = queue_mapping.get(queue_type)
+    task_queue = backends.get(queue_type)
     if task_queue:
         return get_queue_info_string(task_queue, queue_type, show_id)
     else:
         return f"Unknown queue type: {queue_type}"
+
+
+def get_circuit_breaker_info() -> str:
+    """
+    Get the string of the circuit breakers that are open or have opened before.
+
+    :return: String of circuit breaker information, empty if no breaker ever opened.
+    """
+    breakers = circuit_breakers.stats()
+    if not breakers:
+        return ""
+    info: List[str] = ["\ncircuit breakers:\n"]
+    for breaker in breakers:
+        info.append(
+            f"{breaker['task_name']}: {breaker['state']} for {breaker['since']:.0f}s, last opened because "
+            f"{breaker['reason']}, opened {breaker['open_count']} times, rejected {breaker['rejected']} tasks\n"
+        )
+    return "".join(info)
+
+
+def get_fair_share_info() -> str:
+    """
+    Get the string of the users with the highest share of the recent CPU and run time.
+
+    :return: String of fair share information, empty if no user consumed anything in the window.
+    """
+    users = fair_share.stats()
+    if not users:
+        return ""
+    info: List[str] = ["\nusers with the highest fair share:\n"]
+    for user in users:
+        info.append(f"uid {user['uid']}: {user['share']:.0%}, CPU {user['cpu']:.2f}s, run time {user['wall']:.2f}s\n")
+    return "".join(info)
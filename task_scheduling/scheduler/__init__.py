@@ -1,5 +1,13 @@
 # -*- coding: utf-8 -*-
+from .backends import backends
+from .circuit_breaker import TaskRejected, circuit_breakers
+from .handler_analysis import handler_profiles
 from .io_async_task import io_async_task
+from .io_inline_task import io_inline_task
 from .io_liner_task import io_liner_task
+from .io_process_task import io_process_task
+from .result_store import TaskFuture
+from .scheduler_base import SchedulerBase
+from .task_policy import TaskPolicy, task_policy
 from .utils import *
 
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Callable, Dict, List, Tuple, Optional
+
+from common import logger
+from config import config
+from .handler_analysis import CPU_HEAVY, handler_profiles
+from .inline_promotion import inline_promotion
+from .io_async_task import io_async_task
+from .io_inline_task import io_inline_task
+from .io_liner_task import io_liner_task
+from .io_process_task import io_process_task
+from .scheduler_base import SchedulerBase
+from .task_policy import EXECUTION_BACKENDS, task_policy
+from .utils import is_async_function
+
+
+class BackendRegistry:
+    """
+    Registry of the execution backends tasks can be added to.
+    A plugin chooses one with the `execution` option of its policy, otherwise coroutine functions run in
+    event loops ("asyncio") and other functions in the thread pool ("line"), or in worker processes ("process")
+    if the static analysis of the plugin found them CPU-bound and `plugin_analysis_process` is enabled.
+    Plugins whose functions were measured to return almost immediately run inline instead of in the thread pool.
+    """
+    __slots__ = ['backends', 'lock']
+
+    def __init__(self) -> None:
+        self.backends: Dict[str, SchedulerBase] = {}  # Backend name -> scheduler
+        self.lock = threading.Lock()  # Lock to protect access to the backends
+
+    def register(self, name: str, scheduler: SchedulerBase) -> None:
+        """
+        Register an execution backend, replacing any previous one with the same name.
+        Plugins can then select it with `execution=name`.
+
+        :param name: Backend name.
+        :param scheduler: Scheduler running the tasks, implementing `SchedulerBase`.
+        """
+        with self.lock:
+            self.backends[name] = scheduler
+            if name not in EXECUTION_BACKENDS:
+                EXECUTION_BACKENDS.append(name)
+
+    def get(self, name: str) -> Optional[SchedulerBase]:
+        """
+        Get a backend by name.
+
+        :param name: Backend name.
+        :return: Scheduler, or None if no backend has this name.
+        """
+        return self.backends.get(name)
+
+    def items(self) -> List[Tuple[str, SchedulerBase]]:
+        """
+        Get all backends.
+
+        :return: List of (name, scheduler).
+        """
+        with self.lock:
+            return list(self.backends.items())
+
+    def select(self, task_name: str, func: Callable, execution: Optional[str] = None) -> Tuple[str, SchedulerBase]:
+        """
+        Choose the backend of a task from the policy of its plugin and the type of its function.
+
+        :param task_name: Task name.
+        :param func: Task function.
+        :param execution: Backend requested by the caller, takes precedence over the policy of the plugin.
+        :return: Backend name and scheduler.
+        """
+        policy = task_policy.get(task_name)
+        if policy.batch_handler is not None:
+            # The tasks of the plugin are only ever run by its batch handler
+            func = policy.batch_handler
+        name = execution or ("process" if policy.isolated else policy.execution)
+        if name is not None:
+            scheduler = self.backends.get(name)
+            if scheduler is not None and scheduler.accepts(func):
+                return name, scheduler
+            logger.warning(f"Task | {task_name} | cannot run in backend '{name}', using the default backend")
+
+        if config.get("plugin_analysis_process", False):
+            profile = handler_profiles.get(func)
+            if profile is not None and profile.kind == CPU_HEAVY:
+                scheduler = self.backends.get("process")
+                if scheduler is not None and scheduler.accepts(func):
+                    return "process", scheduler
+
+        name = "asyncio" if is_async_function(func) else "line"
+        if name == "line" and inline_promotion.is_promoted(task_name):
+            return "inline", self.backends["inline"]
+        return name, self.backends[name]
+
+
+backends = BackendRegistry()
+backends.register("line", io_liner_task)
+backends.register("asyncio", io_async_task)
+backends.register("process", io_process_task)
+backends.register("inline", io_inline_task)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from common import logger
+from config import config
+
+# States of a breaker
+CLOSED = "closed"  # Tasks are admitted and their outcomes recorded
+OPEN = "open"  # Tasks are rejected until `breaker_open_seconds` have passed
+HALF_OPEN = "half-open"  # A few probe tasks are admitted, their outcomes close or reopen the breaker
+
+# Final statuses counted as failures, "completed" is the only success
+FAILED_STATUSES = ("failed", "timeout", "killed")
+# Runtimes of completed tasks needed before the p99 runtime can open a breaker, a smaller window's p99 is its maximum
+LATENCY_SAMPLES = 100
+
+
+class TaskRejected(Exception):
+    """
+    Raised by a handler to refuse a request of the user, e.g. a missing permission or invalid arguments.
+    The task fails as with any other exception, but the circuit breaker of its plugin does not count it.
+    """
+
+
+class CircuitBreaker:
+    """
+    State of the breaker of one task name and the outcomes of its last tasks.
+    """
+    __slots__ = ['state', 'outcomes', 'runtimes', 'changed_at', 'probes', 'reason', 'open_count', 'rejected']
+
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.outcomes: Deque[bool] = deque()  # Whether each of the last tasks failed, while closed
+        self.runtimes: Deque[float] = deque(maxlen=LATENCY_SAMPLES)  # Runtimes of the last completed tasks
+        self.changed_at = 0.0  # Monotonic time of the last change of state
+        self.probes = 0  # Probe tasks admitted since the breaker half-opened
+        self.reason = ""  # Why the breaker last opened
+        self.open_count = 0  # Number of times the breaker opened
+        self.rejected = 0  # Tasks rejected while open
+
+    def trip_reason(self) -> Optional[str]:
+        """
+        Check the outcomes of the last tasks against the thresholds.
+
+        :return: Why the breaker must open, or None.
+        """
+        if len(self.outcomes) >= config.get("breaker_min_calls", 10):
+            failures = sum(self.outcomes)
+            if failures / len(self.outcomes) >= config.get("breaker_error_rate", 0.5):
+                return f"{failures}/{len(self.outcomes)} of the last tasks failed"
+
+        # Tasks that hit their timeout already count as failures, the latency trip is for slow but completing ones
+        p99_limit = config.get("breaker_p99_seconds", 0)
+        if p99_limit and len(self.runtimes) >= LATENCY_SAMPLES:
+            runtimes = sorted(self.runtimes)
+            # Nearest rank, the 99th of 100 runtimes rather than the slowest one
+            p99 = runtimes[math.ceil(len(runtimes) * 0.99) - 1]
+            if p99 >= p99_limit:
+                return f"p99 runtime is {p99:.1f}s"
+        return None
+
+
+class CircuitBreakers:
+    """
+    Circuit breakers of the task names, shared by all backends.
+    A breaker opens when, over the last `breaker_window` tasks of its name, the error rate reaches
+    `breaker_error_rate`, or, if `breaker_p99_seconds` is set, when the p99 runtime of its last `LATENCY_SAMPLES`
+    completed tasks reaches it. While open, new tasks of the name are
+    rejected before taking any queue slot. After `breaker_open_seconds` it half-opens and admits `breaker_probes`
+    tasks: a successful probe closes it, a failed one opens it again.
+    Task names whose policy disables `circuit_breaker`, e.g. system commands, are neither recorded nor rejected.
+    """
+    __slots__ = ['breakers', 'lock']
+
+    def __init__(self) -> None:
+        self.breakers: Dict[str, CircuitBreaker] = {}  # Task name -> breaker
+        self.lock = threading.Lock()  # Lock to protect access to the breakers
+
+    def allow(self, task_name: str) -> Optional[str]:
+        """
+        Check whether a task may be added.
+
+        :param task_name: Task name.
+        :return: Reason the task is rejected, or None.
+        """
+        breaker = self.breakers.get(task_name)
+        if breaker is None or breaker.state == CLOSED:
+            return None  # Common case, no lock needed
+
+        now = time.monotonic()
+        with self.lock:
+            if breaker.state == OPEN and now - breaker.changed_at >= config.get("breaker_open_seconds", 30):
+                breaker.state = HALF_OPEN
+                breaker.changed_at = now
+                breaker.probes = 0
+                logger.info(f"Circuit breaker | {task_name} | half-open, probing")
+            elif breaker.state == HALF_OPEN and now - breaker.changed_at >= config.get("breaker_open_seconds", 30):
+                # The probes were never run, e.g. rejected by a full queue, allow new ones
+                breaker.changed_at = now
+                breaker.probes = 0
+
+            if breaker.state == HALF_OPEN and breaker.probes < config.get("breaker_probes", 1):
+                breaker.probes += 1
+                return None
+            if breaker.state == CLOSED:
+                return None
+            breaker.rejected += 1
+            return f"circuit breaker of | {task_name} | is {breaker.state} ({breaker.reason})"
+
+    def record(self, task_name: str, status: str, runtime: float, error: Optional[BaseException] = None) -> None:
+        """
+        Record the outcome of a finished task, opening or closing the breaker of its name.
+
+        :param task_name: Task name.
+        :param status: Final status of the task, statuses other than "completed" and `FAILED_STATUSES` are ignored.
+        :param runtime: Time the task ran in seconds.
+        :param error: Exception the task failed with, tasks refusing the user with `TaskRejected` are ignored.
+        """
+        if status != "completed" and status not in FAILED_STATUSES:
+            return
+        if isinstance(error, TaskRejected):
+            return
+        if not config.get("circuit_breaker", True):
+            return
+
+        failed = status != "completed"
+        message = None
+        with self.lock:
+            breaker = self.breakers.get(task_name)
+            if breaker is None:
+                breaker = self.breakers[task_name] = CircuitBreaker()
+
+            if breaker.state == HALF_OPEN:
+                if failed:
+                    self._open(breaker, f"probe {status}")
+                    message = f"probe {status}, open again"
+                else:
+                    breaker.state = CLOSED
+                    breaker.changed_at = time.monotonic()
+                    breaker.outcomes.clear()
+                    breaker.runtimes.clear()
+                    message = "probe completed, closed"
+            elif breaker.state == CLOSED:
+                breaker.outcomes.append(failed)
+                if not failed:
+                    breaker.runtimes.append(runtime)
+                while len(breaker.outcomes) > config.get("breaker_window", 20):
+                    breaker.outcomes.popleft()
+                reason = breaker.trip_reason()
+                if reason is not None:
+                    self._open(breaker, reason)
+                    message = f"{reason}, open for {config.get('breaker_open_seconds', 30)}s"
+            # Tasks admitted before the breaker opened are ignored
+
+        if message is not None:
+            if breaker.state == CLOSED:
+                logger.info(f"Circuit breaker | {task_name} | {message}")
+            else:
+                logger.warning(f"Circuit breaker | {task_name} | {message}")
+
+    @staticmethod
+    def _open(breaker: CircuitBreaker, reason: str) -> None:
+        """
+        Open a breaker. The caller must hold the lock.
+
+        :param breaker: Breaker to open.
+        :param reason: Why it opens.
+        """
+        breaker.state = OPEN
+        breaker.changed_at = time.monotonic()
+        breaker.reason = reason
+        breaker.open_count += 1
+        breaker.outcomes.clear()
+        breaker.runtimes.clear()
+
+    def reset(self, task_name: str) -> None:
+        """
+        Forget the breaker of a task name, e.g. when its plugin is reloaded.
+
+        :param task_name: Task name.
+        """
+        with self.lock:
+            self.breakers.pop(task_name, None)
+
+    def stats(self) -> List[Dict]:
+        """
+        Get the breakers that are not closed or have opened before.
+
+        :return: List of dictionaries of the task name, state, reason and counts, open breakers first.
+        """
+        now = time.monotonic()
+        with self.lock:
+            stats = [
+                {
+                    "task_name": task_name,
+                    "state": breaker.state,
+                    "reason": breaker.reason,
+                    "since": now - breaker.changed_at,  # Seconds in the current state
+                    "open_count": breaker.open_count,
+                    "rejected": breaker.rejected
+                }
+                for task_name, breaker in self.breakers.items() if breaker.open_count
+            ]
+        return sorted(stats, key=lambda item: (item["state"] == CLOSED, item["task_name"]))
+
+
+circuit_breakers = CircuitBreakers()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from config import config
+
+# Number of finished tasks observed before each adjustment
+WINDOW_SAMPLES = 20
+# Average runtime, relative to the usual runtime of each task name, above which the limit is decreased
+LATENCY_TOLERANCE = 1.5
+# Average queue wait in seconds above which a saturated limit is increased
+QUEUE_WAIT_THRESHOLD = 0.05
+# Factor applied to the limit when it is decreased
+DECREASE_FACTOR = 0.75
+# Weight of each sample in the usual runtime of its task name, so that it only follows lasting changes
+BASELINE_DRIFT = 0.02
+
+
+class AdaptiveLimit:
+    """
+    Additive increase / multiplicative decrease controller of the number of tasks a backend runs at once.
+    Each window of finished tasks compares their runtime with the usual runtime of their task name:
+    inflated runtimes (GIL contention, throttled upstream services) decrease the limit, while tasks waiting
+    in the queue behind a saturated limit increase it, as long as throughput does not drop.
+    The limit stays between `min_key` and `max_key` of the configuration.
+    """
+    __slots__ = [
+        'min_key', 'max_key', 'limit', 'baselines', 'ratios', 'waits', 'saturated', 'window_start',
+        'last_throughput', 'decisions', 'clock', 'lock'
+    ]
+
+    def __init__(self, min_key: str, max_key: str, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param min_key: Configuration key of the lower bound.
+        :param max_key: Configuration key of the upper bound, also the initial limit.
+        :param clock: Function returning the current time in seconds, replaced by the virtual clock of the simulator.
+        """
+        self.clock = clock
+        self.min_key = min_key
+        self.max_key = max_key
+        self.limit: Optional[int] = None  # Current limit, set from the upper bound on first use
+        self.baselines: Dict[str, float] = {}  # Task name -> usual runtime in seconds
+        self.ratios: List[float] = []  # Runtime / usual runtime of the tasks of the current window
+        self.waits: List[float] = []  # Queue wait of the tasks of the current window
+        self.saturated = 0  # Tasks of the current window that finished while the limit was reached
+        self.window_start = clock()  # Start of the current window
+        self.last_throughput: Optional[float] = None  # Tasks per second of the previous window
+        self.decisions: Deque[Dict] = deque(maxlen=10)  # Most recent changes of the limit
+        self.lock = threading.Lock()  # Lock to protect access to the window and the limit
+
+    def bounds(self) -> Tuple[int, int]:
+        """
+        Get the configured lower and upper bounds of the limit.
+        """
+        maximum = max(int(config[self.max_key]), 1)
+        minimum = min(max(int(config.get(self.min_key, 1)), 1), maximum)
+        return minimum, maximum
+
+    def current(self) -> int:
+        """
+        Get the number of tasks that may run at once.
+        """
+        minimum, maximum = self.bounds()
+        if not config.get("adaptive_concurrency", True) or self.limit is None:
+            return maximum
+        return min(max(self.limit, minimum), maximum)
+
+    def observe(self, task_name: str, run_time: float, queue_wait: float, saturated: bool) -> None:
+        """
+        Record a finished task and adjust the limit at the end of each window.
+
+        :param task_name: Task name.
+        :param run_time: Time the task ran, in seconds.
+        :param queue_wait: Time the task waited in the queue, in seconds.
+        :param saturated: Whether the limit was reached when the task finished.
+        """
+        if not config.get("adaptive_concurrency", True):
+            return
+        with self.lock:
+            baseline = self.baselines.get(task_name)
+            if baseline is None:
+                baseline = max(run_time, 1e-4)
+            self.baselines[task_name] = max(baseline + (run_time - baseline) * BASELINE_DRIFT, 1e-4)
+
+            self.ratios.append(run_time / baseline)
+            self.waits.append(queue_wait)
+            self.saturated += saturated
+            if len(self.ratios) >= WINDOW_SAMPLES:
+                self._adjust()
+
+    def _adjust(self) -> None:
+        """
+        Adjust the limit from the current window and start a new one. The caller must hold the lock.
+        """
+        now = self.clock()
+        count = len(self.ratios)
+        latency = sum(self.ratios) / count
+        wait = sum(self.waits) / count
+        throughput = count / max(now - self.window_start, 1e-6)
+        saturated = self.saturated * 2 >= count
+
+        minimum, maximum = self.bounds()
+        previous = self.current()
+        limit = previous
+        if latency > LATENCY_TOLERANCE:
+            limit = max(int(previous * DECREASE_FACTOR), minimum)
+            reason = f"runtime x{latency:.2f} of usual"
+        elif saturated and wait > QUEUE_WAIT_THRESHOLD:
+            if self.last_throughput is not None and throughput < self.last_throughput * 0.9:
+                reason = f"queue wait {wait:.2f}s but throughput dropped"
+            else:
+                limit = min(previous + 1, maximum)
+                reason = f"queue wait {wait:.2f}s"
+        else:
+            reason = None
+
+        self.limit = limit
+        if reason is not None:
+            self.decisions.append({
+                "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+                "previous": previous,
+                "limit": limit,
+                "reason": reason,
+                "throughput": round(throughput, 2)
+            })
+
+        self.ratios = []
+        self.waits = []
+        self.saturated = 0
+        self.window_start = now
+        self.last_throughput = throughput
+
+    def stats(self) -> Dict:
+        """
+        Get the current limit, its bounds and its most recent changes.
+        """
+        minimum, maximum = self.bounds()
+        with self.lock:
+            return {
+                "enabled": bool(config.get("adaptive_concurrency", True)),
+                "limit": self.current(),
+                "minimum": minimum,
+                "maximum": maximum,
+                "decisions": list(self.decisions)
+            }
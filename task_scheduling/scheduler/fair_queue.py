@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from config import config
+from .fair_share import fair_share
+
+# Queued tasks of each tenant considered when ordering by fair share, the others wait for their turn
+FAIR_SHARE_SCAN = 64
+
+
+def tenant_key(gid: Optional[int], uid: Optional[int]) -> Optional[Tuple[str, int]]:
+    """
+    Get the key used to group tasks by tenant.
+    Group messages are grouped by group ID, private messages by user ID.
+
+    :param gid: Group ID.
+    :param uid: User ID.
+    :return: Tenant key, or None if the task does not belong to any tenant (e.g. timers).
+    """
+    if gid is not None:
+        return "gid", gid
+    if uid is not None:
+        return "uid", uid
+    return None
+
+
+class FairQueue:
+    """
+    Task queue that keeps a FIFO queue for each tenant and dequeues round-robin across tenants,
+    so that a single busy group cannot delay the tasks of other groups.
+    Within the turn of a tenant, once its users have consumed resources, the queued task of the user with the
+    lowest share of the recent CPU and run time goes first, see `FairShare`, so a light user's command is not stuck
+    behind a heavy user's backlog in the same group either.
+    Provides the part of the `queue.Queue` interface used by the schedulers.
+    """
+    __slots__ = ['tenant_queues', 'size', 'sequence', 'lock']
+
+    def __init__(self) -> None:
+        # Tenant -> (sequence, task, user) of its queued tasks, in round-robin order
+        self.tenant_queues: "OrderedDict[Hashable, Deque[Tuple[int, Any, Hashable]]]" = OrderedDict()
+        self.size = 0  # Total number of queued tasks
+        self.sequence = 0  # Insertion counter, used to find the longest waiting task
+        self.lock = threading.Lock()  # Lock to protect access to the tenant queues
+
+    def put(self, item: Any, tenant: Hashable = None, user: Hashable = None) -> None:
+        """
+        Add a task to the end of its tenant's queue.
+
+        :param item: Task to be queued.
+        :param tenant: Tenant key, see `tenant_key`.
+        :param user: User ID the task is charged to, used to order the tasks by fair share.
+        """
+        with self.lock:
+            if tenant not in self.tenant_queues:
+                self.tenant_queues[tenant] = deque()
+            self.tenant_queues[tenant].append((self.sequence, item, user))
+            self.sequence += 1
+            self.size += 1
+
+    def put_many(self, items: List[Any], tenant: Hashable = None, user: Hashable = None) -> None:
+        """
+        Add several tasks to the end of the same tenant's queue, taking the lock once.
+
+        :param items: Tasks to be queued.
+        :param tenant: Tenant key, see `tenant_key`.
+        :param user: User ID the tasks are charged to, used to order the tasks by fair share.
+        """
+        if not items:
+            return
+        with self.lock:
+            if tenant not in self.tenant_queues:
+                self.tenant_queues[tenant] = deque()
+            tasks = self.tenant_queues[tenant]
+            for item in items:
+                tasks.append((self.sequence, item, user))
+                self.sequence += 1
+            self.size += len(items)
+
+    def get(self, timeout: Optional[float] = None, eligible: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Take a task of the next tenant in round-robin order: the oldest task of its user with the lowest fair share,
+        or its oldest task when the shares are equal or fair share is disabled.
+        If `eligible` is given, tasks it rejects are skipped and stay in the queue.
+        Never blocks, the timeout parameter is only accepted for compatibility with `queue.Queue`.
+
+        :param timeout: Unused.
+        :param eligible: Function returning True for the tasks that may be dequeued now.
+        :return: Task.
+        :raises queue.Empty: If there are no queued tasks that may be dequeued.
+        """
+        shares = fair_share.snapshot() if fair_share.enabled() else None
+        # Users that used nothing in the window, or tasks without a user, rank with the lightest user
+        # instead of ahead of everyone
+        unknown_share = min(shares.values()) if shares else 0.0
+        with self.lock:
+            for tenant, tasks in self.tenant_queues.items():
+                best = None  # (share, index) of the task to take from this tenant
+                for index, (_, item, user) in enumerate(tasks):
+                    if best is not None and (not shares or index >= FAIR_SHARE_SCAN):
+                        break
+                    if eligible is not None and not eligible(item):
+                        continue
+                    share = shares.get(user, unknown_share) if shares else 0.0
+                    # Strictly lower, so that equal shares keep the queue order
+                    if best is None or share < best[0]:
+                        best = (share, index)
+                if best is not None:
+                    index = best[1]
+                    item = tasks[index][1]
+                    del tasks[index]
+                    self._rotate(tenant, tasks)
+                    return item
+            raise queue.Empty
+
+    def _rotate(self, tenant: Hashable, tasks: Deque[Tuple[int, Any, Hashable]]) -> None:
+        """
+        Move a tenant to the end of the round-robin order, or drop it if it has no queued tasks.
+        The caller must hold the lock.
+
+        :param tenant: Tenant key.
+        :param tasks: Queue of the tenant.
+        """
+        self.size -= 1
+        if tasks:
+            self.tenant_queues.move_to_end(tenant)
+        else:
+            del self.tenant_queues[tenant]
+
+    def remove_oldest(self, predicate: Callable[[Any], bool]) -> Optional[Any]:
+        """
+        Remove the longest waiting task matching a predicate.
+
+        :param predicate: Function returning True for the tasks that may be removed.
+        :return: Removed task, or None if no task matched.
+        """
+        with self.lock:
+            oldest = None
+            for tenant, tasks in self.tenant_queues.items():
+                for index, (sequence, item, _) in enumerate(tasks):
+                    if predicate(item):
+                        if oldest is None or sequence < oldest[0]:
+                            oldest = (sequence, tenant, index)
+                        break
+            if oldest is None:
+                return None
+            _, tenant, index = oldest
+            tasks = self.tenant_queues[tenant]
+            item = tasks[index][1]
+            del tasks[index]
+            self.size -= 1
+            if not tasks:
+                del self.tenant_queues[tenant]
+            return item
+
+    def remove_if(self, predicate: Callable[[Any], bool]) -> List[Any]:
+        """
+        Remove all queued tasks matching a predicate.
+
+        :param predicate: Function returning True for the tasks to remove.
+        :return: Removed tasks.
+        """
+        removed = []
+        with self.lock:
+            for tenant in list(self.tenant_queues):
+                kept = deque()
+                for entry in self.tenant_queues[tenant]:
+                    if predicate(entry[1]):
+                        removed.append(entry[1])
+                    else:
+                        kept.append(entry)
+                if kept:
+                    self.tenant_queues[tenant] = kept
+                else:
+                    del self.tenant_queues[tenant]
+            self.size -= len(removed)
+        return removed
+
+    def count_if(self, predicate: Callable[[Any], bool]) -> int:
+        """
+        Count the queued tasks matching a predicate.
+
+        :param predicate: Function returning True for the tasks to count.
+        :return: Number of matching tasks.
+        """
+        with self.lock:
+            return sum(1 for tasks in self.tenant_queues.values() for _, item, _ in tasks if predicate(item))
+
+    def qsize(self) -> int:
+        return self.size
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def tenant_sizes(self) -> Dict[Hashable, int]:
+        """
+        Get the number of queued tasks of each tenant.
+        """
+        with self.lock:
+            return {tenant: len(tasks) for tenant, tasks in self.tenant_queues.items()}
+
+
+class TenantTracker:
+    """
+    Track the queued and running tasks of each group and user, and enforce the per-tenant caps
+    configured by `maximum_queue_gid` and `maximum_queue_uid` (0 or missing means unlimited).
+    """
+    __slots__ = ['usage', 'task_tenants', 'lock']
+
+    def __init__(self) -> None:
+        self.usage: Dict[Tuple[str, int], List[int]] = {}  # Tenant key -> [queued count, running count]
+        self.task_tenants: Dict[str, List] = {}  # Task ID -> [tenant keys charged, whether it is running]
+        self.lock = threading.Lock()  # Lock to protect access to the counters
+
+    def try_acquire(self, task_id: str, gid: Optional[int], uid: Optional[int]) -> Optional[str]:
+        """
+        Charge a queued task to its group and user if both are under their caps.
+
+        :param task_id: Task ID.
+        :param gid: Group ID.
+        :param uid: User ID.
+        :return: None if the task was admitted, otherwise the reason for rejection.
+        """
+        limits = self._limits(gid, uid)
+        with self.lock:
+            rejection = self._limit_reached(limits)
+            if rejection is not None:
+                return rejection
+
+            for key, _ in limits:
+                self.usage.setdefault(key, [0, 0])[0] += 1
+            self.task_tenants[task_id] = [tuple(key for key, _ in limits), False]
+        return None
+
+    def limit_reached(self, gid: Optional[int], uid: Optional[int]) -> Optional[str]:
+        """
+        Check whether a group or user is at its cap, without charging anything.
+
+        :param gid: Group ID.
+        :param uid: User ID.
+        :return: Reason a new task of theirs would be rejected, or None.
+        """
+        limits = self._limits(gid, uid)
+        with self.lock:
+            return self._limit_reached(limits)
+
+    @staticmethod
+    def _limits(gid: Optional[int], uid: Optional[int]) -> List[Tuple[Tuple[str, int], int]]:
+        """
+        :return: (tenant key, cap) of the group and the user, 0 for no cap.
+        """
+        limits = []
+        if gid is not None:
+            limits.append((("gid", gid), config.get("maximum_queue_gid", 0)))
+        if uid is not None:
+            limits.append((("uid", uid), config.get("maximum_queue_uid", 0)))
+        return limits
+
+    def _limit_reached(self, limits: List[Tuple[Tuple[str, int], int]]) -> Optional[str]:
+        """
+        Check the caps of tenants. The caller must hold the lock.
+
+        :param limits: (tenant key, cap) pairs, see `_limits`.
+        :return: Reason for rejecting a new task, or None.
+        """
+        for key, limit in limits:
+            counts = self.usage.get(key)
+            if limit and counts is not None and counts[0] + counts[1] >= limit:
+                return f"{key[0]} {key[1]} has reached its limit of {limit} tasks"
+        return None
+
+    def mark_running(self, task_id: str) -> None:
+        """
+        Move a task from the queued count to the running count of its tenants.
+
+        :param task_id: Task ID.
+        """
+        with self.lock:
+            charge = self.task_tenants.get(task_id)
+            if charge is None or charge[1]:
+                return
+            charge[1] = True
+            for key in charge[0]:
+                counts = self.usage[key]
+                counts[0] -= 1
+                counts[1] += 1
+
+    def release(self, task_id: str) -> None:
+        """
+        Release the quota held by a finished or removed task. Releasing twice is a no-op.
+
+        :param task_id: Task ID.
+        """
+        with self.lock:
+            charge = self.task_tenants.pop(task_id, None)
+            if charge is None:
+                return
+            keys, running = charge
+            for key in keys:
+                counts = self.usage[key]
+                counts[1 if running else 0] -= 1
+                if counts[0] <= 0 and counts[1] <= 0:
+                    del self.usage[key]
+
+    def clear(self) -> None:
+        """
+        Reset all counters.
+        """
+        with self.lock:
+            self.usage.clear()
+            self.task_tenants.clear()
+
+    def snapshot(self, limit: int = 5) -> List[Dict]:
+        """
+        Get the busiest tenants.
+
+        :param limit: Maximum number of tenants to return.
+        :return: List of dictionaries with the tenant type, ID, queued and running counts.
+        """
+        with self.lock:
+            items = sorted(self.usage.items(), key=lambda item: item[1][0] + item[1][1], reverse=True)[:limit]
+            return [{"type": key[0], "id": key[1], "queued": counts[0], "running": counts[1]}
+                    for key, counts in items]
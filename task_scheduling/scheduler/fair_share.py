@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Tuple
+
+from config import config
+
+# Number of buckets the sliding window is divided into, usage expires one bucket at a time
+WINDOW_BUCKETS = 10
+
+
+class FairShare:
+    """
+    CPU time and wall time consumed by each user over the last `fair_share_window` seconds, in all backends.
+    The share of a user is its dominant share, as in dominant resource fairness: the largest of its part of the
+    CPU time and its part of the wall time consumed by all users in the window. A user running expensive commands
+    gets a high share whichever resource its commands use, and the fair queues start the queued tasks of the users
+    with the lowest share first, so that the cheap commands of light users get ahead of the heavy users' backlog.
+    With `fair_share_limit` set, users above that share are not admitted while other users are active.
+    """
+    __slots__ = ['buckets', 'shares', 'expired_at', 'lock']
+
+    def __init__(self) -> None:
+        self.buckets: Deque[Tuple[float, Dict[Hashable, List[float]]]] = deque()  # (start, user -> [cpu, wall])
+        self.shares: Dict[Hashable, float] = {}  # User -> dominant share, replaced as a whole when recomputed
+        self.expired_at = 0.0  # Time the expired buckets were last dropped
+        self.lock = threading.Lock()  # Lock to protect access to the buckets
+
+    @staticmethod
+    def enabled() -> bool:
+        return config.get("fair_share", True)
+
+    def charge(self, user: Optional[Hashable], cpu: Optional[float], wall: float) -> None:
+        """
+        Charge the resources used by a finished task to its user.
+
+        :param user: User ID, tasks without a user are not charged.
+        :param cpu: Seconds of CPU time, None if the backend did not measure it.
+        :param wall: Seconds from start to end.
+        """
+        if user is None or not self.enabled():
+            return
+        now = time.monotonic()
+        bucket_length = config.get("fair_share_window", 300) / WINDOW_BUCKETS
+        with self.lock:
+            if not self.buckets or now - self.buckets[-1][0] >= bucket_length:
+                self.buckets.append((now, {}))
+            usage = self.buckets[-1][1].setdefault(user, [0.0, 0.0])
+            usage[0] += cpu or 0.0
+            usage[1] += wall
+            self._update(now)
+
+    def snapshot(self) -> Dict[Hashable, float]:
+        """
+        Get the dominant share of every user that used resources in the window.
+
+        :return: User -> share between 0 and 1. Must not be modified.
+        """
+        now = time.monotonic()
+        if now - self.expired_at >= config.get("fair_share_window", 300) / WINDOW_BUCKETS:
+            with self.lock:
+                self._update(now)
+        return self.shares
+
+    def throttled(self, user: Optional[Hashable]) -> Optional[str]:
+        """
+        Check whether a user used more than `fair_share_limit` of the resources while others were active.
+
+        :param user: User ID.
+        :return: Reason for rejecting its new tasks, or None if they may be added.
+        """
+        limit = config.get("fair_share_limit", 0)
+        if not limit or user is None or not self.enabled():
+            return None
+        shares = self.snapshot()
+        share = shares.get(user, 0.0)
+        if share > limit and len(shares) > 1:
+            return f"uid {user} used {share:.0%} of the recent CPU or run time, above its fair share of {limit:.0%}"
+        return None
+
+    def stats(self, limit: int = 5) -> List[Dict]:
+        """
+        Get the users with the highest share.
+
+        :param limit: Maximum number of users to return.
+        :return: List of dictionaries with the user ID, its share and the CPU and wall time it used in the window.
+        """
+        shares = self.snapshot()
+        with self.lock:
+            used = self._used()
+        users = sorted(shares.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"uid": user, "share": share, "cpu": used.get(user, [0.0, 0.0])[0],
+                 "wall": used.get(user, [0.0, 0.0])[1]} for user, share in users]
+
+    def _update(self, now: float) -> None:
+        """
+        Drop the buckets that left the window and recompute the shares. The caller must hold the lock.
+
+        :param now: Current time.
+        """
+        window = config.get("fair_share_window", 300)
+        while self.buckets and now - self.buckets[0][0] >= window:
+            self.buckets.popleft()
+        self.expired_at = now
+
+        used = self._used()
+        cpu_total = sum(cpu for cpu, _ in used.values())
+        wall_total = sum(wall for _, wall in used.values())
+        self.shares = {
+            user: max(cpu / cpu_total if cpu_total else 0.0, wall / wall_total if wall_total else 0.0)
+            for user, (cpu, wall) in used.items()
+        }
+
+    def _used(self) -> Dict[Hashable, List[float]]:
+        """
+        Add up the buckets of the window. The caller must hold the lock.
+
+        :return: User -> [CPU time, wall time] in seconds.
+        """
+        used: Dict[Hashable, List[float]] = {}
+        for _, bucket in self.buckets:
+            for user, (cpu, wall) in bucket.items():
+                total = used.setdefault(user, [0.0, 0.0])
+                total[0] += cpu
+                total[1] += wall
+        return used
+
+
+fair_share = FairShare()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+import ast
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from common import logger
+
+# Functions that block the calling thread, by their full dotted name once import aliases are resolved
+BLOCKING_CALLS = {
+    "time.sleep", "asyncio.run", "input", "os.system", "os.popen", "os.wait", "os.waitpid",
+    "subprocess.run", "subprocess.call", "subprocess.check_call", "subprocess.check_output",
+    "socket.create_connection", "urllib.request.urlopen", "sqlite3.connect",
+    # Sends the message with `asyncio.run`
+    "message_action.send_message", "message_action.message_send.send_message"
+}
+
+# Modules whose functions all block, e.g. synchronous HTTP clients
+BLOCKING_MODULES = {"requests", "urllib3", "httpx", "pymysql", "psycopg2"}
+
+# Names in the scope of `BLOCKING_MODULES` that do not perform I/O
+NON_BLOCKING_NAMES = {"AsyncClient", "Session", "exceptions", "codes", "Timeout", "RequestException", "HTTPError"}
+
+# A loop over a range of at least this many items is treated as CPU-bound work
+LARGE_RANGE = 100000
+
+# Kinds of handlers
+BLOCKING_IN_ASYNC = "blocking-in-async"  # Coroutine function calling blocking functions, stalls its event loop
+NEVER_AWAITS = "never-awaits"  # Coroutine function without any await, runs at once from start to end
+CPU_HEAVY = "cpu-heavy"  # Function running nested or very long loops without any I/O
+PURE_IO = "pure-io"  # Anything else, the default backends suit it
+
+
+class HandlerProfile:
+    """
+    Result of the static analysis of a function of a plugin module.
+    """
+    __slots__ = ['kind', 'is_async', 'reasons', 'io']
+
+    def __init__(self, kind: str, is_async: bool, reasons: List[str], io: bool = True) -> None:
+        self.kind = kind  # One of the kinds of handlers
+        self.is_async = is_async  # Whether it is a coroutine function
+        self.reasons = reasons  # Calls or loops the kind was inferred from, with their line numbers
+        self.io = io  # Whether it calls a blocking function or awaits, directly or through the module's functions
+
+
+class _FunctionFacts:
+    """
+    What a function does, collected from its syntax tree before the kinds are inferred.
+    """
+    __slots__ = ['is_async', 'awaits', 'blocking', 'io', 'loops', 'calls']
+
+    def __init__(self, is_async: bool) -> None:
+        self.is_async = is_async
+        self.awaits = False  # Contains await, async for or async with
+        self.blocking: List[str] = []  # Blocking calls
+        self.io = False  # Calls a blocking function or awaits, i.e. waits for something else than the CPU
+        self.loops: List[str] = []  # Nested or very long loops
+        self.calls: Set[str] = set()  # Names of the functions of the module it calls
+
+
+def _import_aliases(tree: ast.Module) -> Dict[str, str]:
+    """
+    Map the names imported by a module to the full dotted names they refer to.
+
+    :param tree: Syntax tree of the module.
+    :return: Local name -> dotted name, e.g. "sleep" -> "time.sleep".
+    """
+    aliases: Dict[str, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    # "import a.b" binds "a"
+                    package = alias.name.split(".")[0]
+                    aliases[package] = package
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+def _dotted_name(node: ast.AST, aliases: Dict[str, str]) -> Optional[str]:
+    """
+    Get the full dotted name of the function called by a call node, e.g. `requests.get`.
+
+    :param node: Function expression of the call.
+    :param aliases: Import aliases of the module.
+    :return: Dotted name, or None for calls of computed expressions.
+    """
+    parts: List[str] = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(aliases.get(node.id, node.id))
+    return ".".join(reversed(parts))
+
+
+def _is_blocking(name: str) -> bool:
+    if name in BLOCKING_CALLS:
+        return True
+    parts = name.split(".")
+    return parts[0] in BLOCKING_MODULES and len(parts) > 1 and not NON_BLOCKING_NAMES.intersection(parts[1:])
+
+
+class _FactCollector(ast.NodeVisitor):
+    """
+    Collect the facts of one function, without entering the functions and classes defined in its body.
+    """
+
+    def __init__(self, facts: _FunctionFacts, aliases: Dict[str, str], local_functions: Set[str]) -> None:
+        self.facts = facts
+        self.aliases = aliases
+        self.local_functions = local_functions
+        self.depth = 0  # Number of enclosing loops
+
+    def collect(self, function: ast.AST) -> None:
+        for statement in function.body:
+            self.visit(statement)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        pass
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+    visit_Lambda = visit_FunctionDef
+
+    def visit_Await(self, node: ast.Await) -> None:
+        self.facts.awaits = self.facts.io = True
+        self.generic_visit(node)
+
+    def visit_AsyncFor(self, node: ast.AsyncFor) -> None:
+        self.facts.awaits = self.facts.io = True
+        self._loop(node)
+
+    def visit_AsyncWith(self, node: ast.AsyncWith) -> None:
+        self.facts.awaits = self.facts.io = True
+        self.generic_visit(node)
+
+    def visit_For(self, node: ast.For) -> None:
+        iterator = node.iter
+        if isinstance(iterator, ast.Call) and isinstance(iterator.func, ast.Name) and iterator.func.id == "range" \
+                and iterator.args:
+            stop = iterator.args[0 if len(iterator.args) == 1 else 1]
+            if isinstance(stop, ast.Constant) and isinstance(stop.value, int) and stop.value >= LARGE_RANGE:
+                self.facts.loops.append(f"loop over {stop.value} items at line {node.lineno}")
+        self._loop(node)
+
+    def visit_While(self, node: ast.While) -> None:
+        self._loop(node)
+
+    def _loop(self, node: ast.AST) -> None:
+        if self.depth >= 1:
+            self.facts.loops.append(f"nested loop at line {node.lineno}")
+        self.depth += 1
+        self.generic_visit(node)
+        self.depth -= 1
+
+    def visit_ListComp(self, node: ast.AST) -> None:
+        if len(node.generators) > 1 or self.depth >= 1:
+            self.facts.loops.append(f"nested loop at line {node.lineno}")
+        self.depth += 1
+        self.generic_visit(node)
+        self.depth -= 1
+
+    visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_Call(self, node: ast.Call) -> None:
+        name = _dotted_name(node.func, self.aliases)
+        if name is not None:
+            if _is_blocking(name):
+                self.facts.blocking.append(f"{name} at line {node.lineno}")
+                self.facts.io = True
+            elif name in self.local_functions:
+                self.facts.calls.add(name)
+        self.generic_visit(node)
+
+
+def analyze_source(source: str) -> Dict[str, HandlerProfile]:
+    """
+    Classify the functions defined at the top level of a module and in its top-level classes.
+    Blocking calls and I/O are followed through the calls between functions of the module, e.g. a coroutine
+    function calling a helper function that sleeps is blocking-in-async too.
+
+    :param source: Source code of the module.
+    :return: Qualified name of each function -> profile.
+    :raises SyntaxError: If the source cannot be parsed.
+    """
+    tree = ast.parse(source)
+    aliases = _import_aliases(tree)
+
+    functions: Dict[str, ast.AST] = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = node
+        elif isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    functions[f"{node.name}.{item.name}"] = item
+
+    local_functions = {name for name in functions if "." not in name}
+    facts: Dict[str, _FunctionFacts] = {}
+    for name, node in functions.items():
+        facts[name] = _FunctionFacts(isinstance(node, ast.AsyncFunctionDef))
+        _FactCollector(facts[name], aliases, local_functions).collect(node)
+
+    # Propagate blocking calls and I/O through the calls to other functions of the module until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        for name, fact in facts.items():
+            for callee in fact.calls:
+                callee_fact = facts[callee]
+                # Calling a coroutine function only creates a coroutine, its body runs when awaited
+                if callee_fact.blocking and (fact.is_async or not callee_fact.is_async):
+                    reason = f"{callee} ({callee_fact.blocking[0]})"
+                    if reason not in fact.blocking:
+                        fact.blocking.append(reason)
+                        changed = True
+                if callee_fact.io and not fact.io:
+                    fact.io = changed = True
+
+    profiles: Dict[str, HandlerProfile] = {}
+    for name, fact in facts.items():
+        if fact.is_async and fact.blocking:
+            profiles[name] = HandlerProfile(BLOCKING_IN_ASYNC, True, fact.blocking, fact.io)
+        elif fact.is_async and not fact.awaits:
+            profiles[name] = HandlerProfile(NEVER_AWAITS, True, [], fact.io)
+        elif not fact.is_async and fact.loops and not fact.io:
+            profiles[name] = HandlerProfile(CPU_HEAVY, False, fact.loops, fact.io)
+        else:
+            profiles[name] = HandlerProfile(PURE_IO, fact.is_async, [], fact.io)
+    return profiles
+
+
+class HandlerProfiles:
+    """
+    Profiles of the functions of the loaded plugin modules, computed once per version of each file:
+    the analysis of a file is cached under the hash of its content, so reloading an unchanged plugin is free.
+    """
+    __slots__ = ['modules', 'cache', 'lock']
+
+    def __init__(self) -> None:
+        self.modules: Dict[str, Dict[str, HandlerProfile]] = {}  # Module name -> profiles of its functions
+        self.cache: Dict[str, Dict[str, HandlerProfile]] = {}  # Hash of a source file -> profiles of its functions
+        self.lock = threading.Lock()  # Lock to protect access to the profiles
+
+    def analyze(self, module_name: str, source: str) -> Dict[str, HandlerProfile]:
+        """
+        Analyze the source of a plugin module when it is loaded, warning about the functions unsuited to their
+        default backend.
+
+        :param module_name: Module name.
+        :param source: Source code of the module.
+        :return: Qualified name of each function -> profile.
+        """
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        with self.lock:
+            profiles = self.cache.get(digest)
+        if profiles is None:
+            try:
+                profiles = analyze_source(source)
+            except SyntaxError:
+                profiles = {}
+            for qualname, profile in profiles.items():
+                if profile.kind == BLOCKING_IN_ASYNC:
+                    logger.warning(f"Plugin analysis | {module_name}.{qualname} | coroutine function calls "
+                                   f"{', '.join(profile.reasons)}, which block its event loop, "
+                                   f"its tasks will run in a thread")
+                elif profile.kind == NEVER_AWAITS:
+                    logger.warning(f"Plugin analysis | {module_name}.{qualname} | coroutine function never awaits, "
+                                   f"it can be a plain function")
+                elif profile.kind == CPU_HEAVY:
+                    logger.info(f"Plugin analysis | {module_name}.{qualname} | looks CPU-bound "
+                                f"({', '.join(profile.reasons)}), execution=\"process\" suits it")
+            with self.lock:
+                self.cache[digest] = profiles
+        with self.lock:
+            self.modules[module_name] = profiles
+        return profiles
+
+    def get(self, func: Callable) -> Optional[HandlerProfile]:
+        """
+        Get the profile of a function of a plugin module.
+
+        :param func: Function, usually the handler of a task.
+        :return: Profile, or None if the function is not defined at the top level of an analyzed module.
+        """
+        profiles = self.modules.get(getattr(func, "__module__", None))
+        if profiles is None:
+            return None
+        return profiles.get(getattr(func, "__qualname__", None))
+
+    def summary(self) -> Dict[str, List[Tuple[str, List[str]]]]:
+        """
+        Get the functions of each kind except pure-IO ones.
+
+        :return: Kind -> list of (function, reasons).
+        """
+        summary: Dict[str, List[Tuple[str, List[str]]]] = {}
+        with self.lock:
+            for module_name, profiles in self.modules.items():
+                for qualname, profile in profiles.items():
+                    if profile.kind != PURE_IO:
+                        summary.setdefault(profile.kind, []).append((f"{module_name}.{qualname}", profile.reasons))
+        return summary
+
+
+handler_profiles = HandlerProfiles()
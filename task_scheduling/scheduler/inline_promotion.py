@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Callable, Dict, List, Set
+
+from common import logger
+from config import config
+from .handler_analysis import handler_profiles
+from .latency_histogram import LatencyHistogram, MIN_SAMPLES
+from .task_policy import task_policy
+
+# Runtimes of a plugin needed before it can be promoted, doubled after each demotion
+PROMOTE_SAMPLES = 50
+# Percentile of the runtimes that must stay within `inline_budget_ms`
+PROMOTE_PERCENTILE = 99
+# A single inline run this many times longer than the budget demotes the plugin at once
+DEMOTE_FACTOR = 10
+
+
+class InlinePromotion:
+    """
+    Moves plugins whose synchronous handler always returns almost immediately from the thread pool to the inline
+    backend, so that cheap commands no longer pay for the queue, the thread handoff, the watchdog timer and the
+    memory release of the thread pool.
+    A plugin is promoted once its p99 runtime over at least `PROMOTE_SAMPLES` tasks is within `inline_budget_ms`,
+    and demoted back as soon as its p99 exceeds the budget or one inline run takes `DEMOTE_FACTOR` times the budget:
+    inline tasks have no watchdog and delay the messages dispatched after them.
+    Only plugins left on the default backend are considered, not those choosing one with their policy.
+    Demotion only happens once a slow run has returned, and nothing stops an inline run that blocks: the dispatching
+    thread, system commands included, waits for it. Promotion is therefore off unless `inline_promotion` is set,
+    and limited to handlers the static analysis of their plugin found to never call a blocking function.
+    """
+    __slots__ = ['histograms', 'promoted', 'demotions', 'promotion_count', 'lock']
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {}  # Task name -> runtimes of its handler
+        self.promoted: Set[str] = set()  # Task names running inline
+        self.demotions: Dict[str, int] = {}  # Task name -> number of times it was demoted
+        self.promotion_count = 0  # Number of promotions
+        self.lock = threading.Lock()  # Lock to protect access to the histograms
+
+    def observe(self, task_name: str, seconds: float, func: Callable) -> None:
+        """
+        Record the runtime of the handler of a task, in the thread pool or inline, promoting or demoting its plugin.
+
+        :param task_name: Task name.
+        :param seconds: Time spent in the handler in seconds.
+        :param func: Handler of the task.
+        """
+        policy = task_policy.get(task_name)
+        if policy.execution is not None or policy.isolated or policy.batch_handler is not None:
+            return
+        if task_name not in self.promoted and not self._promotable(func):
+            return
+
+        budget = config.get("inline_budget_ms", 2) / 1000
+        with self.lock:
+            histogram = self.histograms.get(task_name)
+            if histogram is None:
+                histogram = self.histograms[task_name] = LatencyHistogram()
+            histogram.add(seconds)
+
+            if task_name in self.promoted:
+                if seconds > budget * DEMOTE_FACTOR:
+                    reason = f"one run took {seconds * 1000:.1f} ms"
+                elif histogram.count >= MIN_SAMPLES and histogram.percentile(PROMOTE_PERCENTILE) > budget:
+                    reason = f"p{PROMOTE_PERCENTILE} is {histogram.percentile(PROMOTE_PERCENTILE) * 1000:.1f} ms"
+                else:
+                    return
+                self.promoted.discard(task_name)
+                self.demotions[task_name] = self.demotions.get(task_name, 0) + 1
+                # Its runtimes in the thread pool must prove it fast again
+                self.histograms[task_name] = LatencyHistogram()
+            else:
+                required = PROMOTE_SAMPLES * 2 ** self.demotions.get(task_name, 0)
+                if histogram.count < required or histogram.percentile(PROMOTE_PERCENTILE) > budget \
+                        or not config.get("inline_promotion", False):
+                    return
+                self.promoted.add(task_name)
+                self.promotion_count += 1
+                reason = None
+
+        if reason is None:
+            logger.info(f"Io inline task | {task_name} | returns within {budget * 1000:.1f} ms, "
+                        f"now runs in the dispatching thread")
+        else:
+            logger.warning(f"Io inline task | {task_name} | {reason}, back to the thread pool")
+
+    def is_promoted(self, task_name: str) -> bool:
+        """
+        Check whether the tasks of a plugin run inline.
+
+        :param task_name: Task name.
+        :return: Whether the plugin is promoted and promotion is enabled.
+        """
+        return task_name in self.promoted and config.get("inline_promotion", False)
+
+    @staticmethod
+    def _promotable(func: Callable) -> bool:
+        """
+        Check whether a handler may run inline: promotion is enabled and the static analysis of its plugin found
+        no blocking call in it, a fast handler that sometimes waits on the network would stall the dispatching thread.
+
+        :param func: Handler of a task.
+        :return: Whether its plugin may be promoted.
+        """
+        if not config.get("inline_promotion", False):
+            return False
+        profile = handler_profiles.get(func)
+        return profile is not None and not profile.is_async and not profile.io
+
+    def stats(self) -> Dict:
+        """
+        Get the promoted plugins and the number of promotions and demotions.
+
+        :return: Dictionary of the promoted task names and the counts.
+        """
+        with self.lock:
+            promoted: List[str] = sorted(self.promoted)
+            return {
+                "promoted": promoted,
+                "promotions": self.promotion_count,
+                "demotions": sum(self.demotions.values())
+            }
+
+
+inline_promotion = InlinePromotion()
@@ -1,163 +1,194 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import queue
+import inspect
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from typing import Dict, List, Tuple, Callable, Optional, Any
 
 from common import logger
 from config import config
 from memory_management import memory_release_decorator
+from .fair_queue import FairQueue, tenant_key
+from .handler_analysis import BLOCKING_IN_ASYNC, handler_profiles
+from .lock_metrics import InstrumentedLock, merge_lock_stats
+from .loop_lag import LoopLagMonitor, PROBE_INTERVAL
+from .resource_usage import measure_coroutine
+from .scheduler_base import SchedulerBase
+from .task_history import TaskRecord
+from .task_policy import task_policy
+from .utils import is_async_function
 from ..stopit import ThreadingTimeout, TimeoutException
 
 
-class IoAsyncTask:
+class IoAsyncTask(SchedulerBase):
     """
     Asynchronous task manager class, responsible for scheduling, executing, and monitoring asynchronous tasks.
+    Backend "asyncio": runs coroutine functions in one event loop per task name.
     """
     __slots__ = [
-        'task_queues', 'condition', 'scheduler_lock', 'scheduler_started', 'scheduler_stop_event',
-        'task_details', 'running_tasks', 'error_logs', 'scheduler_threads', 'event_loops',
-        'banned_task_ids', 'idle_timers', 'idle_timeout', 'idle_timer_lock', 'task_results',
-        'task_counters', 'status_check_timer'
+        'task_queues', 'conditions', 'name_locks', 'conditions_lock', 'running_tasks', 'event_loops', 'task_counters',
+        'stop_events', 'lag_monitor', 'offload_executor', 'leaked_runs'
     ]
 
+    log_name = "Io asyncio task"
+    name_queue_limit_key = "maximum_queue_async"
+
     def __init__(self) -> None:
         """
         Initialize the asynchronous task manager.
         """
-        self.task_queues: Dict[str, queue.Queue] = {}  # Task queues for each task name
-        self.condition = threading.Condition()  # Condition variable for thread synchronization
-        self.scheduler_lock = threading.RLock()  # Thread unlock
-        self.scheduler_started = False  # Whether the scheduler thread has started
-        self.scheduler_stop_event = threading.Event()  # Scheduler thread stop event
-        self.task_details: Dict[str, Dict] = {}  # Details of tasks
+        super().__init__()
+        self.task_queues: Dict[str, FairQueue] = {}  # Task queues for each task name, fair across groups and users
+        self.conditions: Dict[str, threading.Condition] = {}  # Condition of the scheduler of each task name
+        self.name_locks: Dict[str, InstrumentedLock] = {}  # Lock of each condition, with its contention counters
+        self.conditions_lock = threading.Lock()  # Lock to protect the creation of conditions
         self.running_tasks: Dict[str, list[Any]] = {}  # Use weak references to reduce memory usage
-        self.error_logs: List[Dict] = []  # Error logs, keep up to 10
-        self.scheduler_threads: Dict[str, threading.Thread] = {}  # Scheduler threads for each task name
         self.event_loops: Dict[str, Any] = {}  # Event loops for each task name
-        self.banned_task_ids: List[str] = []  # List of task IDs to be banned
-        self.idle_timers: Dict[str, threading.Timer] = {}  # Idle timers for each task name
-        self.idle_timeout = config["max_idle_time"]  # Idle timeout, default is 60 seconds
-        self.idle_timer_lock = threading.Lock()  # Idle timer lock
-        self.task_results: Dict[str, List[Any]] = {}  # Store task return results, keep up to 2 results for each task ID
         self.task_counters: Dict[str, int] = {}  # Used to track the number of tasks being executed in each event loop
-        self.status_check_timer: threading.Timer or bool = True  # check the status of a task
-
-    def _check_running_tasks_status(self) -> None:
-        """
-        The scheduled checks whether a task with a status of 'running' is actually running.
-        If the task has been completed but the status is still 'running', the status is corrected and the appropriate action is taken.
-        """
-        with self.condition:
-            task_details_copy = self.task_details.copy()
-
-        for task_id, details in list(
-                task_details_copy.items()):  # Use list() to create a copy to avoid errors when modifying the dictionary
-            if details.get("status") == "running":
-                start_time = details.get("start_time")
-                current_time = time.time()
-                timeout_processing = details.get("timeout_processing", False)  # 获取任务的超时管理标志
-
-                # If timeout management is enabled for the task and the maximum allowed time is exceeded, the task is forcibly canceled
-                if timeout_processing and (current_time - start_time > config["watch_dog_time"]):
-                    # If the task is still running in the task dictionary, try canceling it
-                    if task_id in self.running_tasks:
-                        future = self.running_tasks[task_id][0]
-                        if not future.done():
-                            future.cancel()
-                            logger.warning(
-                                f"Io asyncio task | {task_id} | has been forcibly cancelled due to timeout")
-                            with self.condition:
-                                self.task_details[task_id]["status"] = "cancelled"
-                                self.task_details[task_id]["end_time"] = "NaN"
-
-                    # Removed from the running task dictionary
-                    if task_id in self.running_tasks:
-                        with self.condition:
-                            del self.running_tasks[task_id]
-
-                    # Reduce task counters
-                    task_name = details.get("task_name")
-                    if task_name in self.task_counters:
-                        with self.condition:
-                            self.task_counters[task_name] -= 1
-
-        # Restart the timer
-        # Prevent the shutdown operation from being started while it is executed
-        if not self.scheduler_stop_event.is_set():
-            self.status_check_timer = threading.Timer(
-                config["status_check_interval"], self._check_running_tasks_status
-            )
-            self.status_check_timer.start()
-
-    def stop_status_check_timer(self) -> None:
-        """
-        Stop state detection timer.
-        """
-        if self.status_check_timer:
-            self.status_check_timer.cancel()
-            logger.info("Status check timer has been stopped")
-
-    # Add the task to the scheduler
-    def add_task(self, timeout_processing: bool, task_name: str, task_id: str, func: Callable, *args, **kwargs) -> bool:
-        """
-        Add a task to the task queue.
-
-        :param timeout_processing: Whether to enable timeout processing.
-        :param task_name: Task name (can be repeated).
-        :param task_id: Task ID (must be unique).
+        self.stop_events: Dict[str, threading.Event] = {}  # Stop events of the scheduler of each task name
+        self.lag_monitor = LoopLagMonitor()  # Stalls of the event loops and the task names causing them
+        self.offload_executor: Optional[ThreadPoolExecutor] = None  # Threads of the offloaded tasks, created on first use
+        self.leaked_runs: Dict[str, Tuple[str, float]] = {}  # Task ID -> task name and stop time of the offloaded runs still in their thread
+
+    def accepts(self, func: Callable) -> bool:
+        """
+        Check whether the backend can run a task function, only coroutine functions can run in event loops.
+
         :param func: Task function.
-        :param args: Positional arguments for the task function.
-        :param kwargs: Keyword arguments for the task function.
+        :return: Whether tasks of this function can be added to the backend.
         """
-        try:
-            with self.scheduler_lock:
-                if task_name in self.banned_task_ids:
-                    logger.warning(f"Io asyncio task | {task_id} | is banned and will be deleted")
-                    return False
-
-                if task_name not in self.task_queues:
-                    self.task_queues[task_name] = queue.Queue()
-
-                if self.task_queues[task_name].qsize() >= config["maximum_queue_async"]:
-                    logger.warning(f"Io asyncio task | {task_id} | not added, queue is full")
-                    logger.warning(f"Asyncio queue is full!!!")
-                    return False
-
-                with self.condition:
-                    # Store task name in task_details
-                    self.task_details[task_id] = {
-                        "task_name": task_name,
-                        "start_time": None,
-                        "status": "pending",
-                        "timeout_processing": timeout_processing
-                    }
-
-                self.task_queues[task_name].put((timeout_processing, task_name, task_id, func, args, kwargs))
-
-                # If the scheduler thread has not started, start it
-                if task_name not in self.scheduler_threads or not self.scheduler_threads[task_name].is_alive():
-                    self.event_loops[task_name] = asyncio.new_event_loop()
-                    self.task_counters[task_name] = 0  # Initialize the task counter
-                    self._start_scheduler(task_name)
-
-                # Cancel the idle timer
-                self._cancel_idle_timer(task_name)
+        return is_async_function(func)
 
-                with self.condition:
-                    self.condition.notify()  # Notify the scheduler thread that a new task is available
+    def _stop_timed_out_task(self, record: TaskRecord) -> None:
+        """
+        Cancel a task that exceeded `watch_dog_time` and free its slot in the event loop of its name.
 
-                # Determine if it is the first time to start
-                if type(self.status_check_timer) == bool:
-                    self.status_check_timer = threading.Timer(config["status_check_interval"],
-                                                              self._check_running_tasks_status)
-                    self.status_check_timer.start()  # Start a timer to check the status of a task
+        :param record: Record of the task.
+        """
+        task_id = record.task_id
+        # If the task is still running in the task dictionary, try canceling it
+        if task_id in self.running_tasks:
+            future = self.running_tasks[task_id][0]
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Io asyncio task | {task_id} | has been forcibly cancelled due to timeout")
+                self.task_history.finish(task_id, "cancelled", "NaN")
+
+        # Removed from the running task dictionary
+        self.tenant_tracker.release(task_id)
+        task_name = record.task_name
+        with self._condition(task_name):
+            if task_id in self.running_tasks:
+                del self.running_tasks[task_id]
+
+            # Reduce task counters
+            if task_name in self.task_counters:
+                self.task_counters[task_name] -= 1
+
+    def _enqueue(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                 gid: Optional[int], uid: Optional[int]) -> None:
+        """
+        Queue admitted tasks and wake up the schedulers of their names, starting them if needed.
+        The caller holds the scheduler lock.
+
+        :param tasks: Admitted tasks.
+        :param gid: Group ID the tasks are charged to.
+        :param uid: User ID the tasks are charged to.
+        """
+        admitted: Dict[str, List[Tuple]] = {}  # Admitted tasks grouped by task name
+        for task in tasks:
+            admitted.setdefault(task[1], []).append(task)
+
+        for task_name, same_name_tasks in admitted.items():
+            if task_name not in self.task_queues:
+                self.task_queues[task_name] = FairQueue()
+            self.task_queues[task_name].put_many(same_name_tasks, tenant_key(gid, uid), uid)
+            self.standby.used(task_name, len(same_name_tasks))
+
+            # If the scheduler thread has not started, start it
+            if task_name not in self.scheduler_threads or not self.scheduler_threads[task_name].is_alive():
+                self.event_loops[task_name] = asyncio.new_event_loop()
+                self.task_counters[task_name] = 0  # Initialize the task counter
+                self.stop_events[task_name] = threading.Event()
+                self._start_scheduler(task_name)
 
-                return True
-        except Exception as e:
-            logger.error(f"Error adding task | {task_id} |: {e}")
-            return False
+            # Cancel the idle timer
+            self._cancel_idle_timer(task_name)
+
+            # Wake up the scheduler of this task name only
+            condition = self._condition(task_name)
+            with condition:
+                condition.notify()
+
+        self._start_status_check_timer()
+
+    def _queue_size(self) -> int:
+        return sum(task_queue.qsize() for task_queue in list(self.task_queues.values()))
+
+    def _queued_count(self, task_name: str) -> int:
+        task_queue = self.task_queues.get(task_name)
+        return task_queue.qsize() if task_queue is not None else 0
+
+    def _remove_queued(self, predicate: Callable[[Tuple], bool]) -> List[Tuple]:
+        removed = []
+        for task_queue in list(self.task_queues.values()):
+            removed.extend(task_queue.remove_if(predicate))
+        return removed
+
+    def _remove_oldest(self, task_name: str) -> Optional[Tuple]:
+        task_queue = self.task_queues.get(task_name)
+        return task_queue.remove_oldest(lambda task: True) if task_queue is not None else None
+
+    def _condition(self, task_name: str) -> threading.Condition:
+        """
+        Get the condition of a task name, created on first use. It protects the running task counter of the name
+        and wakes up its scheduler only, so that the schedulers of different names never contend for one lock.
+
+        :param task_name: Task name.
+        :return: Condition variable.
+        """
+        condition = self.conditions.get(task_name)
+        if condition is None:
+            with self.conditions_lock:
+                condition = self.conditions.get(task_name)
+                if condition is None:
+                    lock = self.name_locks[task_name] = InstrumentedLock()
+                    condition = self.conditions[task_name] = threading.Condition(lock)
+        return condition
+
+    def _lock_stats(self) -> Dict[str, Dict]:
+        stats = super()._lock_stats()
+        with self.conditions_lock:
+            stats["task names"] = merge_lock_stats(list(self.name_locks.values()))
+        return stats
+
+    def _backend_info(self) -> Dict:
+        """
+        Get the task names that blocked their event loop, and the offloaded runs still holding a thread after
+        they were stopped.
+        """
+        return {
+            "loop_lag": self.lag_monitor.stats(),
+            "offload": {
+                "threads": config.get("loop_lag_offload_threads", 4),
+                "leaked": [
+                    {"task_id": task_id, "task_name": task_name, "since": stopped_at}
+                    for task_id, (task_name, stopped_at) in list(self.leaked_runs.items())
+                ]
+            }
+        }
+
+    def _max_concurrent(self, task_name: str) -> int:
+        """
+        Get the maximum number of tasks of a task name running at the same time in its event loop.
+        This is the `max_concurrent` option of the plugin, or `maximum_event_loop_tasks` if it did not declare one.
+
+        :param task_name: Task name.
+        :return: Concurrency limit.
+        """
+        return task_policy.get(task_name).max_concurrent or config["maximum_event_loop_tasks"]
 
     # Start the scheduler
     def _start_scheduler(self, task_name: str) -> None:
@@ -167,7 +198,7 @@ class IoAsyncTask:
         :param task_name: Task name.
         """
 
-        with self.condition:
+        with self._condition(task_name):
             if task_name not in self.scheduler_threads or not self.scheduler_threads[task_name].is_alive():
                 self.scheduler_started = True
                 self.scheduler_threads[task_name] = threading.Thread(target=self._scheduler, args=(task_name,),
@@ -176,35 +207,48 @@ class IoAsyncTask:
 
                 # Start the event loop thread
                 threading.Thread(target=self._run_event_loop, args=(task_name,), daemon=True).start()
+                self.standby.started(task_name)
 
     # Stop the scheduler
+    def stop_scheduler(self, force_cleanup: bool, system_operations: bool = False) -> None:
+        """
+        Stop all schedulers and event loops, see `stop_all_schedulers`.
+
+        :param force_cleanup: Force the end of all running tasks.
+        :param system_operations: System execution metrics.
+        """
+        self.stop_all_schedulers(force_cleanup, system_operations)
+
     def _stop_scheduler(self, task_name: str, force_cleanup: bool, system_operations: bool = False) -> None:
         """
         :param task_name: Task name.
         :param force_cleanup: Force the end of a running task
-        Stop the scheduler and event loop, and forcibly kill all tasks if force_cleanup is True.
+        Stop the scheduler and event loop of a task name, and forcibly kill its tasks if force_cleanup is True.
+        The schedulers of other task names keep running.
         :param system_operations: System execution metrics
         """
         with self.scheduler_lock:
+            stop_event = self.stop_events.get(task_name)
+            if stop_event is None:
+                return None
+
             # Check if all tasks are completed
-            if not self.task_queues[task_name].empty() or not len(self.running_tasks) == 0:
+            task_queue = self.task_queues.get(task_name)
+            if (task_queue is not None and not task_queue.empty()) or self.task_counters.get(task_name, 0) > 0:
                 if system_operations:
-                    logger.warning(f"Io asyncio task | detected running tasks | stopping operation terminated")
+                    logger.warning("Io asyncio task | detected running tasks | stopping operation terminated")
                     return None
 
             logger.warning("Exit cleanup")
 
-            with self.condition:
-                self.scheduler_started = False
-                self.scheduler_stop_event.set()
-                self.condition.notify_all()
+            condition = self._condition(task_name)
+            with condition:
+                stop_event.set()
+                condition.notify_all()
 
             if force_cleanup:
                 # Forcibly cancel all running tasks
                 self._cancel_all_running_tasks(task_name)
-                self.scheduler_stop_event.set()
-            else:
-                self.scheduler_stop_event.set()
 
             # Clear the task queue
             self._clear_task_queue(task_name)
@@ -215,10 +259,6 @@ class IoAsyncTask:
             # Wait for the scheduler thread to finish
             self._join_scheduler_thread(task_name)
 
-            # Clean up all task return results
-            with self.condition:
-                self.task_results.clear()
-
             # Reset parameters for scheduler restart
             if task_name in self.event_loops:
                 del self.event_loops[task_name]
@@ -226,6 +266,15 @@ class IoAsyncTask:
                 del self.scheduler_threads[task_name]
             if task_name in self.task_queues:
                 del self.task_queues[task_name]
+            with condition:
+                del self.stop_events[task_name]
+                self.task_counters.pop(task_name, None)
+                self.scheduler_started = bool(self.scheduler_threads)
+            if not self.scheduler_started:
+                # The last event loop stopped, the status check restarts with the next task
+                self.stop_status_check_timer()
+            self._cancel_idle_timer(task_name)
+            self.standby.stopped(task_name)
 
             logger.info(
                 f"Scheduler and event loop for task {task_name} have stopped, all resources have been released and parameters reset")
@@ -241,7 +290,7 @@ class IoAsyncTask:
             # Check if all tasks are completed
             if not all(q.empty() for q in self.task_queues.values()) or len(self.running_tasks) != 0:
                 if system_operations:
-                    logger.warning(f"Io asyncio task | detected running tasks | stopping operation terminated")
+                    logger.warning("Io asyncio task | detected running tasks | stopping operation terminated")
                     return None
 
             logger.warning("Exit cleanup")
@@ -249,68 +298,91 @@ class IoAsyncTask:
             if not system_operations:
                 self.stop_status_check_timer()
 
-            with self.condition:
-                self.scheduler_started = False
-                self.scheduler_stop_event.set()
-                self.condition.notify_all()
+            self.scheduler_started = False
+            self.scheduler_stop_event.set()
+            for condition in list(self.conditions.values()):
+                with condition:
+                    condition.notify_all()
 
             if force_cleanup:
                 # Forcibly cancel all running tasks
-                for task_name in list(self.running_tasks.keys()):  # Create a copy using list()
+                for task_name in {details[1] for details in list(self.running_tasks.values())}:
                     self._cancel_all_running_tasks(task_name)
                 self.scheduler_stop_event.set()
             else:
                 self.scheduler_stop_event.set()
 
             # Clear all task queues
-            for task_name in list(self.task_queues.keys()):
-                self._clear_task_queue(task_name)
+            self._clear_task_queue()
 
             # Stop all event loops
             for task_name in list(self.event_loops.keys()):
                 self._stop_event_loop(task_name)
+            self.task_history.clear()
 
             # Wait for all scheduler threads to finish
             for task_name in list(self.scheduler_threads.keys()):
                 self._join_scheduler_thread(task_name)
 
-            # Clean up all task return results
-            with self.condition:
-                self.task_results.clear()
+            # Leaked offloaded runs cannot be joined, leave their threads to finish on their own
+            if self.offload_executor is not None:
+                self.offload_executor.shutdown(wait=False, cancel_futures=True)
+                self.offload_executor = None
 
             # Reset parameters for scheduler restart
+            for task_name in self.scheduler_threads:
+                self.standby.stopped(task_name)
             self.event_loops.clear()
             self.scheduler_threads.clear()
             self.task_queues.clear()
+            self.stop_events.clear()
+            for task_name in list(self.idle_timers.keys()):
+                self._cancel_idle_timer(task_name)
+            self.scheduler_stop_event.clear()
 
             logger.info(
-                f"All schedulers and event loops have stopped, all resources have been released and parameters reset")
+                "All schedulers and event loops have stopped, all resources have been released and parameters reset")
 
     # Task scheduler
     def _scheduler(self, task_name: str) -> None:
         asyncio.set_event_loop(self.event_loops[task_name])
+        stop_event = self.stop_events[task_name]
+
+        def stopping() -> bool:
+            # All schedulers stop with the backend, the scheduler of an idle task name stops alone
+            return self.scheduler_stop_event.is_set() or stop_event.is_set()
 
-        while not self.scheduler_stop_event.is_set():
-            with self.condition:
+        condition = self._condition(task_name)
+        while not stopping():
+            with condition:
                 while (self.task_queues[task_name].empty() or self.task_counters[
-                    task_name] >= config["maximum_event_loop_tasks"]) and not self.scheduler_stop_event.is_set():
-                    self.condition.wait()
+                    task_name] >= self._max_concurrent(task_name)) and not stopping():
+                    if self.task_counters[task_name]:
+                        # Wake up regularly to catch a task blocking the event loop while it is stalled
+                        condition.wait(PROBE_INTERVAL)
+                        self.lag_monitor.sample(task_name, self.event_loops[task_name])
+                    else:
+                        condition.wait()
 
-                if self.scheduler_stop_event.is_set():
+                if stopping():
                     break
 
                 if self.task_queues[task_name].qsize() == 0:
                     continue
 
                 task = self.task_queues[task_name].get()
+                # Counted before it starts, so that a task finishing at once cannot be uncounted first
+                self.task_counters[task_name] += 1
 
             # Execute the task after the lock is released
             timeout_processing, task_name, task_id, func, args, kwargs = task
             future = asyncio.run_coroutine_threadsafe(self._execute_task(task), self.event_loops[task_name])
 
-            with self.condition:
-                self.running_tasks[task_id] = [future, task_name]
-                self.task_counters[task_name] += 1
+            with condition:
+                record = self.task_history.get(task_id)
+                if record is not None and record.status in ("pending", "running"):
+                    # Not registered if it already finished, it would never be removed
+                    self.running_tasks[task_id] = [future, task_name]
 
     # A function that executes a task
     @memory_release_decorator
@@ -323,62 +395,76 @@ class IoAsyncTask:
         timeout_processing, task_name, task_id, func, args, kwargs = task
 
         try:
-            if task_id in self.banned_task_ids:
+            if task_name in self.banned_task_names:
                 logger.warning(f"Io asyncio task | {task_id} | is banned and will be deleted")
+                self.task_history.finish(task_id, "cancelled")
+                self.task_results.cancel(task_id)
                 return
 
             # Modify the task status
-            with self.condition:
-                self.task_details[task_id]["start_time"] = time.time()
-                self.task_details[task_id]["status"] = "running"
+            record = self.task_history.start(task_id)
+            self.tenant_tracker.mark_running(task_id)
+            # Lets the lag monitor name the task when it blocks the event loop
+            asyncio.current_task().set_name(task_id)
 
             logger.info(f"Start running io asyncio task | {task_id} | ")
 
+            streaming = inspect.isasyncgenfunction(func)
+
+            def start() -> Any:
+                if streaming:
+                    # Streaming handler, the watchdog limits the wait for each output instead of the whole task
+                    coroutine = self._consume_async_stream(task_id, func(*args, **kwargs),
+                                                           config["watch_dog_time"] if timeout_processing else None)
+                else:
+                    coroutine = func(*args, **kwargs)
+                # Only the steps of this task are charged, not the other tasks of the event loop
+                return measure_coroutine(coroutine, record)
+
+            if self._offloaded(task_name, func):
+                # The plugin blocks its event loop, run the coroutine in a thread with an event loop of its own
+                coroutine = self._run_offloaded(task_id, task_name, start)
+            else:
+                coroutine = start()
+
             # If the task needs timeout processing, set the timeout time
-            if timeout_processing:
+            if timeout_processing and not streaming:
                 with ThreadingTimeout(seconds=config["watch_dog_time"] + 5, swallow_exc=False):
                     result = await asyncio.wait_for(
-                        func(*args, **kwargs),
+                        coroutine,
                         timeout=config["watch_dog_time"]
                     )
             else:
-                result = await func(*args, **kwargs)
+                result = await coroutine
 
-            # Store task return results, keep up to 2 results
-            with self.condition:
-                if task_id not in self.task_results:
-                    self.task_results[task_id] = []
-                self.task_results[task_id].append(result)
-                if len(self.task_results[task_id]) > 2:
-                    self.task_results[task_id].pop(0)  # Remove the oldest result
+            # Store the result and resolve the future of the task
+            self.task_results.set_result(task_id, result)
 
             # Update task status to "completed"
-            with self.condition:
-                self.task_details[task_id]["status"] = "completed"
+            self.task_history.finish(task_id, "completed")
 
-        except (asyncio.TimeoutError, TimeoutException):
+        except (asyncio.TimeoutError, TimeoutException) as e:
             logger.warning(f"Io asyncio task | {task_id} | timed out, forced termination")
-            with self.condition:
-                self.task_details[task_id]["status"] = "timeout"
-                self.task_details[task_id]["end_time"] = 'NaN'
+            self.task_history.finish(task_id, "timeout", "NaN")
+            self.task_results.set_exception(task_id, e)
         except asyncio.CancelledError:
             logger.warning(f"Io asyncio task | {task_id} | was cancelled")
-            with self.condition:
-                self.task_details[task_id]["status"] = "cancelled"
+            self.task_history.finish(task_id, "cancelled")
+            self.task_results.cancel(task_id)
         except Exception as e:
             logger.error(f"Io asyncio task | {task_id} | execution failed: {e}")
-            with self.condition:
-                self.task_details[task_id]["status"] = "failed"
-                self._log_error(task_id, e)
+            self.task_history.finish(task_id, "failed", error=e)
+            self._log_error(task_id, e)
+            self.task_results.set_exception(task_id, e)
         finally:
+            self.tenant_tracker.release(task_id)
+
             # Opt-out will result in the deletion of the information and the following processing will not be possible
-            with self.condition:
-                if self.task_details.get(task_id, None) is None:
+            condition = self._condition(task_name)
+            with condition:
+                if self.task_history.get(task_id) is None:
                     return None
 
-                if not self.task_details[task_id].get("end_time") == "NaN":
-                    self.task_details[task_id]["end_time"] = time.time()
-
                 # Remove the task from running tasks dictionary
                 if task_id in self.running_tasks:
                     del self.running_tasks[task_id]
@@ -387,117 +473,82 @@ class IoAsyncTask:
                 if task_name in self.task_counters and self.task_counters[task_name] > 0:
                     self.task_counters[task_name] -= 1
 
-                # Check if all tasks are completed
-                if self.task_queues[task_name].empty() and len(self.running_tasks) == 0:
+                # Check if all tasks of this name are completed
+                task_queue = self.task_queues.get(task_name)
+                if (task_queue is None or task_queue.empty()) and self.task_counters.get(task_name, 0) == 0:
                     self._reset_idle_timer(task_name)
 
-                # Notify the scheduler to continue scheduling new tasks
-                self.condition.notify()
-
-                # Check the number of task information
-                self._check_and_log_task_details()
+                # Notify the scheduler of this task name to continue scheduling new tasks
+                condition.notify()
 
-    # Log error information during task execution
-    def _log_error(self, task_id: str, exception: Exception) -> None:
+    async def _consume_async_stream(self, task_id: str, generator: Any, timeout: Optional[float]) -> List[Any]:
         """
-        Log error information during task execution.
+        Run a task whose function is an asynchronous generator, forwarding each output as it is yielded.
 
         :param task_id: Task ID.
-        :param exception: Exception object.
-        """
-        error_info = {
-            "task_id": task_id,
-            "error_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-            "error_message": str(exception)
-        }
-        with self.condition:
-            self.error_logs.append(error_info)
-            # If error logs exceed 10, remove the earliest one
-            if len(self.error_logs) > 10:
-                self.error_logs.pop(0)
-
-    # The task scheduler closes the countdown
-    def _reset_idle_timer(self, task_name: str) -> None:
-        """
-        Reset the idle timer for a specific task name.
-
-        :param task_name: Task name.
-        """
-        with self.idle_timer_lock:
-            if task_name in self.idle_timers and self.idle_timers[task_name] is not None:
-                self.idle_timers[task_name].cancel()
-            self.idle_timers[task_name] = threading.Timer(self.idle_timeout, self._stop_scheduler,
-                                                          args=(task_name, False, True,))
-            self.idle_timers[task_name].start()
-
-    def _cancel_idle_timer(self, task_name: str) -> None:
+        :param generator: Asynchronous generator returned by the task function.
+        :param timeout: Maximum seconds to wait for each output, None for no limit.
+        :return: List of the outputs, the result of the task.
         """
-        Cancel the idle timer for a specific task name.
-
-        :param task_name: Task name.
-        """
-        with self.idle_timer_lock:
-            if task_name in self.idle_timers and self.idle_timers[task_name] is not None:
-                self.idle_timers[task_name].cancel()
-                del self.idle_timers[task_name]
+        outputs = []
+        try:
+            while True:
+                try:
+                    output = await asyncio.wait_for(generator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    return outputs
+                outputs.append(output)
+                self._stream_output(task_id, output)
+        finally:
+            await generator.aclose()
 
-    def _clear_task_queue(self, task_name: str) -> None:
+    async def _run_offloaded(self, task_id: str, task_name: str, start: Callable[[], Any]) -> Any:
         """
-        Clear the task queue for a specific task name.
+        Run a task in a thread of the offload pool, with an event loop of its own. A thread cannot be
+        interrupted: when the task times out or is cancelled while it runs, the run is recorded as leaked
+        until it returns, and keeps its thread of the pool. The pool is bounded by `loop_lag_offload_threads`,
+        so leaked runs can only delay the other offloaded tasks.
 
+        :param task_id: Task ID.
         :param task_name: Task name.
-        """
-        while not self.task_queues[task_name].empty():
-            self.task_queues[task_name].get(timeout=1)
+        :param start: Creates the coroutine of the task, called in the thread so that a task stopped while
+            waiting for a thread is never started.
+        :return: Result of the coroutine.
+        """
+        if self.offload_executor is None:
+            self.offload_executor = ThreadPoolExecutor(max_workers=config.get("loop_lag_offload_threads", 4),
+                                                       thread_name_prefix="offload")
+        future = self.offload_executor.submit(lambda: asyncio.run(start()))
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if not future.cancel() and not future.done():
+                self.leaked_runs[task_id] = (task_name, time.time())
+                future.add_done_callback(lambda _: self.leaked_runs.pop(task_id, None))
+                logger.warning(f"Io asyncio task | {task_id} | was stopped, but its thread keeps running "
+                               f"until the plugin returns")
 
-    def _join_scheduler_thread(self, task_name: str) -> None:
+    def _offloaded(self, task_name: str, func: Callable) -> bool:
         """
-        Wait for the scheduler thread to finish for a specific task name.
+        Check whether a task must run in a thread instead of the event loop of its name: its task name was seen
+        blocking the loop, or the static analysis of its plugin found blocking calls in its function.
 
         :param task_name: Task name.
+        :param func: Task function.
+        :return: Whether to run the task in a thread.
         """
-        if task_name in self.scheduler_threads and self.scheduler_threads[task_name].is_alive():
-            self.scheduler_threads[task_name].join()
+        if self.lag_monitor.offloaded(task_name):
+            return True
+        profile = handler_profiles.get(func)
+        return profile is not None and profile.kind == BLOCKING_IN_ASYNC and config.get("loop_lag_offload", False)
 
-    def get_queue_info(self) -> Dict:
+    def _stop_idle_scheduler(self, key: str) -> None:
         """
-        Get detailed information about the task queue.
+        Stop the scheduler and event loop of a task name whose idle timer expired, see `_stop_scheduler`.
 
-        Returns:
-            Dict: Dictionary containing queue size, number of running tasks, number of failed tasks, task details, and error logs.
+        :param key: Task name.
         """
-        with self.condition:
-            queue_info = {
-                "queue_size": sum(q.qsize() for q in self.task_queues.values()),
-                "running_tasks_count": 0,
-                "failed_tasks_count": 0,
-                "task_details": {},
-                "error_logs": self.error_logs.copy()  # Return recent error logs
-            }
-
-            for task_id, details in self.task_details.items():
-                status = details.get("status")
-                task_name = details.get("task_name", "Unknown")
-                if status == "running":
-                    start_time = details.get("start_time")
-                    current_time = time.time()
-                    if current_time - start_time > config["watch_dog_time"]:
-                        # Change end time of timed out tasks to NaN
-                        queue_info["task_details"][task_id] = {
-                            "task_name": task_name,
-                            "start_time": start_time,
-                            "status": status,
-                            "end_time": "NaN"
-                        }
-                    else:
-                        queue_info["task_details"][task_id] = details
-                    queue_info["running_tasks_count"] += 1
-                elif status == "failed":
-                    queue_info["task_details"][task_id] = details
-                    queue_info["failed_tasks_count"] += 1
-                else:
-                    queue_info["task_details"][task_id] = details
-        return queue_info
+        self._stop_scheduler(key, False, True)
 
     def force_stop_task(self, task_id: str) -> None:
         """
@@ -513,77 +564,21 @@ class IoAsyncTask:
         else:
             logger.warning(f"Io asyncio task | {task_id} | does not exist or is already completed")
 
-    def cancel_all_queued_tasks_by_name(self, task_name: str) -> None:
-        """
-        Cancel all queued tasks with the same name.
-
-        :param task_name: Task name.
-        """
-        with self.condition:
-            if task_name in self.task_queues:
-                temp_queue = queue.Queue()
-                while not self.task_queues[task_name].empty():
-                    task = self.task_queues[task_name].get()
-                    if task[1] == task_name:  # Use function name to match task name
-                        logger.warning(
-                            f"Io asyncio task | {task_name} | is waiting to be executed in the queue, has been deleted")
-                    else:
-                        temp_queue.put(task)
-
-                # Put uncancelled tasks back into the queue
-                while not temp_queue.empty():
-                    self.task_queues[task_name].put(temp_queue.get())
-
-    def ban_task_name(self, task_name: str) -> None:
-        """
-        Ban a task name from execution, delete tasks directly if detected and print information.
-
-        :param task_name: Task name.
-        """
-        with self.condition:
-            self.banned_task_ids.append(task_name)
-            logger.warning(f"Io asyncio task | {task_name} | has been banned from execution")
-
-            # Cancel all queued tasks with the banned task name
-            self.cancel_all_queued_tasks_by_name(task_name)
-
-    def allow_task_name(self, task_name: str) -> None:
-        """
-        Allow a banned task name to be executed again.
-
-        :param task_name: Task name.
-        """
-        with self.condition:
-            if task_name in self.banned_task_ids:
-                self.banned_task_ids.remove(task_name)
-                logger.info(f"Io asyncio task | {task_name} | is allowed for execution")
-            else:
-                logger.warning(f"Io asyncio task | {task_name} | is not banned, no action taken")
-
-    # Obtain the information returned by the corresponding task
-    def get_task_result(self, task_id: str) -> Optional[Any]:
-        """
-        Get the result of a task. If there is a result, return and delete the oldest result; if no result, return None.
-
-        :param task_id: Task ID.
-        :return: Task return result, if the task is not completed or does not exist, return None.
-        """
-        if task_id in self.task_results and self.task_results[task_id]:
-            result = self.task_results[task_id].pop(0)  # Return and delete the oldest result
-            with self.condition:
-                if not self.task_results[task_id]:
-                    del self.task_results[task_id]
-            return result
-        return None
-
     def _run_event_loop(self, task_name: str) -> None:
         """
         Run the event loop for a specific task name.
 
         :param task_name: Task name.
         """
-        asyncio.set_event_loop(self.event_loops[task_name])
-        self.event_loops[task_name].run_forever()
+        event_loop = self.event_loops[task_name]
+        asyncio.set_event_loop(event_loop)
+        probe = event_loop.create_task(self.lag_monitor.probe(task_name))
+        event_loop.run_forever()
+        # Stopped with its scheduler, release the resources of the loop
+        probe.cancel()
+        with suppress(asyncio.CancelledError):
+            event_loop.run_until_complete(probe)
+        event_loop.close()
 
     def _cancel_all_running_tasks(self, task_name: str) -> None:
         """
@@ -591,19 +586,17 @@ class IoAsyncTask:
 
         :param task_name: Task name.
         """
-        with self.condition:
+        with self._condition(task_name):
             for task_id in list(self.running_tasks.keys()):  # Create a copy using list()
                 if self.running_tasks[task_id][1] == task_name:
                     future = self.running_tasks[task_id][0]
                     if not future.done():  # Check if the task is completed
                         future.cancel()
+                        self.tenant_tracker.release(task_id)
                         logger.warning(f"Io asyncio task | {task_id} | has been forcibly cancelled")
                         # Update task status to "cancelled"
-                        if task_id in self.task_details:
-                            self.task_details[task_id]["status"] = "cancelled"
-                            self.task_details[task_id]["end_time"] = time.time()
-                        if task_id in self.task_results:
-                            del self.task_results[task_id]
+                        self.task_history.finish(task_id, "cancelled")
+                        self.task_results.cancel(task_id)
 
     def _stop_event_loop(self, task_name: str) -> None:
         """
@@ -621,41 +614,8 @@ class IoAsyncTask:
                 # Clean up all tasks and resources
                 self._cancel_all_running_tasks(task_name)
                 self._clear_task_queue(task_name)
-                with self.condition:
-                    self.task_details.clear()
-                    self.task_results.clear()
             except Exception as e:
                 logger.error(f"Io asyncio task | stopping event loop | error occurred: {e}")
 
-    def _check_and_log_task_details(self) -> None:
-        """
-        Check if the number of task details exceeds the configured limit and remove those with specific statuses.
-        """
-        with self.condition:
-            task_details_copy = self.task_details.copy()
-            if len(task_details_copy) > config["maximum_task_info_storage"]:
-                logger.warning(f"More than {config['maximum_task_info_storage']} task details detected. "
-                               f"Cleaning up old task details.")
-
-                # Filter out tasks with status 'failed', 'completed', or 'timeout'
-                new_task_details = {task_id: details for task_id, details in task_details_copy.items()
-                                    if details.get("status") in ["pending", "running", "cancelled", "failed"]}
-
-                # Update the task details with the filtered results
-                self.task_details = new_task_details
-
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
-        """
-        Obtain task status information for a specified task_id.
-
-        :param task_id: Task ID.
-        :return: A dictionary containing information about the status of the task, or None if the task does not exist.
-        """
-        if task_id in self.task_details:
-            return self.task_details[task_id]
-        else:
-            logger.warning(f"Io asyncio task | {task_id} | does not exist or has been completed and removed.")
-            return None
-
 
 io_async_task = IoAsyncTask()
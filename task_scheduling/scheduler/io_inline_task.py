@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import inspect
+import threading
+import time
+from typing import Callable, Dict, List, Tuple, Optional
+
+from common import logger
+from .inline_promotion import inline_promotion
+from .resource_usage import measure_thread
+from .result_store import TaskFuture
+from .scheduler_base import SchedulerBase
+from .utils import is_async_function
+
+
+class IoInlineTask(SchedulerBase):
+    """
+    Inline task manager class, runs the tasks of plugins registered with `execution="inline"` directly in the thread
+    adding them, without queue, thread handoff or watchdog. Only for handlers that return almost immediately:
+    their timeouts are not enforced, they cannot be force stopped and they delay the messages dispatched after them.
+    Plugins measured to be that fast in the thread pool are promoted to it automatically, see `InlinePromotion`.
+    Backend "inline".
+    """
+    __slots__ = ['admitted']
+
+    log_name = "Io inline task"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.admitted = threading.local()  # Tasks admitted by the current `add_tasks` call of each thread
+
+    def accepts(self, func: Callable) -> bool:
+        """
+        Check whether the backend can run a task function, coroutine functions need an event loop.
+
+        :param func: Task function.
+        :return: Whether tasks of this function can be added to the backend.
+        """
+        return not is_async_function(func)
+
+    def add_tasks(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                  gid: Optional[int] = None, uid: Optional[int] = None,
+                  deadline: Optional[float] = None) -> List[Optional[TaskFuture]]:
+        """
+        Admit a batch of tasks and run them one after the other before returning.
+
+        :param tasks: Tasks as tuples of (timeout_processing, task_name, task_id, func, args, kwargs).
+        :param gid: Group ID the tasks are charged to, used for per-group quotas.
+        :param uid: User ID the tasks are charged to, used for per-user quotas.
+        :param deadline: Seconds within which the tasks must finish to be useful, None for no deadline.
+        :return: Future of each task, resolved unless it waits for an identical task or its batch,
+                 or None for the tasks that were not added.
+        """
+        # Nested when a full batch is submitted while adding its last task
+        outer = getattr(self.admitted, "tasks", None)
+        self.admitted.tasks = []
+        try:
+            futures = super().add_tasks(tasks, gid=gid, uid=uid, deadline=deadline)
+            # Coalesced and batched tasks got a future without being admitted, they are not run here
+            admitted = self.admitted.tasks
+        finally:
+            self.admitted.tasks = outer
+        for task in admitted:
+            self._execute_task(task)
+        return futures
+
+    def _enqueue(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                 gid: Optional[int], uid: Optional[int]) -> None:
+        # Admitted tasks run in `add_tasks` once the scheduler lock is released
+        self.admitted.tasks.extend(tasks)
+
+    def _queue_size(self) -> int:
+        return 0
+
+    def _queued_count(self, task_name: str) -> int:
+        return 0
+
+    def _remove_queued(self, predicate: Callable[[Tuple], bool]) -> List[Tuple]:
+        return []
+
+    def _remove_oldest(self, task_name: str) -> Optional[Tuple]:
+        return None
+
+    def _execute_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> None:
+        """
+        Run a task in the current thread.
+
+        :param task: Task tuple.
+        """
+        timeout_processing, task_name, task_id, func, args, kwargs = task
+        record = self.task_history.start(task_id)
+        self.tenant_tracker.mark_running(task_id)
+        promoted = inline_promotion.is_promoted(task_name)
+        start = time.perf_counter()
+        try:
+            with measure_thread(record):
+                result = func(*args, **kwargs)
+                if inspect.isgenerator(result):
+                    result = self._consume_stream(task_id, result)
+        except Exception as e:
+            logger.error(f"Io inline task | {task_id} | execution failed: {e}")
+            self.task_history.finish(task_id, "failed", error=e)
+            self._log_error(task_id, e)
+            self.task_results.set_exception(task_id, e)
+        else:
+            self.task_history.finish(task_id, "completed")
+            self.task_results.set_result(task_id, result)
+        finally:
+            self.tenant_tracker.release(task_id)
+            if promoted:
+                # Demotes the plugin if it got slow
+                inline_promotion.observe(task_name, time.perf_counter() - start, func)
+
+    def _backend_info(self) -> Dict:
+        """
+        Get the plugins promoted to run inline.
+        """
+        return {"inline_promotion": inline_promotion.stats()}
+
+    # Stop the scheduler
+    def stop_scheduler(self, force_cleanup: bool, system_operations: bool = False) -> None:
+        """
+        Reset the backend, inline tasks have no thread to stop.
+
+        :param force_cleanup: Unused, running inline tasks cannot be stopped.
+        :param system_operations: System execution metrics
+        """
+        with self.scheduler_lock:
+            self.error_logs = []
+            self.banned_task_names = []
+
+    def force_stop_task(self, task_id: str) -> None:
+        """
+        Inline tasks cannot be force stopped, they finish before `add_task` returns.
+
+        :param task_id: task ID.
+        """
+        logger.warning(f"Io inline task | {task_id} | does not exist or is already completed")
+
+
+io_inline_task = IoInlineTask()
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+import inspect
 import queue
 import threading
 import time
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, Future
 from functools import partial
 from typing import Callable, Dict, List, Tuple, Optional, Any
@@ -9,128 +11,109 @@ from typing import Callable, Dict, List, Tuple, Optional, Any
 from common import logger
 from config import config
 from memory_management import memory_release_decorator
+from .concurrency_limit import AdaptiveLimit
+from .fair_queue import FairQueue, tenant_key
+from .inline_promotion import inline_promotion
+from .lock_metrics import InstrumentedLock
+from .resource_usage import measure_thread
+from .scheduler_base import SchedulerBase
+from .task_history import TaskRecord
+from .task_policy import task_policy
+from .utils import is_async_function
 from ..stopit import task_manager, skip_on_demand, StopException, ThreadingTimeout, TimeoutException
 
 
-class IoLinerTask:
+class IoLinerTask(SchedulerBase):
     """
     Linear task manager class, responsible for managing the scheduling, execution, and monitoring of linear tasks.
+    Backend "line": runs synchronous tasks in a thread pool of `line_task_max` threads, of which an adaptive
+    limit between `line_task_min` and `line_task_max` is used at once.
     """
-    __slots__ = [
-        'task_queue', 'running_tasks', 'task_details', 'lock', 'condition', 'scheduler_lock',
-        'scheduler_started', 'scheduler_stop_event', 'error_logs', 'scheduler_thread',
-        'banned_task_names', 'idle_timer', 'idle_timeout', 'idle_timer_lock', 'task_results',
-        'status_check_timer'
-    ]
+    __slots__ = ['task_queue', 'running_tasks', 'queue_lock', 'condition', 'concurrency']
+
+    log_name = "Io linear task"
+    queue_limit_key = "maximum_queue_line"
 
     def __init__(self) -> None:
-        self.task_queue = queue.Queue()  # Task queue
+        super().__init__()
+        self.task_queue = FairQueue()  # Task queue, dequeued round-robin across groups and users
         self.running_tasks = {}  # Running tasks
-        self.task_details: Dict[str, Dict] = {}  # Task details
-        self.lock = threading.Lock()  # Lock to protect access to shared resources
-        self.scheduler_lock = threading.RLock()  # Thread unlock
-
-        self.condition = threading.Condition()  # Condition variable for thread synchronization
-        self.scheduler_started = False  # Whether the scheduler thread has started
-        self.scheduler_stop_event = threading.Event()  # Scheduler thread stop event
-        self.error_logs: List[Dict] = []  # Logs, keep up to 10
-        self.scheduler_thread: Optional[threading.Thread] = None  # Scheduler thread
-        self.banned_task_names: List[str] = []  # List of banned task names
-        self.idle_timer: Optional[threading.Timer] = None  # Idle timer
-        self.idle_timeout = config["max_idle_time"]  # Idle timeout, default is 60 seconds
-        self.idle_timer_lock = threading.Lock()  # Idle timer lock
-        self.task_results: Dict[str, List[Any]] = {}  # Store task return results, keep up to 2 results for each task ID
-        self.status_check_timer: threading.Timer or bool = True  # check the status of a task
-
-    def _check_running_tasks_status(self) -> None:
+
+        self.queue_lock = InstrumentedLock()  # Lock of the condition, with its contention counters
+        self.condition = threading.Condition(self.queue_lock)  # Condition variable for thread synchronization
+        self.concurrency = AdaptiveLimit("line_task_min", "line_task_max")  # Number of tasks run at once
+
+    def accepts(self, func: Callable) -> bool:
         """
-        The scheduled checks whether a task with a status of 'running' is actually running.
-        If the task has been completed but the status is still 'running', the status is corrected and the appropriate action is taken.
+        Check whether the backend can run a task function, coroutine functions run in event loops instead.
+
+        :param func: Task function.
+        :return: Whether tasks of this function can be added to the backend.
         """
-        with self.lock:
-            task_details_copy = self.task_details.copy()  # Make a copy of the data to reduce the holding time of the lock
-
-        for task_id, details in task_details_copy.items():
-            if details.get("status") == "running":
-                start_time = details.get("start_time")
-                current_time = time.time()
-                timeout_processing = details.get("timeout_processing", False)  # 获取任务的超时管理标志
-
-                # If timeout management is enabled for the task and the maximum allowed time is exceeded, the task is forcibly canceled
-                if timeout_processing and (
-                        start_time is not None and current_time - start_time > config["watch_dog_time"]):
-                    if task_id in self.running_tasks:
-                        future = self.running_tasks[task_id][0]
-                        if not future.done():
-                            task_manager.skip_task(task_id)
-                            task_manager.remove(task_id)
-                            logger.warning(
-                                f"Io linear task | {task_id} | has been forcibly cancelled due to timeout")
-                            with self.lock:
-                                self.task_details[task_id]["status"] = "cancelled"
-                                self.task_details[task_id]["end_time"] = "NaN"
-                        with self.lock:
-                            del self.running_tasks[task_id]
-
-        # Restart the timer
-        # Prevent the shutdown operation from being started while it is executed
-        if not self.scheduler_stop_event.is_set():
-            self.status_check_timer = threading.Timer(
-                config["status_check_interval"], self._check_running_tasks_status)
-            self.status_check_timer.start()
-
-    def stop_status_check_timer(self) -> None:
+        return not is_async_function(func)
+
+    def _stop_timed_out_task(self, record: TaskRecord) -> None:
         """
-        Stop state detection timer.
+        Skip a task that exceeded `watch_dog_time`, the thread running it is interrupted.
+
+        :param record: Record of the task.
         """
-        if self.status_check_timer:
-            self.status_check_timer.cancel()
-            logger.info("Status check timer has been stopped")
+        task_id = record.task_id
+        if task_id in self.running_tasks:
+            future = self.running_tasks[task_id][0]
+            if not future.done():
+                task_manager.skip_task(task_id)
+                task_manager.remove(task_id)
+                logger.warning(f"Io linear task | {task_id} | has been forcibly cancelled due to timeout")
+                self.task_history.finish(task_id, "cancelled", "NaN")
+            with self.lock:
+                self.running_tasks.pop(task_id, None)
 
-    # Add the task to the scheduler
-    def add_task(self, timeout_processing: bool, task_name: str, task_id: str, func: Callable, *args, **kwargs) -> bool:
-        try:
-            with self.scheduler_lock:
-                if task_name in self.banned_task_names:
-                    logger.warning(f"Io linear task | {task_id} | is banned and will be deleted")
-                    return False
+    def _enqueue(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                 gid: Optional[int], uid: Optional[int]) -> None:
+        """
+        Queue admitted tasks and wake up the scheduler, starting it if needed. The caller holds the scheduler lock.
 
-                if self.task_queue.qsize() >= config["maximum_queue_line"]:
-                    logger.warning(f"Io linear task | {task_id} | not added, queue is full")
-                    return False
+        :param tasks: Admitted tasks.
+        :param gid: Group ID the tasks are charged to.
+        :param uid: User ID the tasks are charged to.
+        """
+        if self.scheduler_stop_event.is_set() and not self.scheduler_started:
+            self._join_scheduler_thread("line")
+            logger.info("Scheduler has fully stopped")
 
-                if self.scheduler_stop_event.is_set() and not self.scheduler_started:
-                    self._join_scheduler_thread()
-                    logger.info("Scheduler has fully stopped")
+        self.task_queue.put_many(tasks, tenant_key(gid, uid), uid)
+        self.standby.used("line", len(tasks))
 
-                # Reduce the granularity of the lock
-                with self.lock:
-                    self.task_details[task_id] = {
-                        "task_name": task_name,
-                        "start_time": None,
-                        "status": "pending",
-                        "timeout_processing": timeout_processing
-                    }
-                self.task_queue.put((timeout_processing, task_name, task_id, func, args, kwargs))
+        if not self.scheduler_started:
+            self._start_scheduler()
 
-                if not self.scheduler_started:
-                    self._start_scheduler()
+        with self.condition:
+            self.condition.notify()
 
-                with self.condition:
-                    self.condition.notify()
+        self._cancel_idle_timer("line")
+        self._start_status_check_timer()
 
-                self._cancel_idle_timer()
+    def _queue_size(self) -> int:
+        return self.task_queue.qsize()
 
-                # Determine if it is the first time to start
-                if type(self.status_check_timer) == bool:
-                    self.status_check_timer = threading.Timer(config["status_check_interval"],
-                                                              self._check_running_tasks_status)
-                    self.status_check_timer.start()  # Start a timer to check the status of a task
+    def _queued_count(self, task_name: str) -> int:
+        return self.task_queue.count_if(lambda task: task[1] == task_name)
 
-                return True
-        except Exception as e:
-            logger.error(f"Io linear task | {task_id} | error adding task: {e}")
-            return False
+    def _remove_queued(self, predicate: Callable[[Tuple], bool]) -> List[Tuple]:
+        with self.condition:
+            return self.task_queue.remove_if(predicate)
+
+    def _remove_oldest(self, task_name: str) -> Optional[Tuple]:
+        return self.task_queue.remove_oldest(lambda task: task[1] == task_name)
+
+    def _workers(self) -> Optional[int]:
+        return self.concurrency.current()
+
+    def _lock_stats(self) -> Dict[str, Dict]:
+        stats = super()._lock_stats()
+        stats["queue"] = self.queue_lock.stats()
+        return stats
 
     # Start the scheduler
     def _start_scheduler(self) -> None:
@@ -138,8 +121,9 @@ class IoLinerTask:
         Start the scheduler thread.
         """
         self.scheduler_started = True
-        self.scheduler_thread = threading.Thread(target=self._scheduler, daemon=True)
-        self.scheduler_thread.start()
+        self.scheduler_threads["line"] = threading.Thread(target=self._scheduler, daemon=True)
+        self.scheduler_threads["line"].start()
+        self.standby.started("line")
 
     # Stop the scheduler
     def stop_scheduler(self, force_cleanup: bool, system_operations: bool = False) -> None:
@@ -154,7 +138,7 @@ class IoLinerTask:
             # Check if all tasks are completed
             if not self.task_queue.empty() or not len(self.running_tasks) == 0:
                 if system_operations:
-                    logger.warning(f"Io linear task | detected running tasks | stopping operation terminated")
+                    logger.warning("Io linear task | detected running tasks | stopping operation terminated")
                     return None
 
             logger.warning("Exit cleanup")
@@ -179,16 +163,16 @@ class IoLinerTask:
                 self.condition.notify_all()
 
             # Wait for the scheduler thread to finish
-            self._join_scheduler_thread()
+            self._join_scheduler_thread("line")
 
             # Reset state variables
             self.scheduler_started = False
             self.scheduler_stop_event.clear()
             self.error_logs = []
-            self.scheduler_thread = None
+            self.scheduler_threads.pop("line", None)
             self.banned_task_names = []
-            self.idle_timer = None
-            self.task_results = {}
+            self._cancel_idle_timer("line")
+            self.standby.stopped("line")
 
             logger.info(
                 "Scheduler and event loop have stopped, all resources have been released and parameters reset")
@@ -201,29 +185,43 @@ class IoLinerTask:
         with ThreadPoolExecutor(max_workers=int(config["line_task_max"])) as executor:
             while not self.scheduler_stop_event.is_set():
                 with self.condition:
-                    while self.task_queue.empty() and not self.scheduler_stop_event.is_set():
+                    task = self._next_task()
+                    while task is None and not self.scheduler_stop_event.is_set():
+                        # Woken up when a task is added or finishes
                         self.condition.wait()
+                        task = self._next_task()
 
                     if self.scheduler_stop_event.is_set():
                         break
 
-                    if self.task_queue.qsize() == 0:
-                        continue
-
-                    task = self.task_queue.get()
-
                 timeout_processing, task_name, task_id, func, args, kwargs = task
 
                 with self.lock:
-                    if task_name in [details[1] for details in self.running_tasks.values()]:
-                        self.task_queue.put(task)
-                        continue
-
                     future = executor.submit(self._execute_task, task)
                     self.running_tasks[task_id] = [future, task_name]
 
                 future.add_done_callback(partial(self._task_done, task_id))
 
+    def _next_task(self) -> Optional[Tuple[bool, str, str, Callable, Tuple, Dict]]:
+        """
+        Take the next queued task whose plugin is below its concurrency limit, if the adaptive limit of the
+        backend is not reached. By default, tasks with the same name run one at a time.
+
+        :return: Task, or None if no queued task can be started now.
+        """
+        with self.lock:
+            if len(self.running_tasks) >= self.concurrency.current():
+                return None
+            running_counts = Counter(details[1] for details in self.running_tasks.values())
+
+        def eligible(task: Tuple) -> bool:
+            return running_counts[task[1]] < (task_policy.get(task[1]).max_concurrent or 1)
+
+        try:
+            return self.task_queue.get(eligible=eligible)
+        except queue.Empty:
+            return None
+
     # A function that executes a task
     @memory_release_decorator
     def _execute_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> Any:
@@ -231,32 +229,47 @@ class IoLinerTask:
 
         return_results = None
         try:
-            with self.lock:
-                self.task_details[task_id]["start_time"] = time.time()
-                self.task_details[task_id]["status"] = "running"
+            record = self.task_history.start(task_id)
+            self.tenant_tracker.mark_running(task_id)
 
             logger.info(f"Start running io linear task, task ID: {task_id}")
-            if timeout_processing:
-                with ThreadingTimeout(seconds=config["watch_dog_time"], swallow_exc=False) as task_control:
-                    with skip_on_demand() as skip_ctx:
-                        task_manager.add(task_control, skip_ctx, task_id)
-                        return_results = func(*args, **kwargs)
-                task_manager.remove(task_id)
-            else:
-                with ThreadingTimeout(seconds=None, swallow_exc=False) as task_control:
-                    with skip_on_demand() as skip_ctx:
-                        task_manager.add(task_control, skip_ctx, task_id)
-                        return_results = func(*args, **kwargs)
-                task_manager.remove(task_id)
-        except TimeoutException:
+            with measure_thread(record):
+                if timeout_processing:
+                    with ThreadingTimeout(seconds=config["watch_dog_time"], swallow_exc=False) as task_control:
+                        with skip_on_demand() as skip_ctx:
+                            task_manager.add(task_control, skip_ctx, task_id)
+                            result = func(*args, **kwargs)
+                            if inspect.isgenerator(result):
+                                # Streaming handler, each output restarts the watchdog
+                                result = self._consume_stream(task_id, result,
+                                                              partial(self._restart_watchdog, task_control))
+                            # Only set once the task is over, the cleanup below relies on it
+                            return_results = result
+                    task_manager.remove(task_id)
+                else:
+                    with ThreadingTimeout(seconds=None, swallow_exc=False) as task_control:
+                        with skip_on_demand() as skip_ctx:
+                            task_manager.add(task_control, skip_ctx, task_id)
+                            result = func(*args, **kwargs)
+                            if inspect.isgenerator(result):
+                                result = self._consume_stream(task_id, result)
+                            return_results = result
+                    task_manager.remove(task_id)
+            self._observe_task(task_id, func)
+        except TimeoutException as e:
             logger.warning(f"Io linear task | {task_id} | timed out, forced termination")
             self._update_task_status(task_id, "timeout")
+            self.task_results.set_exception(task_id, e)
         except StopException:
             logger.warning(f"Io linear task | {task_id} | was cancelled")
             self._update_task_status(task_id, "cancelled")
+            self.task_results.cancel(task_id)
         except Exception as e:
             logger.error(f"Io linear task | {task_id} | execution failed: {e}")
+            self._observe_task(task_id, func)
+            self._update_task_status(task_id, "failed", e)
             self._log_error(task_id, e)
+            self.task_results.set_exception(task_id, e)
         finally:
             if return_results is None:
                 if task_manager.check(task_id):
@@ -264,6 +277,16 @@ class IoLinerTask:
                     return_results = "error happened"
             return return_results
 
+    @staticmethod
+    def _restart_watchdog(task_control: ThreadingTimeout) -> None:
+        """
+        Give a streaming task the full `watch_dog_time` again after it made progress.
+
+        :param task_control: Timeout of the task.
+        """
+        task_control.suppress_interrupt()
+        task_control.setup_interrupt()
+
     def _task_done(self, task_id: str, future: Future) -> None:
         """
         Callback function after a task is completed.
@@ -274,13 +297,8 @@ class IoLinerTask:
         try:
             result = future.result()  # Get task result, exceptions will be raised here
 
-            # Store task return results, keep up to 2 results
-            with self.lock:
-                if task_id not in self.task_results:
-                    self.task_results[task_id] = []
-                self.task_results[task_id].append(result)
-                if len(self.task_results[task_id]) > 2:
-                    self.task_results[task_id].pop(0)  # Remove the oldest result
+            # Store the result and resolve the future of the task, unless it already failed
+            self.task_results.set_result(task_id, result)
             if not result == "error happened":
                 self._update_task_status(task_id, "completed")
         finally:
@@ -288,125 +306,55 @@ class IoLinerTask:
             with self.lock:
                 if task_id in self.running_tasks:
                     del self.running_tasks[task_id]
+            self.tenant_tracker.release(task_id)
 
             # Check if all tasks are completed
             with self.lock:
                 if self.task_queue.empty() and len(self.running_tasks) == 0:
-                    self._reset_idle_timer()
+                    self._reset_idle_timer("line")
 
-            # Check the number of task information
-            self._check_and_log_task_details()
-
-    # Update the task status
-    def _update_task_status(self, task_id: str, status: str) -> None:
-        """
-        Update task status.
-
-        :param task_id: Task ID.
-        :param status: Task status.
-        """
-        with self.lock:
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
-            if task_id in self.task_details:
-                self.task_details[task_id]["status"] = status
-                # Set end_time to NaN if the task failed because of timeout and timeout_processing was False
-                if status == "timeout":
-                    self.task_details[task_id]["end_time"] = "NaN"
-                else:
-                    self.task_details[task_id]["end_time"] = time.time()
+            # Wake up the scheduler, a task waiting for this slot may now be started
+            with self.condition:
+                self.condition.notify()
 
-    def _log_error(self, task_id: str, exception: Exception) -> None:
+    def _observe_task(self, task_id: str, func: Callable) -> None:
         """
-        Log error information during task execution.
+        Report the queue wait and runtime of a task whose function just returned or raised to the adaptive
+        concurrency limit, and its runtime to the inline promotion of fast plugins.
+        Tasks stopped by the watchdog or cancelled are not representative and are not reported.
 
         :param task_id: Task ID.
-        :param exception: Exception object.
+        :param func: Task function.
         """
-        error_info = {
-            "task_id": task_id,
-            "error_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-            "error_message": str(exception)
-        }
+        record = self.task_history.get(task_id)
+        if record is None or record.start_time is None:
+            return
         with self.lock:
-            self.error_logs.append(error_info)
-            if len(self.error_logs) > 10:
-                self.error_logs.pop(0)  # Remove the oldest error log
+            saturated = len(self.running_tasks) >= self.concurrency.current()
+        run_time = time.time() - record.start_time
+        self.concurrency.observe(record.task_name, run_time, record.start_time - record.add_time, saturated)
+        inline_promotion.observe(record.task_name, run_time, func)
 
-    # The task scheduler closes the countdown
-    def _reset_idle_timer(self) -> None:
+    def _backend_info(self) -> Dict:
         """
-        Reset the idle timer.
+        Get the adaptive concurrency limit and its recent changes.
         """
-        with self.idle_timer_lock:
-            if self.idle_timer is not None:
-                self.idle_timer.cancel()
-            self.idle_timer = threading.Timer(self.idle_timeout, self.stop_scheduler, args=(False, True,))
-            self.idle_timer.start()
+        return {"concurrency": self.concurrency.stats()}
 
-    def _cancel_idle_timer(self) -> None:
-        """
-        Cancel the idle timer.
-        """
-        with self.idle_timer_lock:
-            if self.idle_timer is not None:
-                self.idle_timer.cancel()
-                self.idle_timer = None
-
-    def _clear_task_queue(self) -> None:
-        """
-        Clear the task queue.
-        """
-        while not self.task_queue.empty():
-            self.task_queue.get(timeout=1)
-
-    def _join_scheduler_thread(self) -> None:
-        """
-        Wait for the scheduler thread to finish.
-        """
-        if self.scheduler_thread and self.scheduler_thread.is_alive():
-            self.scheduler_thread.join()
-
-    def get_queue_info(self) -> Dict:
+    # Update the task status
+    def _update_task_status(self, task_id: str, status: str, error: Optional[BaseException] = None) -> None:
         """
-        Get detailed information about the task queue.
+        Update task status.
 
-        Returns:
-            Dict: Dictionary containing queue size, number of running tasks, number of failed tasks, task details, and error logs.
+        :param task_id: Task ID.
+        :param status: Task status.
+        :param error: Exception a failed task raised.
         """
-        with self.condition:
-            queue_info = {
-                "queue_size": self.task_queue.qsize(),
-                "running_tasks_count": 0,
-                "failed_tasks_count": 0,
-                "task_details": {},
-                "error_logs": self.error_logs.copy()  # Return recent error logs
-            }
-
-            for task_id, details in self.task_details.items():
-                status = details.get("status")
-                task_name = details.get("task_name", "Unknown")
-                if status == "running":
-                    start_time = details.get("start_time")
-                    current_time = time.time()
-                    if current_time - start_time > config["watch_dog_time"]:
-                        # Change end time of timed out tasks to NaN
-                        queue_info["task_details"][task_id] = {
-                            "task_name": task_name,
-                            "start_time": start_time,
-                            "status": status,
-                            "end_time": "NaN"
-                        }
-                    else:
-                        queue_info["task_details"][task_id] = details
-                    queue_info["running_tasks_count"] += 1
-                elif status == "failed":
-                    queue_info["task_details"][task_id] = details
-                    queue_info["failed_tasks_count"] += 1
-                else:
-                    queue_info["task_details"][task_id] = details
-
-        return queue_info
+        with self.lock:
+            if task_id in self.running_tasks:
+                del self.running_tasks[task_id]
+        # Set end_time to NaN if the task failed because of timeout and timeout_processing was False
+        self.task_history.finish(task_id, status, "NaN" if status == "timeout" else None, error)
 
     def force_stop_task(self, task_id: str) -> None:
         """
@@ -420,104 +368,7 @@ class IoLinerTask:
                 return
 
         task_manager.skip_task(task_id)
-
-        with self.lock:
-            # Clean up task details and results
-            if task_id in self.task_details:
-                del self.task_details[task_id]
-            if task_id in self.task_results:
-                del self.task_results[task_id]
-
-    def cancel_all_queued_tasks_by_name(self, task_name: str) -> None:
-        """
-        Cancel all queued tasks with the same name.
-
-        :param task_name: Task name.
-        """
-        with self.condition:
-            temp_queue = queue.Queue()
-            while not self.task_queue.empty():
-                task = self.task_queue.get()
-                if task[1] == task_name:  # Use function name to match task name
-                    logger.warning(
-                        f"Io linear task | {task_name} | is waiting to be executed in the queue, has been deleted")
-                else:
-                    temp_queue.put(task)
-
-            # Put uncancelled tasks back into the queue
-            while not temp_queue.empty():
-                self.task_queue.put(temp_queue.get())
-
-    def ban_task_name(self, task_name: str) -> None:
-        """
-        Ban a task name from execution, delete tasks directly if detected and print information.
-
-        :param task_name: Task name.
-        """
-        with self.lock:
-            self.banned_task_names.append(task_name)
-            logger.warning(f"Io linear task | {task_name} | is banned from execution")
-
-            # Cancel all queued tasks with the banned task name
-            self.cancel_all_queued_tasks_by_name(task_name)
-
-    def allow_task_name(self, task_name: str) -> None:
-        """
-        Allow a banned task name to be executed again.
-
-        :param task_name: Task name.
-        """
-        with self.lock:
-            if task_name in self.banned_task_names:
-                self.banned_task_names.remove(task_name)
-                logger.info(f"Io linear task | {task_name} | is allowed for execution")
-            else:
-                logger.warning(f"Io linear task | {task_name} | is not banned, no action taken")
-
-    # Obtain the information returned by the corresponding task
-    def get_task_result(self, task_id: str) -> Optional[Any]:
-        """
-        Get the result of a task. If there is a result, return and delete the oldest result; if no result, return None.
-
-        :param task_id: Task ID.
-        :return: Task return result, if the task is not completed or does not exist, return None.
-        """
-        if task_id in self.task_results and self.task_results[task_id]:
-            result = self.task_results[task_id].pop(0)  # Return and delete the oldest result
-            with self.lock:
-                if not self.task_results[task_id]:
-                    del self.task_results[task_id]
-            return result
-        return None
-
-    def _check_and_log_task_details(self) -> None:
-        """
-        Check if the number of task details exceeds the configured limit and remove those with specific statuses.
-        """
-        with self.lock:
-            task_details_copy = self.task_details.copy()
-            if len(task_details_copy) > config["maximum_task_info_storage"]:
-                logger.info(f"More than {config['maximum_task_info_storage']} task details detected. "
-                            f"Cleaning up old task details.")
-
-                # Filter out tasks with status 'failed', 'completed', or 'timeout'
-                new_task_details = {task_id: details for task_id, details in task_details_copy.items()
-                                    if details.get("status") not in ["failed", "completed", "timeout", "cancelled"]}
-
-                # Update the task details with the filtered results
-                self.task_details = new_task_details
-
-    def get_task_status(self, task_id: str) -> Optional[Dict]:
-        """
-        Obtain task status information for a specified task_id.
-
-        :param task_id: Task ID.
-        :return: A dictionary containing information about the status of the task, or None if the task does not exist.
-        """
-        if task_id in self.task_details:
-            return self.task_details[task_id]
-        logger.warning(f"Io linear task | {task_id} | does not exist or has been completed and removed")
-        return None
+        self.task_results.cancel(task_id)
 
 
 io_liner_task = IoLinerTask()
@@ -0,0 +1,588 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import suppress
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Callable, Dict, List, Tuple, Optional, Any
+
+from common import logger
+from config import config
+from .circuit_breaker import TaskRejected
+from .fair_queue import FairQueue, tenant_key
+from .process_worker import WebSocketPlaceholder
+from .resource_usage import process_cpu_time
+from .scheduler_base import SchedulerBase
+from .task_policy import task_policy
+
+# Seconds to wait for a new worker process to connect
+WORKER_START_TIMEOUT = 30
+# Seconds between two checks that a starting worker process has not exited
+WORKER_START_POLL = 0.1
+# Seconds between two deadline checks of the supervisor thread
+SUPERVISOR_INTERVAL = 0.2
+# Started with -c rather than -m, the worker module must be imported from its package so that the placeholders
+# unpickled from this process are the same class
+WORKER_COMMAND = "from task_scheduling.scheduler.process_worker import main; main()"
+# Directory containing the task_scheduling package, the working directory of the workers and first on their
+# PYTHONPATH, so that they import the package and its native libraries whatever the directory the bot started in
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProcessTaskError(Exception):
+    """
+    Raised by the future of a process task that failed, with the error message of the worker.
+    """
+
+
+def is_websocket(value: Any) -> bool:
+    """
+    Check whether a task argument is the WebSocket connection, which cannot be sent to a worker process.
+    """
+    return hasattr(value, "send") and hasattr(value, "recv")
+
+
+class ProcessWorker:
+    """
+    Worker process and its connection.
+    """
+    __slots__ = ['process', 'conn', 'task_id', 'deadline', 'killed']
+
+    def __init__(self, process: subprocess.Popen, conn: Connection) -> None:
+        self.process = process
+        self.conn = conn
+        self.task_id: Optional[str] = None  # Task currently running in the worker
+        self.deadline: Optional[float] = None  # time.monotonic() at which the supervisor kills the worker
+        self.killed: Optional[str] = None  # Status of the task the worker was killed for, "cancelled" or "killed"
+
+    def kill(self, status: str = "cancelled") -> None:
+        """
+        Kill the worker process, stopping the task it is running.
+
+        :param status: Status recorded for the task, "cancelled" for a forced stop, "killed" at its deadline.
+        """
+        if self.killed is None:
+            self.killed = status
+        if self.process.poll() is None:
+            self.process.kill()
+
+    def close(self) -> None:
+        """
+        Ask the worker process to exit, killing it if it does not.
+        """
+        try:
+            self.conn.send(("stop",))
+            self.process.wait(timeout=1)
+        except Exception:
+            self.kill()
+        self.conn.close()
+
+
+class IoProcessTask(SchedulerBase):
+    """
+    Process task manager class, runs the tasks of plugins registered with `execution="process"` in worker processes,
+    so that CPU-bound plugins are not limited by the GIL of the bot process.
+    Plugins registered with `isolated=True` also run here, for tasks that may block where the thread watchdog cannot
+    interrupt them. Each worker runs one task at a time. A supervisor thread kills the workers whose task is past its
+    deadline, returns the slot at once and records the task as "killed", the runner then starts a replacement worker.
+    Backend "process".
+    """
+    __slots__ = [
+        'task_queue', 'running_tasks', 'condition', 'runner_threads', 'authkey', 'preload_modules',
+        'supervisor_thread'
+    ]
+
+    log_name = "Io process task"
+    queue_limit_key = "maximum_queue_line"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.task_queue = FairQueue()  # Task queue, dequeued round-robin across groups and users
+        self.running_tasks: Dict[str, List] = {}  # Task ID -> [worker or None while it starts, task name]
+        self.condition = threading.Condition()  # Condition variable for thread synchronization
+        self.runner_threads: List[threading.Thread] = []  # One thread per worker process
+        self.authkey = os.urandom(32)  # Authentication key of the worker connections
+        self.preload_modules: Dict[str, str] = {}  # Plugin modules to load in new workers: name -> file path
+        self.supervisor_thread: Optional[threading.Thread] = None  # Kills the workers of overdue tasks
+
+    def _check_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> Optional[str]:
+        """
+        Only functions that a worker can import by name can run in a worker process.
+
+        :param task: Task tuple.
+        :return: Reason the task cannot be added, or None.
+        """
+        func = task[3]
+        if getattr(sys.modules.get(func.__module__), "__file__", None) is None or "<locals>" in func.__qualname__:
+            return "the function must be defined at the top level of a plugin module"
+        return None
+
+    def _enqueue(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                 gid: Optional[int], uid: Optional[int]) -> None:
+        """
+        Queue admitted tasks and wake up the runners, starting them if needed. The caller holds the scheduler lock.
+
+        :param tasks: Admitted tasks.
+        :param gid: Group ID the tasks are charged to.
+        :param uid: User ID the tasks are charged to.
+        """
+        for task in tasks:
+            self._register_module(task[3])
+        self.task_queue.put_many(tasks, tenant_key(gid, uid), uid)
+        self.standby.used("process", len(tasks))
+
+        with self.condition:
+            self._start_runners()
+            self.condition.notify_all()
+
+    def _queue_size(self) -> int:
+        return self.task_queue.qsize()
+
+    def _queued_count(self, task_name: str) -> int:
+        return self.task_queue.count_if(lambda task: task[1] == task_name)
+
+    def _remove_queued(self, predicate: Callable[[Tuple], bool]) -> List[Tuple]:
+        with self.condition:
+            return self.task_queue.remove_if(predicate)
+
+    def _remove_oldest(self, task_name: str) -> Optional[Tuple]:
+        return self.task_queue.remove_oldest(lambda task: task[1] == task_name)
+
+    def _workers(self) -> Optional[int]:
+        return config.get("process_task_max", 2)
+
+    def _register_module(self, func: Callable) -> None:
+        """
+        Remember the plugin module of a task function so that workers preload it,
+        running workers load it before their next task.
+
+        :param func: Task function.
+        """
+        module_name = func.__module__
+        if module_name in self.preload_modules:
+            return
+        self.preload_modules[module_name] = sys.modules[module_name].__file__
+        logger.info(f"Io process task | module {module_name} | will be preloaded in worker processes")
+
+    def _start_runners(self) -> None:
+        """
+        Start runner threads until there are `process_task_max` of them. The caller must hold the condition.
+        """
+        self.runner_threads = [thread for thread in self.runner_threads if thread.is_alive()]
+        while len(self.runner_threads) < config.get("process_task_max", 2):
+            thread = threading.Thread(target=self._runner, daemon=True)
+            self.runner_threads.append(thread)
+            thread.start()
+            self.standby.started("process")
+        if self.supervisor_thread is None:
+            self.supervisor_thread = threading.Thread(target=self._supervisor, daemon=True)
+            self.supervisor_thread.start()
+        self.scheduler_started = True
+
+    def _supervisor(self) -> None:
+        """
+        Supervisor thread, kills the workers whose task is past its deadline. It does not depend on the runner of the
+        worker, which may be busy forwarding a message, and releases the slot of the task immediately.
+        Exits with the last runner thread.
+        """
+        while True:
+            time.sleep(SUPERVISOR_INTERVAL)
+            now = time.monotonic()
+            with self.lock:
+                overdue = [details[0] for details in self.running_tasks.values()
+                           if details[0] is not None and details[0].deadline is not None
+                           and details[0].deadline <= now]
+            for worker in overdue:
+                self._kill_overdue(worker)
+
+            with self.condition:
+                if not self.runner_threads:
+                    self.supervisor_thread = None
+                    return
+
+    def _kill_overdue(self, worker: ProcessWorker) -> None:
+        """
+        Kill a worker whose task is past its deadline and record the task as killed.
+
+        :param worker: Worker process.
+        """
+        with self.lock:
+            # The runner clears the deadline under the lock when the task finishes in time
+            task_id = worker.task_id
+            if task_id is None or worker.deadline is None or worker.killed is not None:
+                return
+            worker.kill("killed")
+
+        logger.warning(f"Io process task | {task_id} | exceeded its deadline, worker {worker.process.pid} killed")
+        self._finish_task(task_id, "killed", "NaN")
+        self.task_results.set_exception(task_id, TimeoutError(f"task {task_id} exceeded its deadline and was killed"))
+
+    def _runner(self) -> None:
+        """
+        Runner thread, owns one worker process and runs queued tasks on it one at a time.
+        Exits, closing its worker, after its idle timeout without tasks, unless it is one of the
+        `min_warm_schedulers` runners kept warm.
+        """
+        worker: Optional[ProcessWorker] = None
+        preloaded = 0
+        try:
+            while not self.scheduler_stop_event.is_set():
+                with self.condition:
+                    task = self._next_task()
+                    while task is None and not self.scheduler_stop_event.is_set():
+                        if not self.condition.wait(timeout=self.standby.idle_timeout("process")):
+                            task = self._next_task()
+                            if task is None and self._keep_runner():
+                                continue
+                            if task is None:
+                                # Idle, leave the runner list while holding the condition so that
+                                # a concurrent add_tasks starts a new runner instead of relying on this one
+                                self._leave_runners()
+                                return
+                            break
+                        task = self._next_task()
+
+                    if self.scheduler_stop_event.is_set():
+                        if task is not None:
+                            self._finish_task(task[2], "cancelled")
+                            self.task_results.cancel(task[2])
+                        break
+
+                if worker is None:
+                    try:
+                        worker = self._start_worker()
+                    except Exception as e:
+                        task_id = task[2]
+                        logger.error(f"Io process task | {task_id} | could not start a worker process: {e}")
+                        self._finish_task(task_id, "failed")
+                        self._log_error(task_id, e)
+                        self.task_results.set_exception(
+                            task_id, ProcessTaskError(f"could not start a worker process: {e}"))
+                        continue
+                    preloaded = 0
+
+                # Plugin modules seen since the worker was started or last preloaded
+                modules = list(self.preload_modules.items())
+                self._run_on_worker(worker, task, modules if len(modules) > preloaded else None)
+                preloaded = len(modules)
+                if worker.killed:
+                    worker.conn.close()
+                    worker.process.wait()
+                    worker = None
+                    if not self.scheduler_stop_event.is_set():
+                        # Replace the killed worker now rather than when the next task arrives
+                        try:
+                            worker = self._start_worker()
+                            preloaded = 0
+                        except Exception as e:
+                            logger.error(f"Io process task | could not replace a killed worker process: {e}")
+        finally:
+            if worker is not None:
+                worker.close()
+            with self.condition:
+                self._leave_runners()
+
+    def _keep_runner(self) -> bool:
+        """
+        Check whether an idle runner stays warm: the first `min_warm_schedulers` runners are kept.
+        The caller must hold the condition.
+        """
+        return (self.standby.keep_warm("process")
+                and len(self.runner_threads) <= config.get("min_warm_schedulers", 1))
+
+    def _leave_runners(self) -> None:
+        """
+        Remove the current thread from the runner threads. The caller must hold the condition.
+        """
+        current = threading.current_thread()
+        if current in self.runner_threads:
+            self.runner_threads.remove(current)
+            self.standby.stopped("process")
+        if not self.runner_threads:
+            self.scheduler_started = False
+
+    def _next_task(self) -> Optional[Tuple[bool, str, str, Callable, Tuple, Dict]]:
+        """
+        Take the next queued task whose plugin is below its concurrency limit, and reserve its slot.
+        By default, tasks with the same name run one at a time. The caller must hold the condition.
+
+        :return: Task, or None if no queued task can be started now.
+        """
+        with self.lock:
+            running_counts = Counter(details[1] for details in self.running_tasks.values())
+
+        def eligible(task: Tuple) -> bool:
+            return running_counts[task[1]] < (task_policy.get(task[1]).max_concurrent or 1)
+
+        try:
+            task = self.task_queue.get(eligible=eligible)
+        except queue.Empty:
+            return None
+        with self.lock:
+            self.running_tasks[task[2]] = [None, task[1]]
+        return task
+
+    def _start_worker(self) -> ProcessWorker:
+        """
+        Start a worker process. Each worker connects to a listener of its own, so that workers can start in parallel.
+
+        :return: Worker.
+        :raises RuntimeError: If the worker process exited or did not connect.
+        """
+        pythonpath = os.environ.get("PYTHONPATH")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([PACKAGE_ROOT, pythonpath]) if pythonpath else PACKAGE_ROOT)
+        with Listener(authkey=self.authkey) as listener:
+            address = listener.address
+            process = subprocess.Popen(
+                [sys.executable, "-c", WORKER_COMMAND, str(address)],
+                stdin=subprocess.PIPE, cwd=PACKAGE_ROOT, env=env
+            )
+            process.stdin.write(self.authkey.hex().encode() + b"\n")
+            process.stdin.close()
+
+            connected = threading.Event()
+            watcher = threading.Thread(target=self._watch_start, args=(process, address, connected), daemon=True)
+            watcher.start()
+            try:
+                conn = listener.accept()
+            finally:
+                connected.set()
+
+        try:
+            message = conn.recv() if conn.poll(WORKER_START_TIMEOUT) else None
+        except EOFError:
+            message = None
+        if message != ("ready", process.pid):
+            conn.close()
+            if process.poll() is None:
+                process.kill()
+            raise RuntimeError(f"worker process did not start (exit code {process.wait()})")
+
+        logger.info(f"Io process task | worker {process.pid} | started")
+        return ProcessWorker(process, conn)
+
+    def _watch_start(self, process: subprocess.Popen, address: Any, connected: threading.Event) -> None:
+        """
+        Unblock the `accept()` of a starting worker as soon as its process exits, e.g. because it cannot import
+        the package, or after `WORKER_START_TIMEOUT` seconds, killing it, by connecting in its place.
+
+        :param process: Worker process.
+        :param address: Address of the listener the worker connects to.
+        :param connected: Set once `accept()` returned.
+        """
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while not connected.wait(WORKER_START_POLL):
+            if process.poll() is None and time.monotonic() < deadline:
+                continue
+            if process.poll() is None:
+                process.kill()
+            # The listener is closed if the worker connected meanwhile
+            with suppress(OSError, EOFError):
+                Client(address, authkey=self.authkey).close()
+            return
+
+    def _run_on_worker(self, worker: ProcessWorker, task: Tuple[bool, str, str, Callable, Tuple, Dict],
+                       modules: Optional[List[Tuple[str, str]]] = None) -> None:
+        """
+        Run a task on a worker, forwarding the messages it sends until it finishes.
+        The supervisor kills the worker if the task is past its deadline, `force_stop_task` if it is stopped.
+
+        :param worker: Worker process.
+        :param task: Task tuple.
+        :param modules: Plugin modules to preload in the worker before running the task.
+        """
+        timeout_processing, task_name, task_id, func, args, kwargs = task
+
+        # The WebSocket connection stays in this process, the worker sends its messages back through it
+        websocket = None
+        for value in list(args) + list(kwargs.values()):
+            if is_websocket(value):
+                websocket = value
+                break
+        args = tuple(WebSocketPlaceholder() if is_websocket(arg) else arg for arg in args)
+        kwargs = {key: WebSocketPlaceholder() if is_websocket(value) else value for key, value in kwargs.items()}
+
+        # Risky plugins are killed at their deadline even without timeout processing
+        policy = task_policy.get(task_name)
+        deadline = None
+        if timeout_processing or policy.isolated or policy.kill_timeout is not None:
+            deadline = time.monotonic() + (policy.kill_timeout or config["watch_dog_time"])
+
+        with self.lock:
+            worker.task_id = task_id
+            worker.deadline = deadline
+            self.running_tasks[task_id] = [worker, task_name]
+        record = self.task_history.start(task_id)
+        self.tenant_tracker.mark_running(task_id)
+        # The worker runs one task at a time, its CPU time while the task runs is the task's
+        cpu_start = process_cpu_time(worker.process.pid)
+        logger.info(f"Start running io process task | {task_id} | in worker {worker.process.pid}")
+
+        try:
+            if modules:
+                worker.conn.send(("preload", modules))
+            worker.conn.send(("run", task_id, func.__module__, self.preload_modules[func.__module__],
+                              func.__qualname__, args, kwargs))
+            while True:
+                message = worker.conn.recv()
+                if message[0] == "send":
+                    self._forward_message(websocket, message[2])
+                elif message[0] == "output":
+                    # Output of a streaming task, which pushes back its deadline
+                    self._stream_output(task_id, message[2])
+                    with self.lock:
+                        if worker.deadline is not None and worker.killed is None:
+                            worker.deadline = time.monotonic() + (policy.kill_timeout or config["watch_dog_time"])
+                elif message[0] == "done":
+                    with self.lock:
+                        if worker.killed is not None:
+                            return  # Killed at its deadline while the reply was on its way, already recorded
+                        worker.deadline = None
+                    _, _, succeeded, value = message
+                    cpu_end = process_cpu_time(worker.process.pid)
+                    if record is not None and cpu_start is not None and cpu_end is not None:
+                        record.cpu_time = cpu_end - cpu_start
+                    if succeeded:
+                        self._finish_task(task_id, "completed")
+                        self.task_results.set_result(task_id, value)
+                    else:
+                        logger.error(f"Io process task | {task_id} | execution failed: {value}")
+                        # The worker only sends the exception as text, "<type name>: <message>"
+                        rejected = value.startswith(f"{TaskRejected.__name__}:")
+                        self._finish_task(task_id, "failed", error=TaskRejected(value) if rejected else None)
+                        self._log_error(task_id, value)
+                        self.task_results.set_exception(task_id, ProcessTaskError(value))
+                    return
+        except (EOFError, OSError) as e:
+            if worker.killed == "killed":
+                pass  # Recorded by the supervisor
+            elif worker.killed == "cancelled":
+                logger.warning(f"Io process task | {task_id} | was cancelled, worker killed")
+                self._finish_task(task_id, "cancelled")
+                self.task_results.cancel(task_id)
+            else:
+                worker.kill()
+                logger.error(f"Io process task | {task_id} | worker exited unexpectedly: {e}")
+                self._finish_task(task_id, "failed")
+                self._log_error(task_id, e)
+                self.task_results.set_exception(task_id, ProcessTaskError(f"worker exited unexpectedly: {e}"))
+        except Exception as e:
+            # E.g. the arguments could not be pickled, the worker is still usable
+            logger.error(f"Io process task | {task_id} | execution failed: {e}")
+            self._finish_task(task_id, "failed")
+            self._log_error(task_id, e)
+            self.task_results.set_exception(task_id, e)
+        finally:
+            with self.lock:
+                worker.task_id = None
+                worker.deadline = None
+
+    @staticmethod
+    def _forward_message(websocket: Any, message: str) -> None:
+        """
+        Send a message of a worker through the WebSocket connection.
+
+        :param websocket: WebSocket connection passed to the task.
+        :param message: JSON message.
+        """
+        if websocket is None:
+            logger.warning("Io process task | message dropped, the task has no WebSocket connection")
+            return
+        try:
+            asyncio.run(websocket.send(message))
+        except Exception as e:
+            logger.error(f"Io process task | failed to forward message: {e}")
+
+    def _finish_task(self, task_id: str, status: str, end_time: Optional[str] = None,
+                     error: Optional[BaseException] = None) -> None:
+        """
+        Release the slot of a finished task and wake up the runners.
+
+        :param task_id: Task ID.
+        :param status: Task status.
+        :param end_time: End time, "NaN" for killed tasks.
+        :param error: Exception a failed task raised.
+        """
+        with self.lock:
+            self.running_tasks.pop(task_id, None)
+        self.task_history.finish(task_id, status, end_time, error)
+        self.tenant_tracker.release(task_id)
+        with self.condition:
+            self.condition.notify_all()
+
+    # Stop the scheduler
+    def stop_scheduler(self, force_cleanup: bool, system_operations: bool = False) -> None:
+        """
+        Stop the runner threads and their worker processes.
+
+        :param force_cleanup: If True, kill the workers of running tasks. If False, wait for running tasks to finish.
+        :param system_operations: System execution metrics
+        """
+        with self.scheduler_lock:
+            if not self.task_queue.empty() or len(self.running_tasks) != 0:
+                if system_operations:
+                    logger.warning("Io process task | detected running tasks | stopping operation terminated")
+                    return None
+
+            logger.warning("Exit cleanup")
+            self.scheduler_stop_event.set()
+
+            # Clear the task queue
+            self._clear_task_queue()
+
+            if force_cleanup:
+                logger.warning("Force stopping process workers")
+                with self.lock:
+                    workers = [details[0] for details in self.running_tasks.values() if details[0] is not None]
+                for worker in workers:
+                    worker.kill()
+
+            with self.condition:
+                self.condition.notify_all()
+                runner_threads = list(self.runner_threads)
+                supervisor_thread = self.supervisor_thread
+            for thread in runner_threads:
+                thread.join()
+            if supervisor_thread is not None:
+                supervisor_thread.join()
+
+            self.scheduler_started = False
+            self.scheduler_stop_event.clear()
+            self.error_logs = []
+            self.banned_task_names = []
+
+            logger.info("Process workers have stopped, all resources have been released and parameters reset")
+
+    def _backend_info(self) -> Dict:
+        """
+        Get the number of worker processes.
+        """
+        return {"workers": len(self.runner_threads)}
+
+    def force_stop_task(self, task_id: str) -> None:
+        """
+        Force stop a task by its task ID, killing the worker running it.
+
+        :param task_id: task ID.
+        """
+        removed = self._remove_queued(lambda task: task[2] == task_id)
+        for task in removed:
+            self._discard_queued_task(task)
+            logger.warning(f"Io process task | {task_id} | was removed from the queue")
+        if removed:
+            return
+
+        with self.lock:
+            details = self.running_tasks.get(task_id)
+        if details is None or details[0] is None:
+            logger.warning(f"Io process task | {task_id} | does not exist or is already completed")
+            return
+        details[0].kill()
+
+
+io_process_task = IoProcessTask()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+from typing import Dict, List, Optional
+
+# Upper bound of the first bucket, in seconds
+BUCKET_BASE = 0.001
+# Ratio between the upper bounds of consecutive buckets, about 10% relative error on percentiles
+BUCKET_GROWTH = 1.2
+# Number of buckets, the last one holds every runtime above about 35 minutes
+BUCKET_COUNT = 80
+# Number of samples after which all counts are halved, so that old runtimes fade out
+DECAY_SAMPLES = 1000
+# Samples needed before the percentiles of a task name are used
+MIN_SAMPLES = 5
+
+LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+
+class LatencyHistogram:
+    """
+    Streaming histogram of task runtimes with logarithmic buckets.
+    Constant memory and update time, older samples are progressively forgotten.
+    """
+    __slots__ = ['buckets', 'count']
+
+    def __init__(self) -> None:
+        self.buckets: List[float] = [0.0] * BUCKET_COUNT  # Number of samples in each bucket
+        self.count = 0.0  # Total number of samples, after decay
+
+    def add(self, seconds: float) -> None:
+        """
+        Add a runtime.
+
+        :param seconds: Runtime in seconds.
+        """
+        if seconds <= BUCKET_BASE:
+            index = 0
+        else:
+            index = min(int(math.log(seconds / BUCKET_BASE) / LOG_GROWTH) + 1, BUCKET_COUNT - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        if self.count >= DECAY_SAMPLES:
+            self.buckets = [count / 2 for count in self.buckets]
+            self.count /= 2
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        Get a percentile of the runtimes.
+
+        :param percent: Percentile, between 0 and 100.
+        :return: Upper bound of the bucket holding the percentile in seconds, or None without samples.
+        """
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        cumulative = 0.0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= rank and count:
+                return BUCKET_BASE * BUCKET_GROWTH ** index
+        return BUCKET_BASE * BUCKET_GROWTH ** (BUCKET_COUNT - 1)
+
+
+class LatencyTracker:
+    """
+    Runtime histograms of each task name, and of all tasks of a scheduler together.
+    """
+    __slots__ = ['histograms', 'total', 'lock']
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {}  # Task name -> runtimes of its tasks
+        self.total = LatencyHistogram()  # Runtimes of all tasks
+        self.lock = threading.Lock()  # Lock to protect access to the histograms
+
+    def observe(self, task_name: str, seconds: float) -> None:
+        """
+        Record the runtime of a finished task.
+
+        :param task_name: Task name.
+        :param seconds: Runtime in seconds.
+        """
+        with self.lock:
+            histogram = self.histograms.get(task_name)
+            if histogram is None:
+                histogram = self.histograms[task_name] = LatencyHistogram()
+            histogram.add(seconds)
+            self.total.add(seconds)
+
+    def percentile(self, task_name: Optional[str], percent: float) -> Optional[float]:
+        """
+        Get a runtime percentile of a task name.
+
+        :param task_name: Task name, or None for all tasks.
+        :param percent: Percentile, between 0 and 100.
+        :return: Runtime in seconds, or None if too few tasks finished to know it.
+        """
+        with self.lock:
+            histogram = self.total if task_name is None else self.histograms.get(task_name)
+            if histogram is None or histogram.count < MIN_SAMPLES:
+                return None
+            return histogram.percentile(percent)
+
+    def summary(self, limit: int = 5) -> List[Dict]:
+        """
+        Get the runtime percentiles of the slowest task names.
+
+        :param limit: Maximum number of task names to return.
+        :return: List of dictionaries with the task name, its number of samples and its p50 and p95 in seconds.
+        """
+        with self.lock:
+            items = [
+                {
+                    "task_name": task_name,
+                    "samples": int(histogram.count),
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95)
+                }
+                for task_name, histogram in self.histograms.items() if histogram.count
+            ]
+        return sorted(items, key=lambda item: item["p95"], reverse=True)[:limit]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import threading
+from time import perf_counter
+from typing import Dict, Iterable, Optional
+
+
+class InstrumentedLock:
+    """
+    Non-reentrant lock measuring how long threads wait to acquire it and how long they hold it.
+    Can be used on its own or as the lock of a `threading.Condition`, time spent waiting on the condition
+    releases the lock and is counted neither as wait nor as hold time.
+    The counters are only updated while the lock is held, so they need no lock of their own.
+    """
+    __slots__ = [
+        'lock', 'owner', 'acquired_at', 'acquisitions', 'contended', 'wait_total', 'wait_max', 'hold_total',
+        'hold_max'
+    ]
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()  # Underlying lock
+        self.owner: Optional[int] = None  # Identifier of the thread holding the lock
+        self.acquired_at = 0.0  # Time the current holder acquired the lock
+        self.acquisitions = 0  # Number of acquisitions
+        self.contended = 0  # Acquisitions that had to wait for another thread
+        self.wait_total = 0.0  # Seconds spent waiting to acquire the lock
+        self.wait_max = 0.0  # Longest wait in seconds
+        self.hold_total = 0.0  # Seconds the lock was held
+        self.hold_max = 0.0  # Longest hold in seconds
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        """
+        Acquire the lock, see `threading.Lock.acquire`.
+        """
+        if self.lock.acquire(False):
+            waited = 0.0
+        else:
+            if not blocking:
+                return False
+            start = perf_counter()
+            if not self.lock.acquire(True, timeout):
+                return False
+            waited = perf_counter() - start
+            self.contended += 1
+            self.wait_total += waited
+            if waited > self.wait_max:
+                self.wait_max = waited
+        self.owner = threading.get_ident()
+        self.acquisitions += 1
+        self.acquired_at = perf_counter()
+        return True
+
+    def release(self) -> None:
+        """
+        Release the lock, see `threading.Lock.release`.
+        """
+        held = perf_counter() - self.acquired_at
+        self.hold_total += held
+        if held > self.hold_max:
+            self.hold_max = held
+        self.owner = None
+        self.lock.release()
+
+    def _is_owned(self) -> bool:
+        # Used by `threading.Condition` to check that the waiting or notifying thread holds the lock
+        return self.owner == threading.get_ident()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def stats(self) -> Dict:
+        """
+        Get the counters of the lock, times in milliseconds.
+        """
+        return merge_lock_stats([self])
+
+
+def merge_lock_stats(locks: Iterable[InstrumentedLock]) -> Dict:
+    """
+    Add up the counters of several locks, e.g. the locks of all task names of a backend.
+
+    :param locks: Locks.
+    :return: Dictionary of the acquisitions, contended acquisitions, and total and maximum wait and hold times
+             in milliseconds.
+    """
+    stats = {
+        "acquisitions": 0,
+        "contended": 0,
+        "wait_total_ms": 0.0,
+        "wait_max_ms": 0.0,
+        "hold_total_ms": 0.0,
+        "hold_max_ms": 0.0
+    }
+    for lock in locks:
+        stats["acquisitions"] += lock.acquisitions
+        stats["contended"] += lock.contended
+        stats["wait_total_ms"] += lock.wait_total * 1000
+        stats["wait_max_ms"] = max(stats["wait_max_ms"], lock.wait_max * 1000)
+        stats["hold_total_ms"] += lock.hold_total * 1000
+        stats["hold_max_ms"] = max(stats["hold_max_ms"], lock.hold_max * 1000)
+    return stats
+
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional
+
+from common import logger
+from config import config
+
+# Seconds between two heartbeats of the probe running in each event loop
+PROBE_INTERVAL = 0.25
+
+
+class LoopLagState:
+    """
+    Heartbeat and stall history of the event loop of one task name.
+    """
+    __slots__ = ['beat', 'suspect', 'stalls', 'max_lag', 'last_task', 'offloaded']
+
+    def __init__(self) -> None:
+        self.beat = time.monotonic()  # Time of the last heartbeat of the probe
+        self.suspect: Optional[str] = None  # ID of the task seen running while the loop is stalled
+        self.stalls = 0  # Number of stalls longer than `loop_lag_threshold`
+        self.max_lag = 0.0  # Longest stall in seconds
+        self.last_task: Optional[str] = None  # ID of the task that caused the last stall, if it was seen
+        self.offloaded = False  # Whether tasks of this name now run in threads
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop of each task name runs its callbacks, and finds the tasks blocking it.
+    A probe coroutine in every loop sleeps for `PROBE_INTERVAL` and records how much later than that it woke up.
+    While tasks are running, the scheduler thread of the name checks that the heartbeat of the probe is recent,
+    and if it is not, notes the task the loop is stuck in. A task name whose loop stalls `loop_lag_strikes` times
+    is flagged, and with `loop_lag_offload` its following tasks run in a thread with an event loop of their own,
+    so that its blocking calls no longer delay the other tasks of the loop.
+    """
+    __slots__ = ['states', 'lock']
+
+    def __init__(self) -> None:
+        self.states: Dict[str, LoopLagState] = {}  # Task name -> heartbeat and stall history
+        self.lock = threading.Lock()  # Lock to protect the stall counters
+
+    def _state(self, task_name: str) -> LoopLagState:
+        state = self.states.get(task_name)
+        if state is None:
+            with self.lock:
+                state = self.states.setdefault(task_name, LoopLagState())
+        return state
+
+    async def probe(self, task_name: str) -> None:
+        """
+        Heartbeat coroutine to run in the event loop of a task name until the loop stops.
+
+        :param task_name: Task name of the event loop.
+        """
+        state = self._state(task_name)
+        while True:
+            state.beat = time.monotonic()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lag = time.monotonic() - state.beat - PROBE_INTERVAL
+            if lag > config.get("loop_lag_threshold", 0.5):
+                self._stalled(task_name, state, lag)
+            state.suspect = None
+
+    def sample(self, task_name: str, event_loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Check from outside the event loop whether it is stalled, and if so note the task it is running.
+
+        :param task_name: Task name of the event loop.
+        :param event_loop: Event loop of the task name.
+        """
+        state = self.states.get(task_name)
+        if state is None or time.monotonic() - state.beat < PROBE_INTERVAL + config.get("loop_lag_threshold", 0.5):
+            return
+        current = asyncio.current_task(event_loop)
+        if current is not None:
+            state.suspect = current.get_name()
+
+    def _stalled(self, task_name: str, state: LoopLagState, lag: float) -> None:
+        """
+        Record a stall of the event loop of a task name, flagging the name once it blocked its loop repeatedly.
+
+        :param task_name: Task name of the event loop.
+        :param state: State of the event loop.
+        :param lag: Delay of the probe in seconds.
+        """
+        with self.lock:
+            state.stalls += 1
+            state.max_lag = max(state.max_lag, lag)
+            state.last_task = state.suspect or state.last_task
+            flag = state.stalls == config.get("loop_lag_strikes", 3)
+            if flag and config.get("loop_lag_offload", False):
+                state.offloaded = True
+
+        logger.warning(f"Io asyncio task | {state.suspect or task_name} | blocked the event loop of {task_name} "
+                       f"for {lag:.2f} seconds")
+        if flag:
+            if state.offloaded:
+                logger.warning(f"Io asyncio task | {task_name} | blocked its event loop {state.stalls} times, "
+                               f"its tasks now run in a thread")
+            else:
+                logger.warning(f"Io asyncio task | {task_name} | blocked its event loop {state.stalls} times")
+
+    def offloaded(self, task_name: str) -> bool:
+        """
+        Check whether tasks of a task name must run in a thread instead of its event loop.
+
+        :param task_name: Task name.
+        :return: Whether the task name was flagged and offloading is enabled.
+        """
+        state = self.states.get(task_name)
+        return state is not None and state.offloaded
+
+    def stats(self, limit: int = 5) -> Dict:
+        """
+        Get the number of stalls, and the task names that stalled their event loop the most.
+
+        :param limit: Maximum number of task names to list.
+        :return: Dictionary of the total number of stalls and a list of the task names.
+        """
+        with self.lock:
+            items = sorted(((name, state) for name, state in self.states.items() if state.stalls),
+                           key=lambda item: item[1].stalls, reverse=True)[:limit]
+            names: List[Dict] = [
+                {
+                    "task_name": name,
+                    "stalls": state.stalls,
+                    "max_lag": state.max_lag,
+                    "last_task": state.last_task,
+                    "offloaded": state.offloaded
+                }
+                for name, state in items
+            ]
+            return {
+                "stalls": sum(state.stalls for state in self.states.values()),
+                "names": names
+            }
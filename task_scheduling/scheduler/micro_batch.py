@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .task_policy import task_policy
+
+
+class MicroBatcher:
+    """
+    Accumulates the tasks of plugins registered with a batch handler, and submits them together as soon as
+    `max_batch` tasks are waiting or the oldest one has waited `max_wait_ms` milliseconds.
+    """
+    __slots__ = ['submit', 'pending', 'timers', 'lock', 'batch_count', 'item_count']
+
+    def __init__(self, submit: Callable[[str, List[Tuple]], None]) -> None:
+        """
+        :param submit: Called outside the lock with the task name and the tasks of a full or expired batch.
+        """
+        self.submit = submit
+        self.pending: Dict[str, List[Tuple]] = {}  # Task name -> tasks waiting for their batch
+        self.timers: Dict[str, threading.Timer] = {}  # Task name -> timer flushing the batch at `max_wait_ms`
+        self.lock = threading.Lock()  # Lock to protect access to the pending tasks
+        self.batch_count = 0  # Batches submitted
+        self.item_count = 0  # Tasks submitted in batches
+
+    def add(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> None:
+        """
+        Add a task to the batch of its name.
+
+        :param task: Task tuple.
+        """
+        task_name = task[1]
+        policy = task_policy.get(task_name)
+        with self.lock:
+            items = self.pending.setdefault(task_name, [])
+            items.append(task)
+            if len(items) >= policy.max_batch:
+                batch = self._take(task_name)
+            else:
+                batch = None
+                if task_name not in self.timers:
+                    timer = threading.Timer(policy.max_wait_ms / 1000, self.flush, args=(task_name,))
+                    timer.daemon = True
+                    self.timers[task_name] = timer
+                    timer.start()
+        if batch:
+            self.submit(task_name, batch)
+
+    def flush(self, task_name: str) -> None:
+        """
+        Submit the waiting tasks of a name now.
+
+        :param task_name: Task name.
+        """
+        with self.lock:
+            batch = self._take(task_name)
+        if batch:
+            self.submit(task_name, batch)
+
+    def discard(self, task_name: Optional[str] = None) -> List[Tuple]:
+        """
+        Remove the waiting tasks of a name, or of all names, without submitting them.
+
+        :param task_name: Task name, None for all names.
+        :return: Removed tasks.
+        """
+        with self.lock:
+            task_names = list(self.pending) if task_name is None else [task_name]
+            removed = []
+            for name in task_names:
+                timer = self.timers.pop(name, None)
+                if timer is not None:
+                    timer.cancel()
+                removed.extend(self.pending.pop(name, []))
+            return removed
+
+    def _take(self, task_name: str) -> List[Tuple]:
+        """
+        Remove the waiting tasks of a name and cancel their timer. The caller must hold the lock.
+
+        :param task_name: Task name.
+        :return: Tasks of the batch.
+        """
+        timer = self.timers.pop(task_name, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(task_name, [])
+        if batch:
+            self.batch_count += 1
+            self.item_count += len(batch)
+        return batch
+
+    def stats(self) -> Dict:
+        """
+        Get the number of batches submitted, and of tasks submitted in them or still waiting.
+        """
+        with self.lock:
+            return {
+                "batches": self.batch_count,
+                "batched_tasks": self.item_count,
+                "waiting_tasks": sum(len(items) for items in self.pending.values())
+            }
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Worker process of the process task scheduler, started by `IoProcessTask` with:
+
+    python -c "from task_scheduling.scheduler.process_worker import main; main()" <address>
+
+The authentication key is read from the first line of stdin. The worker runs one task at a time, so that
+killing it stops exactly one task.
+"""
+import asyncio
+import importlib.util
+import inspect
+import os
+import pickle
+import sys
+import threading
+import types
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict, List, Tuple
+
+
+class WebSocketPlaceholder:
+    """
+    Stands for the WebSocket connection in the arguments of a task sent to a worker,
+    since the connection cannot be pickled.
+    """
+    __slots__ = []
+
+
+class WebSocketProxy:
+    """
+    Replaces the WebSocket connection in the worker. Messages are sent back to the main process,
+    which sends them through the real connection.
+    """
+    __slots__ = ['conn', 'conn_lock', 'task_id', '__weakref__']
+
+    def __init__(self, conn: Connection, conn_lock: threading.Lock, task_id: str) -> None:
+        self.conn = conn
+        self.conn_lock = conn_lock
+        self.task_id = task_id
+
+    async def send(self, message: str) -> None:
+        with self.conn_lock:
+            self.conn.send(("send", self.task_id, message))
+
+
+def install_message_action() -> None:
+    """
+    Plugins import the sending functions from `message_action`, whose package also imports the message processor
+    and with it every plugin manager. Only expose the sending functions in the worker.
+    """
+    spec = importlib.util.find_spec("message_action")
+    package = types.ModuleType("message_action")
+    package.__path__ = list(spec.submodule_search_locations)
+    sys.modules["message_action"] = package
+
+    from message_action import message_send
+    package.__dict__.update({name: value for name, value in vars(message_send).items() if not name.startswith("_")})
+
+
+# Plugin modules loaded in this worker: module name -> modification time of the file when it was loaded
+loaded_modules: Dict[str, float] = {}
+
+
+def load_module(module_name: str, module_path: str) -> types.ModuleType:
+    """
+    Load a plugin module, reloading it if its file changed since it was loaded (hot reload in the main process).
+
+    :param module_name: Module name.
+    :param module_path: Module file path.
+    :return: Module.
+    """
+    from plugin_loading.load_base import SimpleModuleLoader
+
+    modified = os.path.getmtime(module_path)
+    if loaded_modules.get(module_name) != modified:
+        sys.modules.pop(module_name, None)
+        SimpleModuleLoader(module_name, module_path).load_module()
+        loaded_modules[module_name] = modified
+    return sys.modules[module_name]
+
+
+def preload(modules: List[Tuple[str, str]]) -> None:
+    """
+    Load the modules of the plugins running in worker processes.
+
+    :param modules: List of (module name, module file path).
+    """
+    for module_name, module_path in modules:
+        try:
+            load_module(module_name, module_path)
+        except Exception as error:
+            print(f"Process worker | {os.getpid()} | failed to preload | {module_name} |: {error}", file=sys.stderr)
+
+
+def send_output(conn: Connection, conn_lock: threading.Lock, task_id: str, output: Any) -> Any:
+    """
+    Send an output yielded by a streaming task to the main process, which forwards it and restarts the deadline.
+
+    :param conn: Connection to the main process.
+    :param conn_lock: Lock protecting the connection.
+    :param task_id: Task ID.
+    :param output: Yielded value, sent as its repr if it cannot be pickled.
+    :return: The output as sent.
+    """
+    try:
+        pickle.dumps(output)
+    except Exception:
+        output = repr(output)
+    with conn_lock:
+        conn.send(("output", task_id, output))
+    return output
+
+
+async def stream_async(conn: Connection, conn_lock: threading.Lock, task_id: str, generator: Any) -> List[Any]:
+    """
+    Run an asynchronous generator, sending each output to the main process.
+
+    :param conn: Connection to the main process.
+    :param conn_lock: Lock protecting the connection.
+    :param task_id: Task ID.
+    :param generator: Asynchronous generator returned by the task function.
+    :return: List of the outputs.
+    """
+    return [send_output(conn, conn_lock, task_id, output) async for output in generator]
+
+
+def run_task(conn: Connection, conn_lock: threading.Lock, task_id: str, module_name: str, module_path: str,
+             qualname: str, args: Tuple, kwargs: Dict) -> None:
+    """
+    Run a task and send its result, or its error message, back to the main process.
+
+    :param conn: Connection to the main process.
+    :param conn_lock: Lock protecting the connection, plugins may send messages from their own threads.
+    :param task_id: Task ID.
+    :param module_name: Name of the module defining the task function.
+    :param module_path: File path of the module.
+    :param qualname: Qualified name of the task function in its module.
+    :param args: Positional arguments for the task function.
+    :param kwargs: Keyword arguments for the task function.
+    """
+    try:
+        func: Any = load_module(module_name, module_path)
+        for attribute in qualname.split("."):
+            func = getattr(func, attribute)
+
+        websocket = WebSocketProxy(conn, conn_lock, task_id)
+        args = tuple(websocket if isinstance(arg, WebSocketPlaceholder) else arg for arg in args)
+        kwargs = {key: websocket if isinstance(value, WebSocketPlaceholder) else value
+                  for key, value in kwargs.items()}
+
+        result = func(*args, **kwargs)
+        if inspect.iscoroutine(result):
+            result = asyncio.run(result)
+        elif inspect.isgenerator(result):
+            result = [send_output(conn, conn_lock, task_id, output) for output in result]
+        elif inspect.isasyncgen(result):
+            result = asyncio.run(stream_async(conn, conn_lock, task_id, result))
+        try:
+            pickle.dumps(result)
+        except Exception:
+            result = repr(result)
+        reply = ("done", task_id, True, result)
+    except Exception as error:
+        reply = ("done", task_id, False, f"{type(error).__name__}: {error}")
+
+    with conn_lock:
+        conn.send(reply)
+
+
+def main() -> None:
+    address = sys.argv[1]
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    conn = Client(address, authkey=authkey)
+    conn_lock = threading.Lock()
+    install_message_action()
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message[0] == "preload":
+            preload(message[1])
+        elif message[0] == "run":
+            run_task(conn, conn_lock, *message[1:])
+        elif message[0] == "stop":
+            break
+    conn.close()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+import itertools
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Coroutine, Dict, Generator, Iterator, List, Optional
+
+import psutil
+
+from config import config
+
+# Top-N tables of `ResourceUsage.top` and the metric each is sorted by
+TOP_TABLES = {
+    "cpu": "cpu_total",
+    "wall": "wall_total",
+    "wait": "wait_total",
+    "memory": "allocated_mean"
+}
+
+
+class UsageStats:
+    """
+    Resource usage of the finished tasks of one task name.
+    """
+    __slots__ = ['tasks', 'cpu_tasks', 'cpu_total', 'wall_total', 'wait_total', 'sampled', 'allocated_total',
+                 'allocated_max']
+
+    def __init__(self) -> None:
+        self.tasks = 0  # Finished tasks that had started
+        self.cpu_tasks = 0  # Tasks whose CPU time was measured
+        self.cpu_total = 0.0  # Seconds of CPU time
+        self.wall_total = 0.0  # Seconds from start to end
+        self.wait_total = 0.0  # Seconds from admission to start
+        self.sampled = 0  # Tasks whose allocations were sampled
+        self.allocated_total = 0  # Bytes still allocated at the end of the sampled tasks
+        self.allocated_max = 0
+
+    def to_dict(self, task_name: str) -> Dict:
+        return {
+            "task_name": task_name,
+            "tasks": self.tasks,
+            "cpu_total": self.cpu_total,
+            "cpu_mean": self.cpu_total / self.cpu_tasks if self.cpu_tasks else 0.0,
+            "wall_total": self.wall_total,
+            "wall_mean": self.wall_total / self.tasks,
+            "wait_total": self.wait_total,
+            "wait_mean": self.wait_total / self.tasks,
+            "sampled": self.sampled,
+            "allocated_mean": self.allocated_total / self.sampled if self.sampled else 0,
+            "allocated_max": self.allocated_max
+        }
+
+
+class ResourceUsage:
+    """
+    CPU time, wall time, queue wait and sampled allocations of the finished tasks of a scheduler, by task name.
+    Kept when the task records are cleared, like the runtime histograms.
+    """
+    __slots__ = ['stats', 'lock']
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, UsageStats] = {}  # Task name -> usage of its finished tasks
+        self.lock = threading.Lock()  # Lock to protect access to the statistics
+
+    def observe(self, task_name: str, wall: float, wait: float, cpu: Optional[float],
+                allocated: Optional[int]) -> None:
+        """
+        Record the resource usage of a finished task.
+
+        :param task_name: Task name.
+        :param wall: Seconds from start to end.
+        :param wait: Seconds from admission to start.
+        :param cpu: Seconds of CPU time, None if it was not measured.
+        :param allocated: Bytes allocated and not freed while it ran, None if it was not sampled.
+        """
+        with self.lock:
+            stats = self.stats.get(task_name)
+            if stats is None:
+                stats = self.stats[task_name] = UsageStats()
+            stats.tasks += 1
+            stats.wall_total += wall
+            stats.wait_total += wait
+            if cpu is not None:
+                stats.cpu_tasks += 1
+                stats.cpu_total += cpu
+            if allocated is not None:
+                stats.sampled += 1
+                stats.allocated_total += allocated
+                stats.allocated_max = max(stats.allocated_max, allocated)
+
+    def top(self, limit: int = 5) -> Dict[str, List[Dict]]:
+        """
+        Get the task names using the most CPU time, wall time, queue wait and memory.
+
+        :param limit: Maximum number of task names in each table.
+        :return: Dictionary of the tables "cpu", "wall", "wait" and "memory", lists of the usage of a task name.
+        """
+        with self.lock:
+            items = [stats.to_dict(task_name) for task_name, stats in self.stats.items()]
+        tables = {}
+        for table, key in TOP_TABLES.items():
+            ranked = sorted((item for item in items if item[key]), key=lambda item: item[key], reverse=True)
+            tables[table] = ranked[:limit]
+        return tables
+
+
+class AllocationSampler:
+    """
+    Decides which tasks have their allocations measured with tracemalloc: one every `task_alloc_sample_every`
+    tasks. Tracing is started with the first sampled task and stopped once sampling is disabled again,
+    while it is on every allocation of the process is slower.
+    """
+    __slots__ = ['counter', 'started', 'lock']
+
+    def __init__(self) -> None:
+        self.counter = itertools.count()
+        self.started = False  # Whether tracing was started here
+        self.lock = threading.Lock()  # Lock to protect starting and stopping tracing
+
+    def sample(self) -> bool:
+        """
+        :return: Whether to measure the allocations of the task about to start.
+        """
+        every = config.get("task_alloc_sample_every", 0)
+        if not every:
+            if self.started:
+                with self.lock:
+                    if self.started:
+                        tracemalloc.stop()
+                        self.started = False
+            return False
+        if next(self.counter) % every:
+            return False
+        if not tracemalloc.is_tracing():
+            with self.lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self.started = True
+        return True
+
+
+def traced_memory() -> int:
+    """
+    :return: Bytes currently allocated according to tracemalloc, 0 if it is not tracing.
+    """
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+@contextmanager
+def measure_thread(record: Optional[Any]) -> Iterator[None]:
+    """
+    Charge the CPU time of the current thread while the block runs to a task, and its allocations if it is sampled.
+    Allocations are those of the whole process while the task ran, other threads included.
+
+    :param record: Task record, see `TaskRecord`. Nothing is measured if it is None.
+    """
+    if record is None:
+        yield
+        return
+    sampled = allocation_sampler.sample()
+    memory = traced_memory() if sampled else 0
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        record.cpu_time = (record.cpu_time or 0.0) + time.thread_time() - cpu
+        if sampled:
+            record.allocated = (record.allocated or 0) + traced_memory() - memory
+
+
+class _MeasuredCoroutine:
+    """
+    Runs a coroutine one step at a time, charging the CPU time of each step to a task. The other tasks of the
+    event loop run between the steps and are not charged.
+    """
+    __slots__ = ['coroutine', 'record', 'sampled']
+
+    def __init__(self, coroutine: Coroutine, record: Any) -> None:
+        self.coroutine = coroutine
+        self.record = record
+        self.sampled = allocation_sampler.sample()
+
+    def __await__(self) -> Generator[Any, Any, Any]:
+        value, error = None, None
+        while True:
+            memory = traced_memory() if self.sampled else 0
+            cpu = time.thread_time()
+            try:
+                if error is not None:
+                    yielded = self.coroutine.throw(error)
+                else:
+                    yielded = self.coroutine.send(value)
+            except StopIteration as result:
+                self._charge(cpu, memory)
+                return result.value
+            except BaseException:
+                self._charge(cpu, memory)
+                raise
+            self._charge(cpu, memory)
+
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                self.coroutine.close()
+                raise
+            except BaseException as e:
+                # E.g. the cancellation of the task, passed on to the coroutine
+                value, error = None, e
+
+    def _charge(self, cpu: float, memory: int) -> None:
+        self.record.cpu_time = (self.record.cpu_time or 0.0) + time.thread_time() - cpu
+        if self.sampled:
+            self.record.allocated = (self.record.allocated or 0) + traced_memory() - memory
+
+
+async def measure_coroutine(coroutine: Coroutine, record: Optional[Any]) -> Any:
+    """
+    Run a coroutine, charging the CPU time it uses to a task, and its allocations if it is sampled.
+
+    :param coroutine: Coroutine of the task.
+    :param record: Task record, see `TaskRecord`. Nothing is measured if it is None.
+    :return: Result of the coroutine.
+    """
+    if record is None:
+        return await coroutine
+    return await _MeasuredCoroutine(coroutine, record)
+
+
+def process_cpu_time(pid: int) -> Optional[float]:
+    """
+    Get the CPU time used so far by a process, e.g. a worker of the process backend.
+
+    :param pid: Process ID.
+    :return: User and system CPU time in seconds, None if the process is gone.
+    """
+    try:
+        times = psutil.Process(pid).cpu_times()
+    except psutil.Error:
+        return None
+    return times.user + times.system
+
+
+allocation_sampler = AllocationSampler()
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common import logger
+from config import config
+
+
+class TaskFuture(Future):
+    """
+    Future returned when a task is added. It can be waited on from any thread with `result(timeout)`,
+    or awaited from any event loop.
+    The outputs of tasks whose function is a generator are passed to the output callbacks as they are yielded.
+    """
+
+    def __init__(self, task_id: str) -> None:
+        super().__init__()
+        self.task_id = task_id  # Task ID, used by get_task_result, get_task_status and force_stop_task
+        self.outputs: List[Any] = []  # Outputs yielded so far by a streaming task
+        self.output_callbacks: List[Callable[[Any], None]] = []  # Called with each output
+        self.output_lock = threading.Lock()  # Keeps the outputs in order for every callback
+
+    def add_output_callback(self, callback: Callable[[Any], None]) -> None:
+        """
+        Call a function with each output of a streaming task, starting with those already yielded.
+        The callbacks run in the thread running the task, in the order of the outputs.
+
+        :param callback: Function called with one output.
+        """
+        with self.output_lock:
+            self.output_callbacks.append(callback)
+            for output in self.outputs:
+                self._call(callback, output)
+
+    def set_output(self, output: Any) -> None:
+        """
+        Pass an output yielded by the task to the output callbacks.
+
+        :param output: Yielded value.
+        """
+        with self.output_lock:
+            self.outputs.append(output)
+            for callback in self.output_callbacks:
+                self._call(callback, output)
+
+    def _call(self, callback: Callable[[Any], None], output: Any) -> None:
+        try:
+            callback(output)
+        except Exception as e:
+            logger.error(f"Task | {self.task_id} | output callback failed: {e}")
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+    def __repr__(self) -> str:
+        return f"<TaskFuture {self.task_id} {self._state.lower()}>"
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Roughly estimate the memory used by a task result: the object itself plus its direct items.
+
+    :param value: Task result.
+    :return: Estimated size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(key) + sys.getsizeof(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class ResultStore:
+    """
+    Bounded store of task results.
+    Results expire after `task_result_ttl` seconds, and the least recently used ones are evicted once
+    there are more than `maximum_task_results` of them or they use more than `maximum_task_result_memory_mb`.
+    Also keeps the futures of pending tasks until they are resolved.
+    """
+    __slots__ = ['results', 'futures', 'memory_usage', 'evicted_count', 'lock']
+
+    def __init__(self) -> None:
+        self.results: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()  # ID -> (result, expiry, size)
+        self.futures: Dict[str, TaskFuture] = {}  # Futures of tasks that have not finished yet
+        self.memory_usage = 0  # Estimated memory used by the stored results, in bytes
+        self.evicted_count = 0  # Number of results dropped before being read
+        self.lock = threading.Lock()  # Lock to protect access to the results and futures
+
+    def create_future(self, task_id: str) -> TaskFuture:
+        """
+        Create the future of a newly added task.
+
+        :param task_id: Task ID.
+        :return: Future resolved when the task finishes.
+        """
+        future = TaskFuture(task_id)
+        with self.lock:
+            self.futures[task_id] = future
+        return future
+
+    def set_result(self, task_id: str, result: Any) -> None:
+        """
+        Store the result of a finished task and resolve its future.
+        None results are not stored, since `pop` returns None for missing results anyway.
+
+        :param task_id: Task ID.
+        :param result: Task return value.
+        """
+        with self.lock:
+            future = self.futures.pop(task_id, None)
+            if result is not None:
+                self._store(task_id, result)
+        if future is not None:
+            try:
+                future.set_result(result)
+            except InvalidStateError:
+                pass  # Already resolved, e.g. cancelled by the caller
+
+    def set_output(self, task_id: str, output: Any) -> None:
+        """
+        Pass an output yielded by a streaming task to the output callbacks of its future.
+
+        :param task_id: Task ID.
+        :param output: Yielded value.
+        """
+        with self.lock:
+            future = self.futures.get(task_id)
+        if future is not None:
+            future.set_output(output)
+
+    def set_exception(self, task_id: str, exception: BaseException) -> None:
+        """
+        Resolve the future of a failed task with its exception.
+
+        :param task_id: Task ID.
+        :param exception: Exception raised by the task.
+        """
+        with self.lock:
+            future = self.futures.pop(task_id, None)
+        if future is not None:
+            try:
+                future.set_exception(exception)
+            except InvalidStateError:
+                pass
+
+    def cancel(self, task_id: str) -> None:
+        """
+        Cancel the future of a task that was removed before finishing and drop its stored result.
+
+        :param task_id: Task ID.
+        """
+        with self.lock:
+            future = self.futures.pop(task_id, None)
+            self._discard(task_id)
+        if future is not None:
+            future.cancel()
+
+    def cancel_all(self) -> None:
+        """
+        Cancel the futures of all pending tasks.
+        """
+        with self.lock:
+            futures = list(self.futures.values())
+            self.futures.clear()
+        for future in futures:
+            future.cancel()
+
+    def pop(self, task_id: str) -> Optional[Any]:
+        """
+        Return and delete the result of a task.
+
+        :param task_id: Task ID.
+        :return: Task result, or None if there is none or it has expired.
+        """
+        with self.lock:
+            entry = self.results.get(task_id)
+            if entry is None:
+                return None
+            self._discard(task_id)
+            if entry[1] < time.monotonic():
+                return None
+            return entry[0]
+
+    def peek(self, task_id: str) -> Optional[Any]:
+        """
+        Return the result of a task without deleting it, marking it as recently used.
+
+        :param task_id: Task ID.
+        :return: Task result, or None if there is none or it has expired.
+        """
+        with self.lock:
+            entry = self.results.get(task_id)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            self.results.move_to_end(task_id)
+            return entry[0]
+
+    def _store(self, task_id: str, result: Any) -> None:
+        """
+        Store a result and evict expired and least recently used results. The caller must hold the lock.
+
+        :param task_id: Task ID.
+        :param result: Task result.
+        """
+        self._discard(task_id)
+        size = estimate_size(result)
+        self.results[task_id] = (result, time.monotonic() + config.get("task_result_ttl", 300), size)
+        self.memory_usage += size
+
+        max_results = config.get("maximum_task_results", 200)
+        max_memory = config.get("maximum_task_result_memory_mb", 16) * 1024 * 1024
+        now = time.monotonic()
+        while self.results:
+            oldest_id, (_, expiry, _) = next(iter(self.results.items()))
+            if expiry >= now and len(self.results) <= max_results and self.memory_usage <= max_memory:
+                break
+            self._discard(oldest_id)
+            self.evicted_count += 1
+
+    def _discard(self, task_id: str) -> None:
+        """
+        Delete a stored result. The caller must hold the lock.
+
+        :param task_id: Task ID.
+        """
+        entry = self.results.pop(task_id, None)
+        if entry is not None:
+            self.memory_usage -= entry[2]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of stored results, their estimated memory use and the number of pending futures.
+        """
+        with self.lock:
+            return {
+                "stored_results": len(self.results),
+                "memory_usage": self.memory_usage,
+                "pending_futures": len(self.futures),
+                "evicted_results": self.evicted_count
+            }
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, Optional
+
+from common import logger
+from .result_store import TaskFuture
+from .task_policy import TaskPolicy, task_policy
+
+
+def retry_delay(policy: TaskPolicy, attempt: int) -> float:
+    """
+    Get the delay before a retry: exponential backoff with full jitter, so that the retries of tasks that failed
+    together do not all hit the failing service again at the same time.
+
+    :param policy: Scheduling policy of the task name.
+    :param attempt: Number of the retry, starting at 0.
+    :return: Delay in seconds.
+    """
+    return random.uniform(0, min(policy.retry_max_backoff, policy.retry_backoff * 2 ** attempt))
+
+
+class RetryingTask:
+    """
+    Follows the attempts of a task whose plugin allows retries, behind a single future.
+    An attempt failing with one of the `retry_on` errors of the policy is added again after a backoff, while waiting
+    the task holds no queue or execution slot. Retries go through admission again, so an open circuit breaker or a
+    full queue ends them, the future then fails with the error of the last attempt.
+    """
+    __slots__ = ['task_name', 'policy', 'submit', 'future', 'attempt']
+
+    def __init__(self, task_name: str, policy: TaskPolicy, submit: Callable[[], Optional[TaskFuture]],
+                 first: TaskFuture) -> None:
+        """
+        :param task_name: Task name.
+        :param policy: Scheduling policy of the task name.
+        :param submit: Function adding the task again, returns the future of the new attempt or None.
+        :param first: Future of the first attempt.
+        """
+        self.task_name = task_name
+        self.policy = policy
+        self.submit = submit
+        self.future = TaskFuture(first.task_id)  # Future of the task, resolved by its last attempt
+        self.attempt = 0  # Number of retries so far
+        self._follow(first)
+
+    def _follow(self, attempt: TaskFuture) -> None:
+        attempt.add_output_callback(self.future.set_output)
+        attempt.add_done_callback(self._attempt_done)
+
+    def _attempt_done(self, attempt: Future) -> None:
+        """
+        Callback function after an attempt is completed.
+
+        :param attempt: Future of the attempt.
+        """
+        if attempt.cancelled():
+            self.future.cancel()
+            return
+
+        error = attempt.exception()
+        if error is None:
+            self._resolve(attempt.result(), None)
+            return
+
+        if self.attempt < self.policy.retries and isinstance(error, self.policy.retry_on) and not self.future.done():
+            delay = retry_delay(self.policy, self.attempt)
+            self.attempt += 1
+            logger.warning(f"Task | {self.future.task_id} | failed with {type(error).__name__}: {error}, "
+                           f"retry {self.attempt}/{self.policy.retries} in {delay:.2f}s")
+            timer = threading.Timer(delay, self._retry, (error,))
+            timer.daemon = True
+            timer.start()
+            return
+        self._resolve(None, error)
+
+    def _retry(self, error: BaseException) -> None:
+        """
+        Add the task again once its backoff is over.
+
+        :param error: Error of the previous attempt, the task fails with it if it cannot be added.
+        """
+        if self.future.done():
+            return  # Cancelled by the caller while waiting
+        attempt = self.submit()
+        if attempt is None:
+            logger.warning(f"Task | {self.future.task_id} | retry {self.attempt} of | {self.task_name} | "
+                           f"was not added, giving up")
+            self._resolve(None, error)
+            return
+        self._follow(attempt)
+
+    def _resolve(self, result: object, error: Optional[BaseException]) -> None:
+        try:
+            if error is None:
+                self.future.set_result(result)
+            else:
+                self.future.set_exception(error)
+        except InvalidStateError:
+            pass  # Already cancelled by the caller
+
+
+def with_retries(task_name: str, first: Optional[TaskFuture],
+                 submit: Callable[[], Optional[TaskFuture]]) -> Optional[TaskFuture]:
+    """
+    Retry a task on transient errors if its plugin allows it.
+
+    :param task_name: Task name.
+    :param first: Future of the first attempt, None if it was not added.
+    :param submit: Function adding the task again, returns the future of the new attempt or None.
+    :return: Future following the attempts, or `first` itself if the plugin does not allow retries.
+    """
+    policy = task_policy.get(task_name)
+    if first is None or not policy.retries:
+        return first
+    return RetryingTask(task_name, policy, submit, first).future
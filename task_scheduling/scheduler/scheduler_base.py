@@ -0,0 +1,788 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future
+from functools import partial
+from typing import Callable, Dict, Hashable, Iterator, List, Tuple, Optional, Any
+
+from common import logger
+from config import config
+from .circuit_breaker import circuit_breakers
+from .fair_queue import TenantTracker, tenant_key
+from .fair_share import fair_share
+from .lock_metrics import InstrumentedLock
+from .micro_batch import MicroBatcher
+from .result_store import ResultStore, TaskFuture
+from .task_history import TaskHistory, TaskRecord
+from .task_policy import TaskPolicy, task_policy
+from .warm_standby import WarmStandby
+
+
+class SchedulerBase:
+    """
+    Core shared by the task schedulers: admission (circuit breakers, banned names, queue limits, overflow policies,
+    group and user quotas, fair share throttling), coalescing of identical tasks, micro-batching, task status history, result storage, error logs and queue information.
+    Also the watchdog sweep of the running tasks and the idle timers of the schedulers, each identified by its
+    scheduler key, e.g. the task name of an event loop.
+    Each subclass is an execution backend and only decides how admitted tasks are queued, run and stopped.
+    """
+    __slots__ = [
+        'task_history', 'task_results', 'tenant_tracker', 'error_logs', 'banned_task_names', 'lock',
+        'scheduler_lock', 'scheduler_started', 'scheduler_stop_event', 'in_flight', 'batcher', 'deadline_stats',
+        'standby', 'scheduler_threads', 'idle_timers', 'idle_timer_lock', 'status_check_timer'
+    ]
+
+    # Prefix of the log lines of the backend
+    log_name = "Task"
+    # Configuration key of the limit on all queued tasks of the backend, None for no limit
+    queue_limit_key: Optional[str] = None
+    # Configuration key of the default limit on the queued tasks of one name, None for no limit
+    name_queue_limit_key: Optional[str] = None
+
+    def __init__(self) -> None:
+        self.task_history = TaskHistory(backend=self.log_name)  # Status of queued, running and recently finished tasks
+        self.task_results = ResultStore()  # Task return results and futures of pending tasks
+        self.tenant_tracker = TenantTracker()  # Queued and running tasks of each group and user
+        self.error_logs: List[Dict] = []  # Logs, keep up to 10
+        self.banned_task_names: List[str] = []  # List of banned task names
+        self.lock = InstrumentedLock()  # Lock to protect access to shared resources, with contention counters
+        self.scheduler_lock = threading.RLock()  # Thread unlock
+        self.scheduler_started = False  # Whether the backend is running
+        self.scheduler_stop_event = threading.Event()  # Backend stop event
+        self.in_flight: Dict[Tuple[str, Hashable], TaskFuture] = {}  # Single-flight key -> future of the task in flight
+        self.batcher = MicroBatcher(self._submit_batch)  # Tasks of plugins with a batch handler waiting for their batch
+        self.deadline_stats = Counter()  # Tasks rejected or degraded because they would miss their deadline
+        self.standby = WarmStandby()  # Idle timeouts and startup/teardown counts of the schedulers of the backend
+        self.scheduler_threads: Dict[Hashable, threading.Thread] = {}  # Scheduler key -> scheduler thread
+        self.idle_timers: Dict[Hashable, threading.Timer] = {}  # Scheduler key -> timer stopping it when idle
+        self.idle_timer_lock = threading.Lock()  # Idle timer lock
+        self.status_check_timer: Optional[threading.Timer] = None  # Timer of the next check of the running tasks
+
+    def accepts(self, func: Callable) -> bool:
+        """
+        Check whether the backend can run a task function.
+
+        :param func: Task function.
+        :return: Whether tasks of this function can be added to the backend.
+        """
+        return True
+
+    # Add the task to the scheduler
+    def add_task(self, timeout_processing: bool, task_name: str, task_id: str, func: Callable, *args,
+                 gid: Optional[int] = None, uid: Optional[int] = None, deadline: Optional[float] = None,
+                 **kwargs) -> Optional[TaskFuture]:
+        """
+        Add a task to the task queue.
+
+        :param timeout_processing: Whether to enable timeout processing.
+        :param task_name: Task name (can be repeated).
+        :param task_id: Task ID (must be unique).
+        :param func: Task function.
+        :param args: Positional arguments for the task function.
+        :param gid: Group ID the task is charged to, used for per-group quotas and fair dequeuing.
+        :param uid: User ID the task is charged to, used for per-user quotas and fair dequeuing.
+        :param deadline: Seconds within which the task must finish to be useful, None for no deadline.
+        :param kwargs: Keyword arguments for the task function.
+        :return: Future of the task, or None if it was not added.
+        """
+        return self.add_tasks([(timeout_processing, task_name, task_id, func, args, kwargs)],
+                              gid=gid, uid=uid, deadline=deadline)[0]
+
+    def add_tasks(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                  gid: Optional[int] = None, uid: Optional[int] = None,
+                  deadline: Optional[float] = None) -> List[Optional[TaskFuture]]:
+        """
+        Add a batch of tasks, taking the scheduler lock once and waking the backend once.
+
+        :param tasks: Tasks as tuples of (timeout_processing, task_name, task_id, func, args, kwargs).
+        :param gid: Group ID the tasks are charged to, used for per-group quotas and fair dequeuing.
+        :param uid: User ID the tasks are charged to, used for per-user quotas and fair dequeuing.
+        :param deadline: Seconds within which the tasks must finish to be useful, None for no deadline.
+        :return: Future of each task, or None for the tasks that were not added, in the same order as `tasks`.
+        """
+        results: List[Optional[TaskFuture]] = [None] * len(tasks)
+        try:
+            with self.scheduler_lock:
+                admitted = []
+                admitted_counts = Counter()  # Admitted tasks of each name
+                batched = []  # Tasks waiting for a batch of their plugin
+                for index, task in enumerate(tasks):
+                    policy = task_policy.get(task[1])
+                    rejection = circuit_breakers.allow(task[1]) if policy.circuit_breaker else None
+                    if rejection is not None:
+                        logger.warning(f"{self.log_name} | {task[2]} | not added, {rejection}")
+                        continue
+
+                    # Tasks of a plugin with a batch handler wait for their batch instead of being queued
+                    batch_handler = policy.batch_handler
+                    batchable = batch_handler is not None and task[3] is not batch_handler
+
+                    key = None if batchable else self._single_flight_key(task)
+                    if key is not None:
+                        with self.lock:
+                            leader = self.in_flight.get(key)
+                        if leader is not None and task[1] not in self.banned_task_names:
+                            results[index] = self._attach(task, leader)
+                            continue
+
+                    func = task[3]
+                    size = len(admitted) + len(batched)
+                    task = self._apply_deadline(task, deadline, size, admitted_counts[task[1]])
+                    if task is None:
+                        continue
+
+                    if self._admit_task(task, size, admitted_counts[task[1]], gid, uid):
+                        if task[3] is not func:
+                            self.deadline_stats["degraded"] += 1
+                        admitted_counts[task[1]] += 1
+                        results[index] = self.task_results.create_future(task[2])
+                        if batchable and task[3] is func:
+                            batched.append(task)
+                            continue
+                        admitted.append(task)
+                        if key is not None:
+                            with self.lock:
+                                self.in_flight[key] = results[index]
+                            results[index].add_done_callback(partial(self._land, key))
+
+                if admitted:
+                    for timeout_processing, task_name, task_id, _, _, _ in admitted:
+                        self.task_history.add(task_id, task_name, timeout_processing, tenant_key(gid, uid), uid)
+                    self._enqueue(admitted, gid, uid)
+
+                for task in batched:
+                    self.task_history.add(task[2], task[1], task[0], tenant_key(gid, uid), uid)
+                    self.batcher.add(task)
+
+                return results
+        except Exception as e:
+            logger.error(f"{self.log_name} | error adding {len(tasks)} task(s): {e}")
+            for future in results:
+                if future is not None:
+                    self.tenant_tracker.release(future.task_id)
+                    self.task_results.cancel(future.task_id)
+            return [None] * len(tasks)
+
+    def _admit_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict], batch_size: int, pending: int,
+                    gid: Optional[int], uid: Optional[int]) -> bool:
+        """
+        Check whether a task may be queued. The caller must hold the scheduler lock.
+
+        :param task: Task tuple.
+        :param batch_size: Tasks of the same batch already admitted but not queued yet.
+        :param pending: Tasks of the same batch and name already admitted but not queued yet.
+        :param gid: Group ID the task is charged to.
+        :param uid: User ID the task is charged to.
+        :return: Whether the task was admitted.
+        """
+        _, task_name, task_id, _, _, _ = task
+        if task_name in self.banned_task_names:
+            logger.warning(f"{self.log_name} | {task_id} | is banned and will be deleted")
+            return False
+
+        rejection = self._check_task(task)
+        if rejection is not None:
+            logger.warning(f"{self.log_name} | {task_id} | not added, {rejection}")
+            return False
+
+        if self.queue_limit_key is not None and self._queue_size() + batch_size >= config[self.queue_limit_key]:
+            logger.warning(f"{self.log_name} | {task_id} | not added, queue is full")
+            return False
+
+        policy = task_policy.get(task_name)
+        if not self._make_room(task_name, task_id, policy, pending):
+            return False
+
+        rejection = None
+        if policy.tenant_quota:
+            rejection = fair_share.throttled(uid) or self.tenant_tracker.try_acquire(task_id, gid, uid)
+        if rejection is not None:
+            logger.warning(f"{self.log_name} | {task_id} | not added, {rejection}")
+            return False
+        return True
+
+    def _apply_deadline(self, task: Tuple[bool, str, str, Callable, Tuple, Dict], deadline: Optional[float],
+                        batch_size: int, pending: int) -> Optional[Tuple[bool, str, str, Callable, Tuple, Dict]]:
+        """
+        Check that a task is predicted to finish before its deadline: the predicted queue wait plus the p95 runtime
+        of its task name. A task predicted to miss it runs the deadline fallback of its plugin, or is rejected.
+        The caller must hold the scheduler lock.
+
+        :param task: Task tuple.
+        :param deadline: Default deadline in seconds, the `deadline` option of the plugin takes precedence.
+        :param batch_size: Tasks of the same batch already admitted but not queued yet.
+        :param pending: Tasks of the same batch and name already admitted but not queued yet.
+        :return: Task to queue, with the fallback as function if it was degraded, or None if it was rejected.
+        """
+        timeout_processing, task_name, task_id, _, args, kwargs = task
+        policy = task_policy.get(task_name)
+        if policy.deadline is not None:
+            deadline = policy.deadline
+        if not deadline:
+            return task
+
+        runtime = self.task_history.latency.percentile(task_name, 95)
+        if runtime is None:
+            # Too few tasks of this name finished to predict anything
+            return task
+        predicted = self._predict_wait(task_name, batch_size, pending) + runtime
+        if predicted <= deadline:
+            return task
+
+        if policy.deadline_fallback is not None and self.accepts(policy.deadline_fallback):
+            # Counted as degraded by the caller once the fallback is admitted
+            logger.warning(f"{self.log_name} | {task_id} | predicted to finish in {predicted:.1f}s, "
+                           f"after its {deadline}s deadline, running its fallback")
+            return timeout_processing, task_name, task_id, policy.deadline_fallback, args, kwargs
+
+        self.deadline_stats["rejected"] += 1
+        logger.warning(f"{self.log_name} | {task_id} | not added, predicted to finish in {predicted:.1f}s, "
+                       f"after its {deadline}s deadline")
+        return None
+
+    def _predict_wait(self, task_name: str, batch_size: int, pending: int) -> float:
+        """
+        Predict how long a new task would wait in the queue, from the number of tasks ahead of it and the median
+        runtime of the tasks, both on the whole backend and among the tasks of its name.
+
+        :param task_name: Task name.
+        :param batch_size: Tasks of the same batch already admitted but not queued yet.
+        :param pending: Tasks of the same batch and name already admitted but not queued yet.
+        :return: Predicted queue wait in seconds.
+        """
+        latency = self.task_history.latency
+        wait = 0.0
+        workers = self._workers()
+        typical = latency.percentile(None, 50)
+        if workers and typical is not None:
+            wait = (self._queue_size() + batch_size) * typical / workers
+        own = latency.percentile(task_name, 50)
+        if own is not None:
+            wait = max(wait, (self._queued_count(task_name) + pending) * own / self._max_concurrent(task_name))
+        return wait
+
+    def _workers(self) -> Optional[int]:
+        """
+        Number of tasks of any name the backend runs at once.
+
+        :return: Number of tasks, or None if the backend has no such limit.
+        """
+        return None
+
+    def _max_concurrent(self, task_name: str) -> int:
+        """
+        Maximum number of tasks with the same name running at the same time.
+
+        :param task_name: Task name.
+        :return: The `max_concurrent` option of the plugin, one task at a time by default.
+        """
+        return task_policy.get(task_name).max_concurrent or 1
+
+    def _single_flight_key(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> Optional[Tuple[str, Hashable]]:
+        """
+        Get the key identifying the tasks identical to a task, if its plugin coalesces identical tasks.
+
+        :param task: Task tuple.
+        :return: Key, or None if the task is always run.
+        """
+        _, task_name, task_id, _, args, kwargs = task
+        single_flight = task_policy.get(task_name).single_flight
+        if single_flight is False:
+            return None
+        if single_flight is True:
+            return task_name, None
+        try:
+            key = task_name, single_flight(*args, **kwargs)
+            hash(key)
+            return key
+        except Exception as e:
+            logger.warning(f"{self.log_name} | {task_id} | single-flight key failed, the task is not coalesced: {e}")
+            return None
+
+    def _attach(self, task: Tuple[bool, str, str, Callable, Tuple, Dict], leader: TaskFuture) -> TaskFuture:
+        """
+        Attach a task to an identical task in flight instead of queueing it. The caller holds the scheduler lock.
+
+        :param task: Task tuple.
+        :param leader: Future of the task in flight.
+        :return: Future of the task, resolved with the outcome of the task in flight.
+        """
+        timeout_processing, task_name, task_id, _, _, _ = task
+        future = self.task_results.create_future(task_id)
+        self.task_history.add(task_id, task_name, timeout_processing)
+        self.task_history.finish(task_id, "coalesced")
+        leader.add_done_callback(partial(self._share_outcome, task_id))
+        logger.info(f"{self.log_name} | {task_id} | coalesced with identical task | {leader.task_id} |")
+        return future
+
+    def _share_outcome(self, task_id: str, leader: Future) -> None:
+        """
+        Resolve the future of a coalesced task with the outcome of the task it was attached to.
+
+        :param task_id: ID of the coalesced task.
+        :param leader: Future of the task that ran.
+        """
+        if leader.cancelled():
+            self.task_results.cancel(task_id)
+        elif leader.exception() is not None:
+            self.task_results.set_exception(task_id, leader.exception())
+        else:
+            self.task_results.set_result(task_id, leader.result())
+
+    def _land(self, key: Tuple[str, Hashable], future: Future) -> None:
+        """
+        Forget a finished task in flight, the next identical task runs again.
+
+        :param key: Single-flight key of the task.
+        :param future: Future of the task.
+        """
+        with self.lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    def _submit_batch(self, task_name: str, items: List[Tuple[bool, str, str, Callable, Tuple, Dict]]) -> None:
+        """
+        Add a batch of tasks as one task running the batch handler of their plugin.
+
+        :param task_name: Task name.
+        :param items: Tasks of the batch.
+        """
+        batch_handler = task_policy.get(task_name).batch_handler
+        calls = [(args, kwargs) for _, _, _, _, args, kwargs in items]
+        timeout_processing = any(item[0] for item in items)
+        batch_id = str(uuid.uuid4())
+        item_ids = [item[2] for item in items]
+
+        future = None
+        if batch_handler is not None:
+            # The tasks of the batch start with the batch task, which may start before `add_tasks` returns
+            self.task_history.link(batch_id, item_ids)
+            future = self.add_tasks([(timeout_processing, task_name, batch_id, batch_handler, (calls,), {})])[0]
+        if future is None:
+            self.task_history.unlink(batch_id)
+            self._fail_batch(item_ids, RuntimeError(f"batch of {len(items)} task(s) could not be added"))
+            return
+
+        logger.info(f"{self.log_name} | {batch_id} | batch of {len(items)} | {task_name} | task(s) added")
+        future.add_done_callback(partial(self._route_batch_results, item_ids))
+
+    def _route_batch_results(self, item_ids: List[str], future: Future) -> None:
+        """
+        Resolve the futures of the tasks of a batch with their result.
+
+        :param item_ids: IDs of the tasks of the batch, in the order they were passed to the batch handler.
+        :param future: Future of the batch.
+        """
+        # The results are routed to the tasks, do not keep the list of the batch as well
+        self.task_results.pop(future.task_id)
+        if future.cancelled():
+            for task_id in item_ids:
+                self.tenant_tracker.release(task_id)
+                self.task_history.finish(task_id, "cancelled")
+                self.task_results.cancel(task_id)
+            return
+        if future.exception() is not None:
+            self._fail_batch(item_ids, future.exception())
+            return
+
+        results = future.result()
+        if not isinstance(results, (list, tuple)) or len(results) != len(item_ids):
+            count = len(results) if isinstance(results, (list, tuple)) else type(results).__name__
+            error = ValueError(f"batch handler returned {count} result(s) for {len(item_ids)} task(s)")
+            self._log_error(future.task_id, error)
+            self._fail_batch(item_ids, error)
+            return
+        for task_id, result in zip(item_ids, results):
+            self.tenant_tracker.release(task_id)
+            self.task_history.finish(task_id, "completed")
+            self.task_results.set_result(task_id, result)
+
+    def _fail_batch(self, item_ids: List[str], error: BaseException) -> None:
+        """
+        Fail the tasks of a batch.
+
+        :param item_ids: IDs of the tasks of the batch.
+        :param error: Exception set on their futures.
+        """
+        logger.error(f"{self.log_name} | batch of {len(item_ids)} task(s) failed: {error}")
+        for task_id in item_ids:
+            self.tenant_tracker.release(task_id)
+            self.task_history.finish(task_id, "failed")
+            self.task_results.set_exception(task_id, error)
+
+    def _check_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> Optional[str]:
+        """
+        Backend specific admission check.
+
+        :param task: Task tuple.
+        :return: Reason the task cannot be added, or None.
+        """
+        return None
+
+    def _make_room(self, task_name: str, task_id: str, policy: TaskPolicy, pending: int = 0) -> bool:
+        """
+        Check the queue limit of a task name, applying its overflow policy if the queue is full.
+        The limit is the `max_queued` option of the plugin, or the default limit of the backend.
+
+        :param task_name: Task name.
+        :param task_id: ID of the task being added.
+        :param policy: Scheduling policy of the task name.
+        :param pending: Tasks of the same name admitted in the current batch but not queued yet.
+        :return: Whether the new task can be queued.
+        """
+        max_queued = policy.max_queued
+        if max_queued is None and self.name_queue_limit_key is not None:
+            max_queued = config[self.name_queue_limit_key]
+        if max_queued is None or self._queued_count(task_name) + pending < max_queued:
+            return True
+
+        if policy.overflow_policy == "drop_oldest":
+            dropped = self._remove_oldest(task_name)
+            if dropped is not None:
+                self._discard_queued_task(dropped)
+                logger.warning(f"{self.log_name} | {dropped[2]} | dropped to make room for | {task_id} |")
+                return True
+
+        logger.warning(f"{self.log_name} | {task_id} | not added, queue of | {task_name} | is full")
+        return False
+
+    def _enqueue(self, tasks: List[Tuple[bool, str, str, Callable, Tuple, Dict]],
+                 gid: Optional[int], uid: Optional[int]) -> None:
+        """
+        Queue admitted tasks and wake up the backend. The caller holds the scheduler lock.
+
+        :param tasks: Admitted tasks.
+        :param gid: Group ID the tasks are charged to.
+        :param uid: User ID the tasks are charged to.
+        """
+        raise NotImplementedError
+
+    def _queue_size(self) -> int:
+        """
+        Get the number of queued tasks.
+        """
+        raise NotImplementedError
+
+    def _queued_count(self, task_name: str) -> int:
+        """
+        Get the number of queued tasks with a name.
+
+        :param task_name: Task name.
+        """
+        raise NotImplementedError
+
+    def _remove_queued(self, predicate: Callable[[Tuple], bool]) -> List[Tuple]:
+        """
+        Remove the queued tasks matching a predicate.
+
+        :param predicate: Function returning True for the tasks to remove.
+        :return: Removed tasks.
+        """
+        raise NotImplementedError
+
+    def _remove_oldest(self, task_name: str) -> Optional[Tuple]:
+        """
+        Remove the longest waiting queued task with a name.
+
+        :param task_name: Task name.
+        :return: Removed task, or None if there is none.
+        """
+        raise NotImplementedError
+
+    def _discard_queued_task(self, task: Tuple[bool, str, str, Callable, Tuple, Dict]) -> None:
+        """
+        Mark a task removed from the queue as cancelled.
+
+        :param task: Task tuple.
+        """
+        self.tenant_tracker.release(task[2])
+        self.task_results.cancel(task[2])
+        self.task_history.finish(task[2], "cancelled")
+
+    def _stream_output(self, task_id: str, output: Any) -> None:
+        """
+        Record an output yielded by a streaming task and forward it to the output callbacks of its future.
+
+        :param task_id: Task ID.
+        :param output: Yielded value.
+        """
+        self.task_history.output(task_id)
+        self.task_results.set_output(task_id, output)
+
+    def _consume_stream(self, task_id: str, generator: Iterator, on_progress: Optional[Callable[[], None]] = None) \
+            -> List[Any]:
+        """
+        Run a task whose function is a generator, forwarding each output as it is yielded.
+
+        :param task_id: Task ID.
+        :param generator: Generator returned by the task function.
+        :param on_progress: Called after each output, e.g. to push back the watchdog deadline of the task.
+        :return: List of the outputs, the result of the task.
+        """
+        outputs = []
+        for output in generator:
+            outputs.append(output)
+            self._stream_output(task_id, output)
+            if on_progress is not None:
+                on_progress()
+        return outputs
+
+    def _log_error(self, task_id: str, exception: Any) -> None:
+        """
+        Log error information during task execution.
+
+        :param task_id: Task ID.
+        :param exception: Exception object or error message.
+        """
+        error_info = {
+            "task_id": task_id,
+            "error_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "error_message": str(exception)
+        }
+        with self.lock:
+            self.error_logs.append(error_info)
+            if len(self.error_logs) > 10:
+                self.error_logs.pop(0)  # Remove the oldest error log
+
+    def _start_status_check_timer(self) -> None:
+        """
+        Start the periodic check of the running tasks, unless it is already running.
+        """
+        if self.status_check_timer is None:
+            self.status_check_timer = threading.Timer(config["status_check_interval"],
+                                                      self._check_running_tasks_status)
+            self.status_check_timer.start()
+
+    def _check_running_tasks_status(self) -> None:
+        """
+        The scheduled check of the running tasks: a task with timeout processing enabled that made no progress for
+        `watch_dog_time` seconds is stopped by the backend, see `_stop_timed_out_task`.
+        """
+        for record in self.task_history.running_records():
+            # Streaming tasks push back their deadline with each output
+            last_activity = record.last_activity()
+            if record.timeout_processing and (
+                    last_activity is not None and time.time() - last_activity > config["watch_dog_time"]):
+                self._stop_timed_out_task(record)
+
+        # Restart the timer
+        # Prevent the shutdown operation from being started while it is executed
+        if not self.scheduler_stop_event.is_set() and self.status_check_timer is not None:
+            self.status_check_timer = threading.Timer(config["status_check_interval"],
+                                                      self._check_running_tasks_status)
+            self.status_check_timer.start()
+
+    def _stop_timed_out_task(self, record: TaskRecord) -> None:
+        """
+        Stop a running task that exceeded `watch_dog_time`.
+
+        :param record: Record of the task.
+        """
+        raise NotImplementedError
+
+    def stop_status_check_timer(self) -> None:
+        """
+        Stop state detection timer, it starts again with the next queued task.
+        """
+        if self.status_check_timer is not None:
+            self.status_check_timer.cancel()
+            self.status_check_timer = None
+            logger.info("Status check timer has been stopped")
+
+    # The task scheduler closes the countdown
+    def _reset_idle_timer(self, key: Hashable) -> None:
+        """
+        Restart the idle timer of a scheduler. A scheduler kept warm is not stopped when idle.
+
+        :param key: Scheduler key.
+        """
+        with self.idle_timer_lock:
+            timer = self.idle_timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            if self.standby.keep_warm(key):
+                return
+            timer = self.idle_timers[key] = threading.Timer(self.standby.idle_timeout(key),
+                                                            self._stop_idle_scheduler, args=(key,))
+            timer.start()
+
+    def _cancel_idle_timer(self, key: Hashable) -> None:
+        """
+        Cancel the idle timer of a scheduler.
+
+        :param key: Scheduler key.
+        """
+        with self.idle_timer_lock:
+            timer = self.idle_timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+    def _stop_idle_scheduler(self, key: Hashable) -> None:
+        """
+        Stop a scheduler whose idle timer expired, unless tasks were added meanwhile.
+
+        :param key: Scheduler key.
+        """
+        self.stop_scheduler(False, True)
+
+    def _clear_task_queue(self, task_name: Optional[str] = None) -> None:
+        """
+        Cancel the queued tasks of a task name, or all queued tasks.
+
+        :param task_name: Task name, None for all task names.
+        """
+        for task in self._remove_queued(lambda task: task_name is None or task[1] == task_name):
+            self._discard_queued_task(task)
+
+    def _join_scheduler_thread(self, key: Hashable) -> None:
+        """
+        Wait for the thread of a scheduler to finish.
+
+        :param key: Scheduler key.
+        """
+        thread = self.scheduler_threads.get(key)
+        if thread is not None and thread.is_alive():
+            thread.join()
+
+    # Stop the scheduler
+    def stop_scheduler(self, force_cleanup: bool, system_operations: bool = False) -> None:
+        """
+        Stop the backend.
+
+        :param force_cleanup: If True, force stop all tasks and clear the queue.
+        :param system_operations: System execution metrics
+        """
+        raise NotImplementedError
+
+    def force_stop_task(self, task_id: str) -> None:
+        """
+        Force stop a task by its task ID.
+
+        :param task_id: task ID.
+        """
+        raise NotImplementedError
+
+    def get_queue_info(self) -> Dict:
+        """
+        Get detailed information about the task queue.
+
+        Returns:
+            Dict: Dictionary containing queue size, number of running tasks, number of failed tasks, task details, and error logs.
+        """
+        queue_info = {
+            "queue_size": self._queue_size(),
+            "running_tasks_count": self.task_history.count("running"),
+            "failed_tasks_count": self.task_history.count("failed"),
+            "killed_tasks_count": self.task_history.count("killed"),  # Tasks killed at their deadline
+            "coalesced_tasks_count": self.task_history.count("coalesced"),  # Tasks that shared an identical one's result
+            "task_details": {},
+            "task_names": self.task_history.name_summary(),  # Task names with the most queued and running tasks
+            "error_logs": self.error_logs.copy(),  # Return recent error logs
+            "tenant_usage": self.tenant_tracker.snapshot(),  # Busiest groups and users
+            "result_store": self.task_results.stats(),  # Stored results and their memory use
+            "micro_batches": self.batcher.stats(),  # Batches of plugins with a batch handler
+            "latency": self.task_history.latency.summary(),  # Runtime percentiles of the slowest task names
+            "first_output": self.task_history.first_output.summary(),  # Time to first output of streaming tasks
+            "resource_usage": self.task_history.usage.top(),  # Task names using the most CPU, time and memory
+            "deadline_misses": dict(self.deadline_stats),  # Tasks rejected or degraded to meet their deadline
+            "standby": self.standby.stats(),  # Scheduler startups and teardowns
+            "locks": self._lock_stats(),  # Wait and hold times of the locks of the backend
+            **self._backend_info()
+        }
+
+        # Only the running tasks and the most recent others are listed
+        for record in self.task_history.recent(config["maximum_task_info_storage"]):
+            details = record.to_dict()
+            if record.status == "running" and time.time() - record.last_activity() > config["watch_dog_time"]:
+                # Change end time of timed out tasks to NaN
+                details["end_time"] = "NaN"
+            queue_info["task_details"][record.task_id] = details
+
+        return queue_info
+
+    def _backend_info(self) -> Dict:
+        """
+        Get the entries of `get_queue_info` specific to the backend.
+        """
+        return {}
+
+    def _lock_stats(self) -> Dict[str, Dict]:
+        """
+        Get the contention counters of the instrumented locks of the backend.
+
+        :return: Lock name -> counters, see `merge_lock_stats`.
+        """
+        return {"state": self.lock.stats()}
+
+    def cancel_all_queued_tasks_by_name(self, task_name: str) -> None:
+        """
+        Cancel all queued tasks with the same name.
+
+        :param task_name: Task name.
+        """
+        for task in self._remove_queued(lambda task: task[1] == task_name):
+            self._discard_queued_task(task)
+            logger.warning(f"{self.log_name} | {task_name} | is waiting to be executed in the queue, has been deleted")
+
+    def cancel_batched_tasks(self, task_name: Optional[str] = None) -> None:
+        """
+        Cancel the tasks still waiting for their batch, so that no batch of them is submitted later.
+
+        :param task_name: Task name, None for all task names.
+        """
+        for task in self.batcher.discard(task_name):
+            self._discard_queued_task(task)
+            logger.warning(f"{self.log_name} | {task[2]} | was waiting for its batch, has been deleted")
+
+    def ban_task_name(self, task_name: str) -> None:
+        """
+        Ban a task name from execution, delete tasks directly if detected and print information.
+
+        :param task_name: Task name.
+        """
+        with self.lock:
+            self.banned_task_names.append(task_name)
+            logger.warning(f"{self.log_name} | {task_name} | is banned from execution")
+
+        # Cancel all queued tasks with the banned task name
+        self.cancel_all_queued_tasks_by_name(task_name)
+        self.cancel_batched_tasks(task_name)
+
+    def allow_task_name(self, task_name: str) -> None:
+        """
+        Allow a banned task name to be executed again.
+
+        :param task_name: Task name.
+        """
+        with self.lock:
+            if task_name in self.banned_task_names:
+                self.banned_task_names.remove(task_name)
+                logger.info(f"{self.log_name} | {task_name} | is allowed for execution")
+            else:
+                logger.warning(f"{self.log_name} | {task_name} | is not banned, no action taken")
+
+    # Obtain the information returned by the corresponding task
+    def get_task_result(self, task_id: str) -> Optional[Any]:
+        """
+        Get the result of a task. If there is a result, return and delete it; if no result, return None.
+        Results are kept for `task_result_ttl` seconds, use the future returned by `add_task` to wait for one.
+
+        :param task_id: Task ID.
+        :return: Task return result, if the task is not completed, does not exist or its result expired, return None.
+        """
+        return self.task_results.pop(task_id)
+
+    def get_task_status(self, task_id: str) -> Optional[Dict]:
+        """
+        Obtain task status information for a specified task_id.
+
+        :param task_id: Task ID.
+        :return: A dictionary containing information about the status of the task, or None if the task does not exist.
+        """
+        record = self.task_history.get(task_id)
+        if record is not None:
+            return record.to_dict()
+        logger.warning(f"{self.log_name} | {task_id} | does not exist or has been completed and removed")
+        return None
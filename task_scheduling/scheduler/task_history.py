@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Union
+
+from config import config
+from .circuit_breaker import circuit_breakers
+from .fair_share import fair_share
+from .latency_histogram import LatencyTracker
+from .resource_usage import ResourceUsage
+from .task_policy import task_policy
+from .task_trace import task_trace
+
+
+class TaskRecord:
+    """
+    Status information of a single task.
+    """
+    __slots__ = [
+        'task_id', 'task_name', 'status', 'add_time', 'start_time', 'end_time', 'timeout_processing',
+        'first_output_time', 'output_time', 'tenant', 'uid', 'cpu_time', 'allocated'
+    ]
+
+    def __init__(self, task_id: str, task_name: str, timeout_processing: bool,
+                 tenant: Optional[Tuple[str, int]] = None, uid: Optional[int] = None) -> None:
+        self.task_id = task_id
+        self.task_name = task_name
+        self.status = "pending"
+        self.add_time = time.time()  # Time the task was queued, to measure its queue wait
+        self.start_time: Optional[float] = None
+        self.end_time: Union[float, str, None] = None  # "NaN" if the task timed out or was killed by the watchdog
+        self.timeout_processing = timeout_processing
+        self.first_output_time: Optional[float] = None  # Time a streaming task yielded its first output
+        self.output_time: Optional[float] = None  # Time a streaming task yielded its last output
+        self.tenant = tenant  # Group or user the task is charged to, see `tenant_key`
+        self.uid = uid  # User whose fair share the resources of the task are charged to
+        self.cpu_time: Optional[float] = None  # Seconds of CPU time used, if measured by the backend
+        self.allocated: Optional[int] = None  # Bytes allocated and not freed while it ran, if sampled
+
+    def last_activity(self) -> Optional[float]:
+        """
+        Get the time the task last made progress, from which its watchdog deadline counts.
+
+        :return: Time of its last streamed output, or its start time.
+        """
+        return self.output_time or self.start_time
+
+    def to_dict(self) -> Dict:
+        """
+        Get the record in the dictionary format returned by `get_task_status` and `get_queue_info`.
+        """
+        details = {
+            "task_name": self.task_name,
+            "start_time": self.start_time,
+            "status": self.status,
+            "timeout_processing": self.timeout_processing
+        }
+        if self.end_time is not None:
+            details["end_time"] = self.end_time
+        if self.first_output_time is not None:
+            details["first_output_time"] = self.first_output_time
+        if self.cpu_time is not None:
+            details["cpu_time"] = self.cpu_time
+        return details
+
+
+class TaskHistory:
+    """
+    Status information of the tasks of a scheduler.
+    Pending and running tasks are always kept, finished tasks are kept in a ring buffer of
+    `maximum_task_info_storage` records that overwrites the oldest one.
+    Counters by status and by task name are updated on every change, so that they never need to be recomputed.
+    The runtimes of completed and failed tasks are recorded in histograms by task name, and so is the time
+    streaming tasks take to yield their first output. The CPU time, wall time, queue wait and sampled allocations
+    of all tasks that started are added up by task name.
+    """
+    __slots__ = [
+        'pending', 'running', 'finished', 'head', 'index', 'status_counts', 'name_counts', 'latency', 'first_output',
+        'usage', 'batches', 'backend', 'lock'
+    ]
+
+    def __init__(self, capacity: Optional[int] = None, backend: Optional[str] = None) -> None:
+        """
+        :param capacity: Number of finished tasks to keep, defaults to `maximum_task_info_storage`.
+        :param backend: Log name of the backend, written to the task trace.
+        """
+        capacity = max(capacity or config["maximum_task_info_storage"], 1)
+        self.pending: Dict[str, TaskRecord] = {}  # Queued tasks, in insertion order
+        self.running: Dict[str, TaskRecord] = {}  # Running tasks, in start order
+        self.finished: List[Optional[TaskRecord]] = [None] * capacity  # Ring buffer of finished tasks
+        self.head = 0  # Next slot of the ring buffer to be written
+        self.index: Dict[str, TaskRecord] = {}  # Task ID -> record, for all kept records
+        self.status_counts: Counter = Counter()  # Status -> number of kept records
+        self.name_counts: Dict[str, Counter] = {}  # Task name -> status -> number of kept records
+        self.latency = LatencyTracker()  # Runtimes of finished tasks, kept when the records are cleared
+        self.first_output = LatencyTracker()  # Time from start to first output of streaming tasks
+        self.usage = ResourceUsage()  # Resource usage by task name, kept when the records are cleared
+        self.batches: Dict[str, List[str]] = {}  # Queued batch task ID -> IDs of the tasks it runs
+        self.backend = backend
+        self.lock = threading.Lock()  # Lock to protect access to the records and counters
+
+    def add(self, task_id: str, task_name: str, timeout_processing: bool,
+            tenant: Optional[Tuple[str, int]] = None, uid: Optional[int] = None) -> TaskRecord:
+        """
+        Record a newly queued task.
+
+        :param task_id: Task ID.
+        :param task_name: Task name.
+        :param timeout_processing: Whether timeout processing is enabled for the task.
+        :param tenant: Group or user the task is charged to.
+        :param uid: User ID the task is charged to.
+        :return: Record of the task.
+        """
+        record = TaskRecord(task_id, task_name, timeout_processing, tenant, uid)
+        with self.lock:
+            self.pending[task_id] = record
+            self.index[task_id] = record
+            self._count(record, 1)
+        return record
+
+    def start(self, task_id: str) -> Optional[TaskRecord]:
+        """
+        Mark a queued task as running.
+
+        :param task_id: Task ID.
+        :return: Record of the task, or None if it is not queued.
+        """
+        with self.lock:
+            record = self.pending.pop(task_id, None)
+            if record is None:
+                return None
+            self._start(record)
+            for item_id in self.batches.pop(task_id, ()):
+                item = self.pending.pop(item_id, None)
+                if item is not None:
+                    self._start(item)
+            return record
+
+    def link(self, batch_id: str, item_ids: List[str]) -> None:
+        """
+        Mark the tasks of a batch as running when the task running their batch handler starts.
+
+        :param batch_id: ID of the batch task, not queued yet.
+        :param item_ids: IDs of the queued tasks of the batch.
+        """
+        with self.lock:
+            self.batches[batch_id] = item_ids
+
+    def unlink(self, batch_id: str) -> None:
+        """
+        Forget the tasks of a batch whose batch task was not added.
+
+        :param batch_id: ID of the batch task.
+        """
+        with self.lock:
+            self.batches.pop(batch_id, None)
+
+    def _start(self, record: TaskRecord) -> None:
+        """
+        Move a record removed from the queued tasks to the running tasks. The caller must hold the lock.
+
+        :param record: Task record.
+        """
+        self._count(record, -1)
+        record.status = "running"
+        record.start_time = time.time()
+        self._count(record, 1)
+        self.running[record.task_id] = record
+
+    def output(self, task_id: str) -> None:
+        """
+        Record an output yielded by a running streaming task, which also pushes back its watchdog deadline.
+
+        :param task_id: Task ID.
+        """
+        now = time.time()
+        with self.lock:
+            record = self.running.get(task_id)
+            if record is None:
+                return
+            first = record.first_output_time is None
+            if first:
+                record.first_output_time = now
+            record.output_time = now
+        if first:
+            self.first_output.observe(record.task_name, now - record.start_time)
+
+    def finish(self, task_id: str, status: str, end_time: Union[float, str, None] = None,
+               error: Optional[BaseException] = None) -> None:
+        """
+        Mark a task as finished and move it to the ring buffer. If it had already finished, only its status changes.
+
+        :param task_id: Task ID.
+        :param status: Final status, e.g. "completed", "failed", "timeout", "cancelled" or "killed".
+        :param end_time: End time, defaults to now.
+        :param error: Exception a failed task raised, passed on to the circuit breaker of its name.
+        """
+        with self.lock:
+            record = self.index.get(task_id)
+            if record is None:
+                return
+            self.batches.pop(task_id, None)
+            self._count(record, -1)
+            record.status = status
+            record.end_time = time.time() if end_time is None else end_time
+            self._count(record, 1)
+
+            if self.pending.pop(task_id, None) is None and self.running.pop(task_id, None) is None:
+                return  # Already in the ring buffer
+
+            evicted = self.finished[self.head]
+            if evicted is not None and self.index.get(evicted.task_id) is evicted:
+                del self.index[evicted.task_id]
+                self._count(evicted, -1)
+            self.finished[self.head] = record
+            self.head = (self.head + 1) % len(self.finished)
+
+        if status in ("completed", "failed") and record.start_time is not None and end_time is None:
+            self.latency.observe(record.task_name, record.end_time - record.start_time)
+        now = time.time()
+        if record.start_time is not None:
+            if task_policy.get(record.task_name).circuit_breaker:
+                circuit_breakers.record(record.task_name, status, now - record.start_time, error)
+            self.usage.observe(record.task_name, now - record.start_time, record.start_time - record.add_time,
+                               record.cpu_time, record.allocated)
+            fair_share.charge(record.uid, record.cpu_time, now - record.start_time)
+        task_trace.record(self.backend, record, status, now)
+
+    def _count(self, record: TaskRecord, delta: int) -> None:
+        """
+        Update the counters of a record's status. The caller must hold the lock.
+
+        :param record: Task record.
+        :param delta: 1 when the record enters a status, -1 when it leaves it.
+        """
+        self.status_counts[record.status] += delta
+        counts = self.name_counts.get(record.task_name)
+        if counts is None:
+            counts = self.name_counts[record.task_name] = Counter()
+        counts[record.status] += delta
+        if counts[record.status] <= 0:
+            del counts[record.status]
+            if not counts:
+                del self.name_counts[record.task_name]
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        """
+        Get the record of a task.
+
+        :param task_id: Task ID.
+        :return: Record of the task, or None if it is unknown or was overwritten.
+        """
+        return self.index.get(task_id)
+
+    def count(self, status: str, task_name: Optional[str] = None) -> int:
+        """
+        Get the number of kept records with a status.
+
+        :param status: Task status.
+        :param task_name: Only count the tasks with this name.
+        :return: Number of records.
+        """
+        if task_name is None:
+            return self.status_counts[status]
+        counts = self.name_counts.get(task_name)
+        return counts[status] if counts is not None else 0
+
+    def running_records(self) -> List[TaskRecord]:
+        """
+        Get the records of the running tasks.
+        """
+        with self.lock:
+            return list(self.running.values())
+
+    def recent(self, limit: int) -> List[TaskRecord]:
+        """
+        Get the records of all running tasks, followed by up to `limit` queued and most recently finished tasks.
+
+        :param limit: Maximum number of queued and finished records to return.
+        :return: Records.
+        """
+        with self.lock:
+            records = list(self.running.values())
+            for record in self.pending.values():
+                if limit <= 0:
+                    return records
+                records.append(record)
+                limit -= 1
+
+            capacity = len(self.finished)
+            for offset in range(1, min(limit, capacity) + 1):
+                record = self.finished[(self.head - offset) % capacity]
+                if record is None:
+                    break
+                if self.index.get(record.task_id) is record:
+                    records.append(record)
+            return records
+
+    def name_summary(self, limit: int = 5) -> List[Dict]:
+        """
+        Get the task names with the most queued and running tasks.
+
+        :param limit: Maximum number of task names to return.
+        :return: List of dictionaries with the task name and its number of records by status.
+        """
+        with self.lock:
+            items = [item for item in self.name_counts.items() if item[1]["pending"] or item[1]["running"]]
+            items = sorted(items, key=lambda item: item[1]["pending"] + item[1]["running"], reverse=True)[:limit]
+            return [{"task_name": task_name, **counts} for task_name, counts in items]
+
+    def clear(self) -> None:
+        """
+        Delete all records.
+        """
+        with self.lock:
+            self.pending.clear()
+            self.running.clear()
+            self.finished = [None] * len(self.finished)
+            self.head = 0
+            self.index.clear()
+            self.status_counts.clear()
+            self.name_counts.clear()
+            self.batches.clear()
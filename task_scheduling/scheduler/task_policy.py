@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Type, Union
+
+from common import logger
+from .circuit_breaker import circuit_breakers
+
+# What to do with a new task when its plugin already has `max_queued` tasks waiting
+OVERFLOW_POLICIES = ("reject", "drop_oldest")
+
+# Exceptions treated as transient by default, tasks failing with them are retried if the plugin allows retries
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError)
+
+# Names of the execution backends a plugin can choose, filled by the backend registry
+EXECUTION_BACKENDS: List[str] = []
+
+
+class TaskPolicy:
+    """
+    Scheduling options declared by a plugin when it is registered.
+    Options left as None fall back to the global configuration of the scheduler running the task.
+    """
+    __slots__ = [
+        'max_concurrent', 'max_queued', 'overflow_policy', 'execution', 'isolated', 'kill_timeout', 'single_flight',
+        'batch_handler', 'max_batch', 'max_wait_ms', 'deadline', 'deadline_fallback', 'retries', 'retry_backoff',
+        'retry_max_backoff', 'retry_on', 'tenant_quota', 'circuit_breaker'
+    ]
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queued: Optional[int] = None,
+                 overflow_policy: str = "reject", execution: Optional[str] = None, isolated: bool = False,
+                 kill_timeout: Optional[float] = None,
+                 single_flight: Union[bool, Callable[..., Hashable]] = False,
+                 batch_handler: Optional[Callable[[List[Tuple[Tuple, Dict]]], List[Any]]] = None,
+                 max_batch: int = 16, max_wait_ms: float = 50, deadline: Optional[float] = None,
+                 deadline_fallback: Optional[Callable] = None, retries: int = 0, retry_backoff: float = 1.0,
+                 retry_max_backoff: float = 30.0,
+                 retry_on: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS, tenant_quota: bool = True,
+                 circuit_breaker: bool = True) -> None:
+        """
+        :param max_concurrent: Maximum number of tasks of this plugin running at the same time.
+        :param max_queued: Maximum number of tasks of this plugin waiting in the queue.
+        :param overflow_policy: "reject" to refuse new tasks when the queue of the plugin is full,
+                                "drop_oldest" to discard the longest waiting task instead.
+        :param execution: Execution backend, None to run sync handlers in the thread pool ("line") and async handlers
+                          in event loops ("asyncio"), "process" to run the handler in a worker process for CPU-bound
+                          plugins, "inline" to run a handler that returns almost immediately in the dispatching thread.
+        :param isolated: Mark the plugin as risky, e.g. it may block in C code where the thread watchdog cannot
+                         interrupt it. Its tasks run in worker processes that are killed at their deadline,
+                         whether or not timeout processing is enabled.
+        :param kill_timeout: Seconds after which a task running in a worker process is killed,
+                             defaults to `watch_dog_time`.
+        :param single_flight: Coalesce identical tasks: a task added while an identical one is queued or running is not
+                              run again, its future gets the result of the task in flight. True makes all tasks of
+                              the plugin identical, a function called with the arguments of the handler returns the
+                              key of identical tasks, e.g. the group ID so that each group gets its own reply.
+        :param batch_handler: Handler processing many tasks in one call, for plugins that are cheaper per message
+                              in bulk. Tasks of the plugin are accumulated and the batch handler is called with the
+                              list of (args, kwargs) of the tasks of a batch, it must return one result per task in
+                              the same order and reply to each sender from its arguments.
+        :param max_batch: Maximum number of tasks in a batch, a full batch is submitted immediately.
+        :param max_wait_ms: Maximum time in milliseconds a task waits for its batch to fill up.
+        :param deadline: Seconds after being added within which a task of this plugin must finish to be useful,
+                         overrides the default deadline of the plugin manager, 0 for no deadline.
+        :param deadline_fallback: Cheap function, called with the arguments of the handler, run instead of the
+                                  handler when the task is predicted to miss its deadline, e.g. to reply that the
+                                  bot is busy. Without it such tasks are rejected.
+        :param retries: Maximum number of times a task failing with a transient error is added again.
+        :param retry_backoff: Base delay in seconds before a retry, doubled for each attempt, with full jitter.
+                              The task does not hold any slot while waiting.
+        :param retry_max_backoff: Maximum delay in seconds before a retry.
+        :param retry_on: Exception types treated as transient errors.
+        :param tenant_quota: Charge the tasks of this plugin to the `maximum_queue_gid` and `maximum_queue_uid` caps
+                             and the `fair_share_limit` of the group and user that triggered them. Off for filters,
+                             which run for every matching message and must not use up the sender's quota.
+        :param circuit_breaker: Reject new tasks of this plugin while too many of its recent tasks failed, see
+                                `CircuitBreakers`. Off for system commands and timers, so that a few failed runs of a
+                                management command do not lock the administrator out of it.
+        :raises ValueError: If an option has an invalid value.
+        """
+        if max_concurrent is not None and (not isinstance(max_concurrent, int) or max_concurrent < 1):
+            raise ValueError("max_concurrent must be a positive integer.")
+        if max_queued is not None and (not isinstance(max_queued, int) or max_queued < 0):
+            raise ValueError("max_queued must be a non-negative integer.")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}.")
+        if execution is not None and execution not in EXECUTION_BACKENDS:
+            raise ValueError(f"execution must be one of {EXECUTION_BACKENDS}.")
+        if not isinstance(isolated, bool):
+            raise ValueError("isolated must be a boolean.")
+        if kill_timeout is not None and (not isinstance(kill_timeout, (int, float)) or kill_timeout <= 0):
+            raise ValueError("kill_timeout must be a positive number.")
+        if not isinstance(single_flight, bool) and not callable(single_flight):
+            raise ValueError("single_flight must be a boolean or a key function.")
+        if batch_handler is not None:
+            if not callable(batch_handler):
+                raise ValueError("batch_handler must be callable.")
+            if single_flight is not False:
+                raise ValueError("batch_handler cannot be combined with single_flight.")
+        if not isinstance(max_batch, int) or max_batch < 1:
+            raise ValueError("max_batch must be a positive integer.")
+        if not isinstance(max_wait_ms, (int, float)) or max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be a non-negative number.")
+        if deadline is not None and (not isinstance(deadline, (int, float)) or deadline < 0):
+            raise ValueError("deadline must be a non-negative number.")
+        if deadline_fallback is not None and not callable(deadline_fallback):
+            raise ValueError("deadline_fallback must be callable.")
+        if not isinstance(retries, int) or retries < 0:
+            raise ValueError("retries must be a non-negative integer.")
+        if not isinstance(retry_backoff, (int, float)) or retry_backoff < 0:
+            raise ValueError("retry_backoff must be a non-negative number.")
+        if not isinstance(retry_max_backoff, (int, float)) or retry_max_backoff < retry_backoff:
+            raise ValueError("retry_max_backoff must be a number not less than retry_backoff.")
+        if not isinstance(retry_on, tuple) or not all(
+                isinstance(error, type) and issubclass(error, BaseException) for error in retry_on):
+            raise ValueError("retry_on must be a tuple of exception types.")
+        if not isinstance(tenant_quota, bool):
+            raise ValueError("tenant_quota must be a boolean.")
+        if not isinstance(circuit_breaker, bool):
+            raise ValueError("circuit_breaker must be a boolean.")
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.overflow_policy = overflow_policy
+        self.execution = execution
+        self.isolated = isolated
+        self.kill_timeout = kill_timeout
+        self.single_flight = single_flight
+        self.batch_handler = batch_handler
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.deadline = deadline
+        self.deadline_fallback = deadline_fallback
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_max_backoff = retry_max_backoff
+        self.retry_on = retry_on
+        self.tenant_quota = tenant_quota
+        self.circuit_breaker = circuit_breaker
+
+
+# Policy used by tasks whose plugin did not declare any option
+DEFAULT_POLICY = TaskPolicy()
+
+
+class TaskPolicyRegistry:
+    """
+    Registry of the scheduling policies of each task name.
+    """
+    __slots__ = ['policies', 'lock']
+
+    def __init__(self) -> None:
+        self.policies: Dict[str, TaskPolicy] = {}  # Task name -> policy
+        self.lock = threading.Lock()  # Lock to protect access to the policies
+
+    def register(self, task_name: str, **options) -> TaskPolicy:
+        """
+        Register the scheduling policy of a task name, replacing any previous one.
+        Unknown options are ignored with a warning.
+
+        :param task_name: Task name.
+        :param options: Options accepted by `TaskPolicy`.
+        :return: Registered policy.
+        :raises ValueError: If an option has an invalid value.
+        """
+        unknown = [option for option in options if option not in TaskPolicy.__slots__]
+        for option in unknown:
+            logger.warning(f"Task policy | {task_name} | unknown option '{option}' ignored")
+            del options[option]
+
+        policy = TaskPolicy(**options)
+        with self.lock:
+            self.policies[task_name] = policy
+        # A reloaded plugin starts with a closed circuit breaker
+        circuit_breakers.reset(task_name)
+        return policy
+
+    def unregister(self, task_name: str) -> None:
+        """
+        Remove the scheduling policy of a task name.
+
+        :param task_name: Task name.
+        """
+        with self.lock:
+            self.policies.pop(task_name, None)
+
+    def get(self, task_name: str) -> TaskPolicy:
+        """
+        Get the scheduling policy of a task name.
+
+        :param task_name: Task name.
+        :return: Registered policy, or the default policy if none was registered.
+        """
+        return self.policies.get(task_name, DEFAULT_POLICY)
+
+
+task_policy = TaskPolicyRegistry()
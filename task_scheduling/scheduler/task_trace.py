@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+from typing import IO, Optional
+
+from common import logger
+from config import config
+
+
+class TaskTrace:
+    """
+    Optional trace of the finished tasks, enabled by setting `task_trace_file`: one JSON line per task with its
+    backend, name, tenant, arrival time, queue wait and service time. The trace can be replayed by
+    `benchmarks/simulate_scheduler.py` to compare candidate configurations without running the plugins.
+    Tasks rejected at admission are not traced.
+    """
+    __slots__ = ['path', 'file', 'lock']
+
+    def __init__(self) -> None:
+        self.path: Optional[str] = None  # Trace file currently open
+        self.file: Optional[IO] = None
+        self.lock = threading.Lock()  # Lock to protect access to the file
+
+    def record(self, backend: Optional[str], record, status: str, now: float) -> None:
+        """
+        Append a finished task to the trace.
+
+        :param backend: Log name of the backend that ran the task.
+        :param record: Task record, see `TaskRecord`.
+        :param status: Final status of the task.
+        :param now: Time the task finished.
+        """
+        path = config.get("task_trace_file")
+        if not path:
+            return
+
+        started = record.start_time is not None
+        line = json.dumps({
+            "backend": backend,
+            "name": record.task_name,
+            "tenant": record.tenant,
+            "arrival": record.add_time,
+            "wait": (record.start_time if started else now) - record.add_time,
+            "service": now - record.start_time if started else None,  # None if it never started
+            "status": status
+        }, ensure_ascii=False)
+
+        with self.lock:
+            try:
+                if self.path != path:
+                    if self.file is not None:
+                        self.file.close()
+                    self.file = open(path, "a", encoding="utf-8", buffering=1)
+                    self.path = path
+                self.file.write(line + "\n")
+            except OSError as e:
+                logger.error(f"Task trace | failed to write {path}: {e}")
+                self.path = self.file = None
+
+
+task_trace = TaskTrace()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional
+
+from config import config
+
+# A scheduler idle for more than this many times its idle timeout before restarting gets a shorter timeout again
+HYSTERESIS = 4
+
+
+class StandbyState:
+    """
+    Idle timeout and start/stop history of one scheduler.
+    """
+    __slots__ = ['backoff', 'stopped_at', 'starts', 'stops']
+
+    def __init__(self) -> None:
+        self.backoff = 1.0  # Idle timeout multiplier of `max_idle_time`
+        self.stopped_at: Optional[float] = None  # Time of the last teardown
+        self.starts = 0  # Number of startups
+        self.stops = 0  # Number of teardowns
+
+
+class WarmStandby:
+    """
+    Decides how long idle schedulers of a backend (the linear scheduler, the event loop of a task name, a worker
+    process) stay warm before being torn down.
+    The `min_warm_schedulers` most used schedulers are never torn down. The others stop after an idle timeout that
+    doubles, up to `max_idle_backoff` times `max_idle_time`, each time a scheduler restarts before its timeout would
+    have elapsed, i.e. it was torn down just to be started again. It only halves once the scheduler restarts after
+    being unneeded for several timeouts, so that bursty traffic does not make the timeout flap.
+    """
+    __slots__ = ['states', 'usage', 'clock', 'lock']
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param clock: Function returning the current time in seconds, replaced by the virtual clock of the simulator.
+        """
+        self.states: Dict[Hashable, StandbyState] = {}  # Scheduler key -> idle timeout and history
+        self.usage: Counter = Counter()  # Scheduler key -> number of tasks it received
+        self.clock = clock
+        self.lock = threading.Lock()  # Lock to protect access to the states
+
+    def used(self, key: Hashable, count: int = 1) -> None:
+        """
+        Record tasks sent to a scheduler.
+
+        :param key: Scheduler key, e.g. the task name of an event loop.
+        :param count: Number of tasks.
+        """
+        with self.lock:
+            self.usage[key] += count
+
+    def keep_warm(self, key: Hashable) -> bool:
+        """
+        Check whether a scheduler is one of the most used ones, which are kept running when idle.
+
+        :param key: Scheduler key.
+        :return: Whether the scheduler must not be torn down.
+        """
+        minimum = config.get("min_warm_schedulers", 1)
+        if minimum <= 0:
+            return False
+        with self.lock:
+            return key in {name for name, _ in self.usage.most_common(minimum)}
+
+    def idle_timeout(self, key: Hashable) -> float:
+        """
+        Get the time an idle scheduler waits before being torn down.
+
+        :param key: Scheduler key.
+        :return: Idle timeout in seconds.
+        """
+        with self.lock:
+            state = self.states.get(key)
+            return config["max_idle_time"] * (state.backoff if state is not None else 1.0)
+
+    def started(self, key: Hashable) -> None:
+        """
+        Record the startup of a scheduler, adjusting its idle timeout to the time it spent stopped.
+
+        :param key: Scheduler key.
+        """
+        now = self.clock()
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = StandbyState()
+            if state.stopped_at is not None:
+                timeout = config["max_idle_time"] * state.backoff
+                stopped_for = now - state.stopped_at
+                if stopped_for < timeout:
+                    state.backoff = min(state.backoff * 2, max(config.get("max_idle_backoff", 8), 1))
+                elif stopped_for > timeout * HYSTERESIS:
+                    state.backoff = max(state.backoff / 2, 1.0)
+            state.starts += 1
+
+    def stopped(self, key: Hashable) -> None:
+        """
+        Record the teardown of a scheduler.
+
+        :param key: Scheduler key.
+        """
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = StandbyState()
+            state.stopped_at = self.clock()
+            state.stops += 1
+
+    def stats(self, limit: int = 5) -> Dict:
+        """
+        Get the number of scheduler startups and teardowns, and the idle timeouts of the most restarted schedulers.
+
+        :param limit: Maximum number of schedulers to list.
+        :return: Dictionary of the counts and a list of the schedulers.
+        """
+        with self.lock:
+            items = sorted(self.states.items(), key=lambda item: item[1].starts, reverse=True)[:limit]
+            schedulers: List[Dict] = [
+                {
+                    "scheduler": str(key),
+                    "starts": state.starts,
+                    "stops": state.stops,
+                    "idle_timeout": config["max_idle_time"] * state.backoff
+                }
+                for key, state in items
+            ]
+            return {
+                "starts": sum(state.starts for state in self.states.values()),
+                "stops": sum(state.stops for state in self.states.values()),
+                "schedulers": schedulers
+            }
@@ -1,23 +1,45 @@
 # -*- coding: utf-8 -*-
+import time
 import uuid
-from typing import Callable
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from common.logging import logger
-from .scheduler import io_async_task, io_liner_task
-from .scheduler.utils import is_async_function
+from .scheduler import backends, task_policy
+from .scheduler.fair_share import fair_share
+from .scheduler.result_store import TaskFuture
+from .scheduler.retry import with_retries
+from .task_journal import task_journal
 
 
-def add_task(timeout_processing: bool, task_name: str, func: Callable, *args, **kwargs) -> str or None:
+def add_task(timeout_processing: bool, task_name: str, func: Callable, *args,
+             gid: Optional[int] = None, uid: Optional[int] = None, deadline: Optional[float] = None,
+             on_output: Optional[Callable[[Any], None]] = None, execution: Optional[str] = None,
+             journal: Optional[str] = None, **kwargs) -> Optional[TaskFuture]:
     """
-    Add a task to the queue, choosing between asynchronous or linear tasks based on the function type.
-    Generates a unique task ID and returns it.
+    Add a task to the queue of an execution backend: the one chosen with the `execution` or `isolated` option of the
+    plugin's policy, otherwise asynchronous or linear tasks based on the function type.
+    Generates a unique task ID and returns the future of the task, which carries the ID as `task_id`.
+    The future can be waited on with `result(timeout)` from any thread, or awaited from any event loop.
+    If the plugin allows retries, the future follows the attempts of the task and carries the ID of the first one.
 
     :param timeout_processing: Whether to enable timeout processing.
     :param task_name: Task name.
     :param func: Task function.
     :param args: Positional arguments for the task function.
+    :param gid: Group ID that triggered the task, used for per-group quotas and fair dequeuing.
+    :param uid: User ID that triggered the task, used for per-user quotas and fair dequeuing.
+    :param deadline: Seconds within which the task must finish to be useful, None for no deadline. The task is
+                     rejected, or runs the deadline fallback of its plugin, if its predicted queue wait plus the
+                     p95 runtime of its plugin exceeds it.
+    :param on_output: Called with each value yielded by the task function if it is a generator or an asynchronous
+                      generator, e.g. to send partial results as they are produced.
+    :param execution: Name of the backend to run the task in, overriding the policy of the plugin, e.g. "process".
+    :param journal: Kind of the manager adding the task, e.g. "plugin", to record it in the task journal until it
+                    finishes so that it is added again after a restart. The first positional argument must be the
+                    websocket, it is not recorded and the one of the new connection is passed on replay.
     :param kwargs: Keyword arguments for the task function.
-    :return: Unique task ID.
+    :return: Future of the task, or None if it was not added.
     """
     # Check if func is actually a function
     if not callable(func):
@@ -27,22 +49,111 @@ def add_task(timeout_processing: bool, task_name: str, func: Callable, *args, **
     # Generate a unique task ID
     task_id = str(uuid.uuid4())
 
-    if is_async_function(func):
-        # Run asynchronous task
-        state = io_async_task.add_task(timeout_processing, task_name, task_id, func, *args, **kwargs)
-        if state:
-            logger.info(f"Io asyncio task | {task_id} | added successfully")
-
-    else:
-        # Run linear task
-        state = io_liner_task.add_task(timeout_processing, task_name, task_id, func, *args, **kwargs)
-        if state:
-            logger.info(f"Io linear task | {task_id} | added successfully")
+    # Run in the backend chosen by the plugin, or the default one for the function type
+    _, scheduler = backends.select(task_name, func, execution)
+    state = scheduler.add_task(timeout_processing, task_name, task_id, func, *args, gid=gid, uid=uid,
+                               deadline=deadline, **kwargs)
+    if state:
+        logger.info(f"{scheduler.log_name} | {task_id} | added successfully")
+        state = with_retries(task_name, state, partial(_add_again, timeout_processing, task_name, func, args, kwargs,
+                                                       gid, uid, deadline, execution, time.monotonic()))
+        if on_output is not None:
+            state.add_output_callback(on_output)
+        if journal is not None and task_journal.enabled():
+            task_journal.record(state.task_id, journal, task_name, args[1:], gid, uid, timeout_processing)
+            state.add_done_callback(lambda future: task_journal.complete(future.task_id))
 
     if not state:
         logger.info(f"Task | {task_id} | added failed")
 
-    return task_id if state else None
+    return state
+
+
+def add_tasks(tasks: List[Tuple[bool, str, Callable, Tuple, Dict]],
+              gid: Optional[int] = None, uid: Optional[int] = None,
+              deadline: Optional[float] = None,
+              on_output: Optional[Callable[[Any], None]] = None) -> List[Optional[TaskFuture]]:
+    """
+    Add a batch of tasks, e.g. all the filters matched by one message.
+    Each scheduler admits its share of the batch under a single lock acquisition and is woken up once.
+
+    :param tasks: Tasks as tuples of (timeout_processing, task_name, func, args, kwargs).
+    :param gid: Group ID that triggered the tasks, used for per-group quotas and fair dequeuing.
+    :param uid: User ID that triggered the tasks, used for per-user quotas and fair dequeuing.
+    :param deadline: Seconds within which the tasks must finish to be useful, None for no deadline.
+    :param on_output: Called with each value yielded by the tasks whose function is a generator.
+    :return: Future of each task, or None for the tasks that were not added, in the same order as `tasks`.
+    """
+    futures: List[Optional[TaskFuture]] = [None] * len(tasks)
+    added_at = time.monotonic()
+    batches: Dict[str, Tuple[List[Tuple], List[int]]] = {}  # Backend name -> tasks and their indexes
+
+    for index, (timeout_processing, task_name, func, args, kwargs) in enumerate(tasks):
+        # Check if func is actually a function
+        if not callable(func):
+            logger.warning(f"The provided func of task | {task_name} | is not a callable function")
+            continue
+
+        name, _ = backends.select(task_name, func)
+        batch, indexes = batches.setdefault(name, ([], []))
+        batch.append((timeout_processing, task_name, str(uuid.uuid4()), func, args, kwargs))
+        indexes.append(index)
+
+    for name, (batch, indexes) in batches.items():
+        results = backends.get(name).add_tasks(batch, gid=gid, uid=uid, deadline=deadline)
+        for index, (timeout_processing, task_name, _, func, args, kwargs), future in zip(indexes, batch, results):
+            futures[index] = with_retries(task_name, future, partial(_add_again, timeout_processing, task_name, func,
+                                                                     args, kwargs, gid, uid, deadline, None, added_at))
+
+    if on_output is not None:
+        for future in futures:
+            if future is not None:
+                future.add_output_callback(on_output)
+
+    added = sum(future is not None for future in futures)
+    logger.info(f"Task batch | {added}/{len(tasks)} tasks added successfully")
+    return futures
+
+
+def _add_again(timeout_processing: bool, task_name: str, func: Callable, args: Tuple, kwargs: Dict,
+               gid: Optional[int], uid: Optional[int], deadline: Optional[float], execution: Optional[str],
+               added_at: float) -> Optional[TaskFuture]:
+    """
+    Add a task again after it failed with a transient error, within what is left of its deadline.
+
+    :param added_at: Monotonic time the first attempt was added.
+    :return: Future of the new attempt, or None if it was not added.
+    """
+    if deadline is not None:
+        deadline -= time.monotonic() - added_at
+        if deadline <= 0:
+            return None
+
+    task_id = str(uuid.uuid4())
+    _, scheduler = backends.select(task_name, func, execution)
+    state = scheduler.add_task(timeout_processing, task_name, task_id, func, *args, gid=gid, uid=uid,
+                               deadline=deadline, **kwargs)
+    if state:
+        logger.info(f"{scheduler.log_name} | {task_id} | added successfully")
+    return state
+
+
+def tenant_rejection(task_name: str, func: Callable, gid: Optional[int] = None,
+                     uid: Optional[int] = None) -> Optional[str]:
+    """
+    Check whether a task of a group or user would be rejected by their caps, e.g. to tell the user why their command
+    was not added.
+
+    :param task_name: Task name.
+    :param func: Task function.
+    :param gid: Group ID.
+    :param uid: User ID.
+    :return: Reason for the rejection, or None if their caps do not apply or are not reached.
+    """
+    if not task_policy.get(task_name).tenant_quota:
+        return None
+    _, scheduler = backends.select(task_name, func)
+    return fair_share.throttled(uid) or scheduler.tenant_tracker.limit_reached(gid, uid)
 
 
 def shutdown(force_cleanup: bool) -> None:
@@ -52,17 +163,17 @@ def shutdown(force_cleanup: bool) -> None:
     Shutdown the scheduler, stop all tasks, and release resources.
     Only checks if the scheduler is running and forces a shutdown if necessary.
     """
-    # Shutdown asynchronous task scheduler if running
-    if hasattr(io_async_task, "scheduler_started") and io_async_task.scheduler_started:
-        logger.info("Detected io asyncio task scheduler is running, shutting down...")
-        io_async_task.stop_all_schedulers(force_cleanup)
-        logger.info("Io asyncio task scheduler has been shut down.")
-
-    # Shutdown linear task scheduler if running
-    if hasattr(io_liner_task, "scheduler_started") and io_liner_task.scheduler_started:
-        logger.info("Detected io linear task scheduler is running, shutting down...")
-        io_liner_task.stop_scheduler(force_cleanup)
-        logger.info("Io linear task scheduler has been shut down.")
+    # Stop recording first, the tasks cancelled below must stay unfinished in the journal
+    task_journal.close()
+
+    # Shutdown every backend that is running
+    for _, scheduler in backends.items():
+        # Also in stopped backends, a batch submitted later would start them again
+        scheduler.cancel_batched_tasks()
+        if scheduler.scheduler_started:
+            logger.info(f"Detected {scheduler.log_name.lower()} scheduler is running, shutting down...")
+            scheduler.stop_scheduler(force_cleanup)
+            logger.info(f"{scheduler.log_name} scheduler has been shut down.")
 
     logger.info("All scheduler has been shut down.")
 
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+import threading
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from common.logging import logger
+from .scheduler.result_store import TaskFuture
+from .task_assignment import add_task
+
+
+class _Stage:
+    """
+    One task of a graph and the stages it depends on.
+    """
+    __slots__ = ['name', 'task_name', 'func', 'args', 'kwargs', 'after', 'execution', 'timeout_processing',
+                 'downstream', 'waiting']
+
+    def __init__(self, name: str, task_name: str, func: Callable, args: Tuple, kwargs: Dict, after: List[str],
+                 execution: Optional[str], timeout_processing: bool) -> None:
+        self.name = name  # Stage name, unique in its graph
+        self.task_name = task_name  # Task name, selects the policy of the plugin
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.after = after  # Stages whose results are passed as the first positional arguments
+        self.execution = execution  # Backend to run in, None for the one chosen by the policy
+        self.timeout_processing = timeout_processing
+        self.downstream: List[str] = []  # Stages depending on this one
+        self.waiting = len(after)  # Number of dependencies that have not finished yet
+
+
+class TaskGraph:
+    """
+    Small directed acyclic graph of tasks, e.g. download -> parse -> summarize -> reply, submitted at once.
+    Each stage is added to its backend as soon as the stages it depends on have finished, with their results passed
+    in memory as its first positional arguments, in the order of `after`. Stages can run in different backends.
+    A stage failing or being cancelled fails the graph with its exception and cancels the stages after it,
+    no further stage is started; stages already running finish normally.
+    A stage can only depend on stages added before it, so the graph cannot have cycles.
+    """
+    __slots__ = ['graph_id', 'timeout_processing', 'gid', 'uid', 'on_output', 'stages', 'futures', 'results',
+                 'future', 'lock']
+
+    def __init__(self, timeout_processing: bool = True, gid: Optional[int] = None, uid: Optional[int] = None,
+                 on_output: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        :param timeout_processing: Whether to enable timeout processing for the stages that do not set it.
+        :param gid: Group ID that triggered the graph, used for per-group quotas and fair dequeuing.
+        :param uid: User ID that triggered the graph, used for per-user quotas and fair dequeuing.
+        :param on_output: Called with each value yielded by the stages whose function is a generator.
+        """
+        self.graph_id = str(uuid.uuid4())  # Graph ID, used in the logs and as ID of the future of the graph
+        self.timeout_processing = timeout_processing
+        self.gid = gid
+        self.uid = uid
+        self.on_output = on_output
+        self.stages: Dict[str, _Stage] = {}  # Stage name -> stage, in the order they were added
+        self.futures: Dict[str, TaskFuture] = {}  # Stage name -> future of its task, once added to its backend
+        self.results: Dict[str, Any] = {}  # Stage name -> result, once finished
+        self.future: Optional[TaskFuture] = None  # Future of the whole graph, once submitted
+        self.lock = threading.Lock()  # Lock to protect access to the results and the counts of the stages
+
+    def add(self, name: str, task_name: str, func: Callable, *args, after: Sequence[str] = (),
+            execution: Optional[str] = None, timeout_processing: Optional[bool] = None, **kwargs) -> str:
+        """
+        Add a stage to the graph.
+
+        :param name: Stage name, unique in the graph.
+        :param task_name: Task name, the policy of this plugin applies to the stage.
+        :param func: Task function.
+        :param args: Positional arguments for the task function, after the results of the dependencies.
+        :param after: Names of the stages that must finish first, their results are passed to `func` in this order.
+        :param execution: Name of the backend to run the stage in, e.g. "process", None for the default one.
+        :param timeout_processing: Whether to enable timeout processing, None for the setting of the graph.
+        :param kwargs: Keyword arguments for the task function.
+        :return: Stage name, to use in the `after` of the following stages.
+        :raises ValueError: If the name is taken or a dependency has not been added.
+        :raises RuntimeError: If the graph has already been submitted.
+        """
+        if self.future is not None:
+            raise RuntimeError(f"task graph {self.graph_id} has already been submitted")
+        if name in self.stages:
+            raise ValueError(f"stage '{name}' is already in the graph")
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError(f"stage '{name}' depends on unknown stage '{dependency}', add it first")
+
+        if timeout_processing is None:
+            timeout_processing = self.timeout_processing
+        self.stages[name] = _Stage(name, task_name, func, args, kwargs, list(after), execution, timeout_processing)
+        for dependency in after:
+            self.stages[dependency].downstream.append(name)
+        return name
+
+    def submit(self) -> TaskFuture:
+        """
+        Start the stages without dependencies, the others start as their dependencies finish.
+
+        :return: Future resolved with a dictionary of the result of each stage once they have all finished,
+                 or failed with the exception of the first stage that failed.
+        :raises ValueError: If the graph has no stage.
+        :raises RuntimeError: If the graph has already been submitted.
+        """
+        if self.future is not None:
+            raise RuntimeError(f"task graph {self.graph_id} has already been submitted")
+        if not self.stages:
+            raise ValueError("task graph has no stage")
+
+        self.future = TaskFuture(self.graph_id)
+        logger.info(f"Task graph | {self.graph_id} | submitted with {len(self.stages)} stages")
+        for stage in [stage for stage in self.stages.values() if not stage.after]:
+            self._start(stage)
+        return self.future
+
+    def _start(self, stage: _Stage) -> None:
+        """
+        Add the task of a stage whose dependencies have all finished.
+
+        :param stage: Stage to start.
+        """
+        if self.future.done():
+            return  # The graph failed or was cancelled meanwhile
+
+        with self.lock:
+            args = tuple(self.results[dependency] for dependency in stage.after) + stage.args
+        future = add_task(stage.timeout_processing, stage.task_name, stage.func, *args, gid=self.gid, uid=self.uid,
+                          on_output=self.on_output, execution=stage.execution, **stage.kwargs)
+        if future is None:
+            self._fail(stage, RuntimeError(f"stage '{stage.name}' of task graph {self.graph_id} was not added"))
+            return
+
+        with self.lock:
+            self.futures[stage.name] = future
+        future.add_done_callback(partial(self._stage_done, stage))
+
+    def _stage_done(self, stage: _Stage, future: Future) -> None:
+        """
+        Callback function after the task of a stage is completed, starts the stages it was the last dependency of.
+
+        :param stage: Finished stage.
+        :param future: Future of its task.
+        """
+        if future.cancelled():
+            self._fail(stage, None)
+            return
+        if future.exception() is not None:
+            self._fail(stage, future.exception())
+            return
+
+        ready: List[_Stage] = []
+        with self.lock:
+            self.results[stage.name] = future.result()
+            for name in stage.downstream:
+                downstream = self.stages[name]
+                downstream.waiting -= 1
+                if downstream.waiting == 0:
+                    ready.append(downstream)
+            finished = len(self.results) == len(self.stages)
+
+        if finished:
+            logger.info(f"Task graph | {self.graph_id} | all stages completed")
+            try:
+                self.future.set_result(dict(self.results))
+            except InvalidStateError:
+                pass  # Already cancelled by the caller
+        for downstream in ready:
+            self._start(downstream)
+
+    def _fail(self, stage: _Stage, error: Optional[BaseException]) -> None:
+        """
+        Fail the graph after a stage failed or was cancelled, the stages after it are never started.
+
+        :param stage: Stage that failed.
+        :param error: Exception of the stage, None if it was cancelled.
+        """
+        cancelled = self._downstream_of(stage)
+        reason = "was cancelled" if error is None else f"failed: {error}"
+        logger.warning(f"Task graph | {self.graph_id} | stage '{stage.name}' {reason}"
+                       + (f", cancelling {', '.join(cancelled)}" if cancelled else ""))
+        if error is None:
+            self.future.cancel()
+        else:
+            try:
+                self.future.set_exception(error)
+            except InvalidStateError:
+                pass  # Another stage failed first
+
+    def _downstream_of(self, stage: _Stage) -> List[str]:
+        """
+        Get the stages depending on a stage, directly or not.
+
+        :param stage: Stage.
+        :return: Names of the stages, in the order they were added.
+        """
+        names = set(stage.downstream)
+        for name in self.stages:
+            if name in names:
+                names.update(self.stages[name].downstream)
+        return [name for name in self.stages if name in names]
+
+    def status(self) -> Dict[str, str]:
+        """
+        Get the state of each stage: "waiting", "added", "completed", "failed" or "cancelled".
+
+        :return: Stage name -> state.
+        """
+        status: Dict[str, str] = {}
+        with self.lock:
+            for name in self.stages:
+                future = self.futures.get(name)
+                if name in self.results:
+                    status[name] = "completed"
+                elif future is None:
+                    status[name] = "cancelled" if self.future is not None and self.future.done() else "waiting"
+                elif not future.done():
+                    status[name] = "added"
+                elif future.cancelled():
+                    status[name] = "cancelled"
+                else:
+                    status[name] = "failed"
+        return status
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from common.logging import logger
+from config import config
+
+# The file is rewritten with only the unfinished entries once it holds more than this many lines...
+COMPACT_MIN_LINES = 1000
+# ...and this many times more lines than unfinished entries
+COMPACT_RATIO = 4
+
+
+class TaskJournal:
+    """
+    Optional append-only journal of the tasks added by the plugin and file managers, enabled with `task_journal`.
+    Each admitted task is recorded with its plugin name and its arguments minus the websocket, and marked as done
+    once finished, so that the commands queued or running when the bot restarts are added again once it is back.
+    Writes are batched: callers only queue a line, a writer thread appends the lines queued during
+    `task_journal_flush_ms` and calls fsync once for all of them. Completed entries are compacted away by rewriting
+    the file with only the unfinished ones when it holds mostly finished ones.
+    """
+    __slots__ = ['pending', 'leftovers', 'buffer', 'lines', 'condition', 'writer', 'closed']
+
+    def __init__(self) -> None:
+        self.pending: Dict[str, str] = {}  # Task ID -> line of the tasks not finished yet
+        self.leftovers: List[Dict] = []  # Unfinished entries of the previous run, until they are replayed
+        self.buffer: List[str] = []  # Lines waiting to be written
+        self.lines = 0  # Lines in the file
+        self.condition = threading.Condition()  # Protects the buffer and wakes up the writer thread
+        self.writer: Optional[threading.Thread] = None  # Writer thread, started when the journal is first used
+        self.closed = False  # Set at shutdown, nothing is recorded afterwards
+
+    @staticmethod
+    def enabled() -> bool:
+        return config.get("task_journal", False)
+
+    def record(self, task_id: str, kind: str, task_name: str, args: Tuple, gid: Optional[int], uid: Optional[int],
+               timeout_processing: bool) -> None:
+        """
+        Record an admitted task. Tasks whose arguments cannot be serialized to JSON are not recorded.
+
+        :param task_id: Task ID.
+        :param kind: Kind of the manager that added the task, e.g. "plugin", used to find its handler on replay.
+        :param task_name: Task name.
+        :param args: Positional arguments of the handler after the websocket.
+        :param gid: Group ID the task is charged to.
+        :param uid: User ID the task is charged to.
+        :param timeout_processing: Whether timeout processing is enabled.
+        """
+        try:
+            line = json.dumps({
+                "id": task_id, "kind": kind, "name": task_name, "args": list(args), "gid": gid, "uid": uid,
+                "timeout_processing": timeout_processing, "time": time.time()
+            }, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Task journal | {task_id} | not recorded, arguments are not serializable: {e}")
+            return
+
+        with self.condition:
+            if self.closed:
+                return
+            self._open()
+            self.pending[task_id] = line
+            self.buffer.append(line)
+            self.condition.notify()
+
+    def complete(self, task_id: str) -> None:
+        """
+        Mark a recorded task as finished, it will not be replayed.
+
+        :param task_id: Task ID.
+        """
+        with self.condition:
+            if self.closed or self.pending.pop(task_id, None) is None:
+                return
+            self.buffer.append(json.dumps({"id": task_id, "done": True}))
+            self.condition.notify()
+
+    def take_leftovers(self) -> List[Dict]:
+        """
+        Get the entries left unfinished by the previous run, only once. Entries older than `task_journal_max_age`
+        seconds are dropped, the command is no longer worth answering. The caller adds the others again and
+        marks the old entries as done.
+
+        :return: Entries with the keys "id", "kind", "name", "args", "gid", "uid", "timeout_processing" and "time".
+        """
+        if not self.enabled():
+            return []
+        with self.condition:
+            if self.closed:
+                return []
+            self._open()
+            leftovers, self.leftovers = self.leftovers, []
+
+        cutoff = time.time() - config.get("task_journal_max_age", 600)
+        for entry in leftovers:
+            if entry["time"] < cutoff:
+                self.complete(entry["id"])
+        return [entry for entry in leftovers if entry["time"] >= cutoff]
+
+    def close(self) -> None:
+        """
+        Write the queued lines and stop recording. Called at shutdown before the tasks are cancelled, so that the
+        tasks interrupted by the shutdown stay unfinished in the journal.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+            writer = self.writer
+        if writer is not None:
+            writer.join(5)
+
+    def _open(self) -> None:
+        """
+        Load the entries left by the previous run and start the writer thread. The caller must hold the condition.
+        """
+        if self.writer is not None:
+            return
+
+        path = config.get("task_journal_file", "./task_journal.jsonl")
+        entries: Dict[str, Tuple[Dict, str]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Last line cut short by a crash
+                    if entry.get("done"):
+                        entries.pop(entry["id"], None)
+                    else:
+                        entries[entry["id"]] = (entry, line.rstrip("\n"))
+        if entries:
+            logger.info(f"Task journal | {len(entries)} tasks left unfinished by the previous run")
+
+        self.leftovers = [entry for entry, _ in entries.values()]
+        self.pending.update((task_id, line) for task_id, (_, line) in entries.items())
+        self._rewrite(path, list(self.pending.values()))
+        self.writer = threading.Thread(target=self._write_loop, args=(path,), daemon=True)
+        self.writer.start()
+
+    def _write_loop(self, path: str) -> None:
+        """
+        Append the queued lines and fsync them together, compacting the file when it holds mostly finished entries.
+
+        :param path: Journal file.
+        """
+        while True:
+            with self.condition:
+                while not self.buffer and not self.closed:
+                    self.condition.wait()
+                lines, self.buffer = self.buffer, []
+                closed = self.closed
+                total = self.lines + len(lines)
+                compacted = None
+                if total > COMPACT_MIN_LINES and total > COMPACT_RATIO * len(self.pending):
+                    compacted = list(self.pending.values())
+
+            try:
+                if compacted is not None:
+                    self._rewrite(path, compacted)
+                elif lines:
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("\n".join(lines) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self.lines += len(lines)
+            except OSError as e:
+                logger.error(f"Task journal | failed to write {path}: {e}")
+
+            if closed:
+                return
+            # Let the lines of the next interval accumulate, they are written with a single fsync
+            time.sleep(config.get("task_journal_flush_ms", 100) / 1000)
+
+    def _rewrite(self, path: str, lines: List[str]) -> None:
+        """
+        Replace the journal file with the given lines.
+
+        :param path: Journal file.
+        :param lines: Lines of the unfinished entries.
+        """
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            if lines:
+                f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        self.lines = len(lines)
+
+
+task_journal = TaskJournal()